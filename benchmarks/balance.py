@@ -0,0 +1,94 @@
+# balance.py
+
+"""Compare the team balancing engine with the old greedy autobalance and random teams.
+
+Run from the repository root with `python3 benchmarks/balance.py`.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.cogs.utils.balance import TeamBalancer  # noqa: E402
+
+
+def greedy_teams(ratings):
+    """ The greedy autobalance the bot used before the balancing engine. """
+    players = sorted(range(len(ratings)), key=ratings.__getitem__)
+    team_size = len(players) // 2
+    team_one = [players.pop()]
+    team_two = [players.pop()]
+
+    while players:
+        if len(team_one) >= team_size:
+            team_two.append(players.pop())
+        elif len(team_two) >= team_size:
+            team_one.append(players.pop())
+        elif sum(ratings[p] for p in team_one) < sum(ratings[p] for p in team_two):
+            team_one.append(players.pop())
+        else:
+            team_two.append(players.pop())
+
+    return team_one, team_two
+
+
+def random_teams(ratings):
+    """ Random teams like randomize_teams. """
+    players = list(range(len(ratings)))
+    random.shuffle(players)
+    team_size = len(players) // 2
+    return players[:team_size], players[team_size:]
+
+
+def engine_teams(balancer):
+    def balance(ratings):
+        result = balancer.balance(ratings)
+        return result.team_one, result.team_two
+
+    return balance
+
+
+def run(method, lobbies):
+    """ Get the mean and worst rating gap and the mean runtime of a balancing method over lobbies. """
+    gaps = []
+    start = time.perf_counter()
+
+    for ratings in lobbies:
+        team_one, team_two = method(ratings)
+        gaps.append(abs(sum(ratings[p] for p in team_one) - sum(ratings[p] for p in team_two)))
+
+    elapsed = (time.perf_counter() - start) / len(lobbies)
+    return statistics.mean(gaps), max(gaps), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the team balancing methods')
+    parser.add_argument('-n', '--lobbies', type=int, default=50, help='lobbies generated per size')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[10, 12, 20, 50, 100], help='lobby sizes')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    methods = {
+        'random': random_teams,
+        'greedy': greedy_teams,
+        'engine': engine_teams(TeamBalancer(seed=args.seed))
+    }
+    print(f'{"players":>7}  {"method":<7}  {"mean gap":>10}  {"worst gap":>10}  {"mean time":>10}')
+
+    for size in args.sizes:
+        # RankMe scores start at 1000 and spread out with experience
+        lobbies = [[max(0, int(random.gauss(1000, 300))) for _ in range(size)] for _ in range(args.lobbies)]
+
+        for name, method in methods.items():
+            mean_gap, worst_gap, elapsed = run(method, lobbies)
+            print(f'{size:>7}  {name:<7}  {mean_gap:>10.1f}  {worst_gap:>10.1f}  {elapsed * 1000:>8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
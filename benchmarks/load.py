@@ -0,0 +1,431 @@
+# load.py
+
+"""Measure how many commands per second the bot sustains, end to end, against a local Postgres.
+
+The bot runs without connecting to Discord: synthetic guilds, members and channels are loaded straight into its state,
+commands are fed to it as messages and its REST calls are answered in memory. Simulated players react to ready checks
+as soon as the bot listens for them. The CS:GO League web API is replaced by a local aiohttp server with configurable
+latency and error rate. Guilds use autobalanced teams and random maps so pops run to a match without further input.
+
+The database is the one configured by the POSTGRESQL_* variables of the .env file and needs the migrations applied.
+Every synthetic guild is deleted again afterwards, but use a scratch database all the same.
+
+Run from the repository root with `python3 benchmarks/load.py`.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import itertools
+import logging
+import os
+import random
+import re
+import sys
+import time
+
+from aiohttp import web
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.bot import LeagueBot  # noqa: E402
+from bot.cogs.utils import STATEMENTS, DBHelper, QueueActor  # noqa: E402
+from bot.cogs.utils.player import STAT_FIELDS  # noqa: E402
+from bot.resources import Sessions  # noqa: E402
+import launcher  # noqa: E402
+
+BOT_ID = 1 << 60
+READY_TITLE = 'Queue has filled up!'
+_MENTION = re.compile(r'<@!?(\d+)>')
+_MESSAGE_ID = re.compile(r'/messages/(\d+)')
+SCENARIOS = ['joins', 'pops', 'leaders']
+_snowflakes = itertools.count(1 << 58)
+
+
+def snowflake():
+    """ Generate a unique Discord-style ID. """
+    return next(_snowflakes)
+
+
+def user_data(user_id, name):
+    return {'id': str(user_id), 'username': name, 'discriminator': '0000', 'avatar': None, 'bot': user_id == BOT_ID}
+
+
+class FakeLeagueAPI:
+    """Local stand-in for the CS:GO League web API.
+
+    Every player is linked, not in a match and has random stats. Responses are delayed by latency seconds plus up to
+    jitter seconds, and error_rate of them fail with a 500.
+    """
+
+    def __init__(self, latency=0.02, jitter=0.01, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._matches = itertools.count(1)
+        self._runner = None
+        self.url = None
+
+    @staticmethod
+    def _player(discord_id):
+        rng = random.Random(discord_id)
+        player = {field: rng.randint(0, 500) for field in STAT_FIELDS}
+        player.update(discord=discord_id, steam=discord_id, score=max(0, int(rng.gauss(1000, 300))),
+                      discord_name=f'player-{discord_id}', inMatch=False)
+        return player
+
+    @web.middleware
+    async def _simulate(self, request, handler):
+        self.requests += 1
+        await asyncio.sleep(self.latency + random.random() * self.jitter)
+
+        if random.random() < self.error_rate:
+            self.errors += 1
+            raise web.HTTPInternalServerError()
+
+        return await handler(request)
+
+    async def _check(self, request):
+        return web.json_response({'linked': True})
+
+    async def _player_stats(self, request):
+        return web.json_response(self._player(int(request.match_info['discord_id'])))
+
+    async def _players_stats(self, request):
+        body = await request.json()
+        return web.json_response([self._player(discord_id) for discord_id in body['discordIds']])
+
+    async def _start_match(self, request):
+        return web.json_response({'match_id': next(self._matches), 'ip': '127.0.0.1', 'port': 27015})
+
+    async def start(self):
+        """ Serve the API on a free local port. """
+        app = web.Application(middlewares=[self._simulate], client_max_size=16 * 1024 ** 2)
+        app.add_routes([
+            web.get('/discord/check/{discord_id}', self._check),
+            web.get('/player/discord/{discord_id}', self._player_stats),
+            web.post('/players/discord', self._players_stats),
+            web.post('/match/start', self._start_match)
+        ])
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f'http://{host}:{port}'
+
+    async def close(self):
+        await self._runner.cleanup()
+
+
+class FakeGateway:
+    """Loads synthetic guilds into the bot's state, answers its REST calls and plays the part of the users.
+
+    Attributes
+    ----------
+    reaction_delay : float
+        Seconds the players take to react to a ready check.
+    rest_calls : int
+        Number of REST calls the bot made.
+    """
+
+    def __init__(self, bot, reaction_delay=0.0):
+        self.bot = bot
+        self.state = bot._connection
+        self.reaction_delay = reaction_delay
+        self.rest_calls = 0
+        self._messages = {}
+        self._ready_checks = {}  # Message ID -> IDs of the users mentioned
+        self._tasks = set()
+
+        self.state.user = discord.ClientUser(state=self.state, data=user_data(BOT_ID, 'League Bot'))
+        bot.owner_id = BOT_ID  # Owner checks would fetch the application info otherwise
+        bot.http.request = self.request
+        register = bot.reactions.register
+
+        def register_and_react(message_id, handler):
+            """ Have the players react once the bot listens to the ready check. """
+            register(message_id, handler)
+            user_ids = self._ready_checks.pop(message_id, None)
+
+            if user_ids is not None:
+                self._spawn(self._react(message_id, user_ids))
+
+        bot.reactions.register = register_and_react
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _message_data(self, channel_id, content='', embeds=(), author_id=BOT_ID, message_id=None):
+        channel = self.bot.get_channel(channel_id)
+        return {
+            'id': str(message_id or snowflake()),
+            'channel_id': str(channel_id),
+            'guild_id': str(channel.guild.id),
+            'author': user_data(author_id, 'League Bot' if author_id == BOT_ID else f'user-{author_id}'),
+            'content': content,
+            'embeds': list(embeds),
+            'attachments': [],
+            'mentions': [],
+            'mention_roles': [],
+            'mention_everyone': False,
+            'tts': False,
+            'pinned': False,
+            'type': 0,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'edited_timestamp': None
+        }
+
+    async def request(self, route, *, files=None, form=None, **kwargs):
+        """ Answer a REST call like Discord would, without any rate limits. """
+        self.rest_calls += 1
+        payload = kwargs.get('json') or {}
+        key = (route.method, route.path)
+        message_id = _MESSAGE_ID.search(route.url)
+        message_id = int(message_id[1]) if message_id else None
+
+        if key == ('POST', '/channels/{channel_id}/messages'):
+            embed = payload.get('embed')
+            data = self._message_data(route.channel_id, payload.get('content') or '', [embed] if embed else [])
+            self._messages[int(data['id'])] = data
+
+            if embed is not None and embed.get('title') == READY_TITLE:
+                self._ready_checks[int(data['id'])] = [int(user_id) for user_id in _MENTION.findall(data['content'])]
+
+            return data
+        elif key == ('PATCH', '/channels/{channel_id}/messages/{message_id}'):
+            data = self._messages.get(message_id) or self._message_data(route.channel_id, message_id=message_id)
+
+            if 'embed' in payload:
+                data['embeds'] = [payload['embed']] if payload['embed'] else []
+
+            if 'content' in payload:
+                data['content'] = payload['content'] or ''
+
+            return data
+        elif key == ('DELETE', '/channels/{channel_id}/messages/{message_id}'):
+            self._messages.pop(message_id, None)
+
+        return None  # Typing, reactions and everything else
+
+    async def _react(self, message_id, user_ids):
+        await asyncio.sleep(self.reaction_delay)
+        channel_id = int(self._messages[message_id]['channel_id'])
+        guild = self.bot.get_channel(channel_id).guild
+
+        for user_id in user_ids:
+            data = {'message_id': message_id, 'channel_id': channel_id, 'user_id': user_id, 'guild_id': guild.id}
+            payload = discord.RawReactionActionEvent(data, discord.PartialEmoji(name='✅'), 'REACTION_ADD')
+            payload.member = guild.get_member(user_id)
+            await self.bot.on_raw_reaction_add(payload)
+
+    def add_guild(self, num_members):
+        """ Create a guild with a text channel and members and add it to the bot's cache. """
+        guild_id = snowflake()
+        members = [{'user': user_data(BOT_ID, 'League Bot'), 'roles': [], 'joined_at': None}]
+        members += [{'user': user_data(user_id, f'user-{user_id}'), 'roles': [], 'joined_at': None}
+                    for user_id in (snowflake() for _ in range(num_members))]
+        guild = discord.Guild(state=self.state, data={
+            'id': str(guild_id),
+            'name': f'guild-{guild_id}',
+            'member_count': len(members),
+            'members': members,
+            'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0}],
+            'channels': [{'id': str(snowflake()), 'type': 0, 'name': 'queue', 'position': 0}]
+        })
+        self.state._add_guild(guild)
+        return guild
+
+    def remove_guild(self, guild):
+        self.state._remove_guild(guild)
+
+    def message(self, guild, author, content):
+        """ Create a message sent by a member in the guild's channel. """
+        channel = guild.text_channels[0]
+        data = self._message_data(channel.id, content, author_id=author.id)
+        return discord.Message(state=self.state, channel=channel, data=data)
+
+    async def settle(self):
+        """ Wait for the players' reactions that are still being sent. """
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+
+class Scenario:
+    """ Commands sent by the members of synthetic guilds and what it took the bot to handle them. """
+
+    def __init__(self, name, num_guilds, num_members, capacity, commands):
+        self.name = name
+        self.num_guilds = num_guilds
+        self.num_members = num_members
+        self.capacity = capacity
+        self.commands = commands  # Function of (guild, members) returning the commands to send as (author, content)
+
+
+def join_storm(num_guilds, num_members):
+    """ Everyone joins queues too big to fill up. """
+    return Scenario('join storm', num_guilds, num_members, num_members + 1,
+                    lambda guild, members: [(member, 'q!join') for member in members])
+
+
+def pops(num_guilds, lobby_size):
+    """ Every guild's queue fills up and pops at the same time. """
+    return Scenario('pops', num_guilds, lobby_size, lobby_size,
+                    lambda guild, members: [(member, 'q!join') for member in members])
+
+
+def leaderboard_spam(num_guilds, num_members, repeats):
+    """ Everyone asks for the leaderboard several times. """
+    return Scenario('leaderboard spam', num_guilds, num_members, 10,
+                    lambda guild, members: [(member, 'q!leaders') for member in members] * repeats)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(bot, gateway, api, scenario, concurrency, settle_time):
+    """ Send a scenario's commands and return its results as a row of the report. """
+    guilds = [gateway.add_guild(scenario.num_members) for _ in range(scenario.num_guilds)]
+    guild_ids = [guild.id for guild in guilds]
+
+    async with bot.db_pool.acquire() as conn:
+        await DBHelper(conn).insert_guilds(*guild_ids)
+
+    for guild_id in guild_ids:
+        await bot.guild_configs.update(guild_id, capacity=scenario.capacity, team_method='autobalance',
+                                       map_method='random')
+
+    messages = [gateway.message(guild, author, content)
+                for guild in guilds
+                for author, content in scenario.commands(guild, [m for m in guild.members if m.id != BOT_ID])]
+    random.shuffle(messages)
+    errors = []
+
+    async def on_command_error(ctx, error):
+        errors.append(error)
+
+    bot.add_listener(on_command_error)
+    latencies = []
+    limit = asyncio.Semaphore(concurrency)
+
+    async def send(message):
+        async with limit:
+            start = time.perf_counter()
+            await bot.process_commands(message)
+            latencies.append(time.perf_counter() - start)
+
+    rest_calls, api_calls, db_acquires = gateway.rest_calls, api.requests, bot.db_pool.acquires
+    db_queries = sum(stat.calls for _, stat in STATEMENTS.top(None))
+    start = time.perf_counter()
+    await asyncio.gather(*(send(message) for message in messages))
+    elapsed = time.perf_counter() - start
+
+    # Let the queue displays render so their REST calls and queries are counted
+    await asyncio.sleep(settle_time)
+    await gateway.settle()
+    num = len(messages)
+    result = {
+        'scenario': scenario.name,
+        'commands': num,
+        'errors': len(errors),
+        'cmd/s': num / elapsed,
+        'p50 ms': percentile(latencies, 0.5) * 1000,
+        'p99 ms': percentile(latencies, 0.99) * 1000,
+        'REST/cmd': (gateway.rest_calls - rest_calls) / num,
+        'API/cmd': (api.requests - api_calls) / num,
+        'DB/cmd': (sum(stat.calls for _, stat in STATEMENTS.top(None)) - db_queries) / num,
+        'acq/cmd': (bot.db_pool.acquires - db_acquires) / num
+    }
+
+    # Clean up
+    bot.remove_listener(on_command_error)
+
+    for guild in guilds:
+        await bot.queues.discard(guild.id)
+        gateway.remove_guild(guild)
+
+    async with bot.db_pool.acquire() as conn:
+        await DBHelper(conn).delete_guilds(*guild_ids)
+
+    bot.guild_configs.invalidate(*guild_ids)
+    return result
+
+
+async def benchmark(db_pool, args):
+    api = FakeLeagueAPI(args.latency, args.jitter, args.error_rate)
+    await api.start()
+    bot = LeagueBot('benchmark', api.url, 'benchmark', db_pool, {})
+    gateway = FakeGateway(bot, args.reaction_delay)
+    await bot.on_connect()  # Opens the API session
+    await bot.guild_configs.start()
+    await bot.bans.start()
+    await bot.queues.start()
+    QueueActor.render_delay = args.render_delay
+    scenarios = {
+        'joins': join_storm(args.guilds, args.members),
+        'pops': pops(args.pop_guilds, args.lobby_size),
+        'leaders': leaderboard_spam(args.guilds, args.members, args.repeats)
+    }
+    columns = ['scenario', 'commands', 'errors', 'cmd/s', 'p50 ms', 'p99 ms', 'REST/cmd', 'API/cmd', 'DB/cmd',
+               'acq/cmd']
+    print('  '.join(f'{column:>10}' if num else f'{column:<16}' for num, column in enumerate(columns)))
+
+    try:
+        for name in args.scenarios:
+            result = await run(bot, gateway, api, scenarios[name], args.concurrency, args.settle)
+            print('  '.join(f'{value:>10.2f}' if isinstance(value, float) else
+                            f'{value:>10}' if num else f'{value:<16}' for num, value in enumerate(result.values())))
+    finally:
+        await bot.queues.close()
+        await bot.guild_configs.close()
+        await bot.bans.close()
+        await bot.leaderboard.close()
+        await Sessions.requests.close()
+        await api.close()
+        await db_pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the bot with a simulated gateway and web API')
+    parser.add_argument('scenarios', nargs='*', default=SCENARIOS, metavar='{joins,pops,leaders}',
+                        help='scenarios to run (all by default)')
+    parser.add_argument('-g', '--guilds', type=int, default=100, help='guilds of the join and leaderboard scenarios')
+    parser.add_argument('-m', '--members', type=int, default=50, help='members per guild')
+    parser.add_argument('--pop-guilds', type=int, default=1000, help='guilds popping at once')
+    parser.add_argument('--lobby-size', type=int, default=10, help='queue capacity of the popping guilds')
+    parser.add_argument('--repeats', type=int, default=3, help='leaderboard requests per member')
+    parser.add_argument('-c', '--concurrency', type=int, default=500, help='commands handled at once')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the web API takes to respond')
+    parser.add_argument('--jitter', type=float, default=0.01, help='random extra seconds of web API latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of web API requests that fail')
+    parser.add_argument('--reaction-delay', type=float, default=0.0, help='seconds players take to ready up')
+    parser.add_argument('--render-delay', type=float, default=QueueActor.render_delay,
+                        help='seconds queue display updates are coalesced over')
+    parser.add_argument('--settle', type=float, default=2.0, help='seconds to wait for queue displays to render')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-v', '--verbose', action='store_true', help='log the bot\'s info messages')
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+
+    if unknown:  # Not checked with choices, which some Python versions also apply to the empty default
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    random.seed(args.seed)
+
+    if not args.verbose:
+        logging.getLogger('csgoleague').setLevel(logging.WARNING)
+
+    loop = launcher._get_loop()
+    db_pool = launcher._create_db_pool(loop)
+    loop.run_until_complete(benchmark(db_pool, args))
+
+
+if __name__ == '__main__':
+    main()
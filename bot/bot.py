@@ -3,6 +3,7 @@
 import discord
 from discord.ext import commands
 
+import functools
 import logging
 import os.path
 import sys
@@ -20,22 +21,37 @@ INTENTS_JSON = os.path.join(_CWD, 'intents.json')
 class LeagueBot(commands.AutoShardedBot):
     """ Sub-classed AutoShardedBot modified to fit the needs of the application. """
 
-    def __init__(self, discord_token, api_base_url, api_key, db_pool, emoji_dict, donate_url=None):
+    def __init__(self, discord_token, api_base_url, api_key, db_pool, emoji_dict, donate_url=None,
+                 use_components=False, shard_ids=None, shard_count=None):
         """ Set attributes and configure bot. """
         # Call parent init
         with open(INTENTS_JSON) as f:
             intents_attrs = json.load(f)
 
+        if use_components:  # Menus use buttons, so the bot doesn't need every guild's reaction events
+            intents_attrs['guild_reactions'] = False
+
         intents = discord.Intents(**intents_attrs)
-        super().__init__(command_prefix=('q!', 'Q!'), case_insensitive=True, intents=intents)
+        super().__init__(command_prefix=('q!', 'Q!'), case_insensitive=True, intents=intents, shard_ids=shard_ids,
+                         shard_count=shard_count)
 
         # Set argument attributes
         self.discord_token = discord_token
         self.api_base_url = api_base_url
         self.api_key = api_key
         self.db_pool = db_pool
+        self.guild_configs = cogs.utils.GuildConfigCache(db_pool)
+        self.bans = cogs.utils.BanIndex(db_pool, shard_ids, shard_count)
+        self.leaderboard = cogs.utils.Leaderboard(db_pool)
+        self.queue_stats = cogs.utils.QueueStatsSnapshot()
+        self.queues = cogs.utils.QueueActors(db_pool, self.bans, shard_ids, shard_count)
+        self.reactions = cogs.utils.ReactionRouter()
+        self.interactions = cogs.utils.InteractionRouter()
+        self.scheduler = cogs.utils.JobScheduler(db_pool)
+        self.use_components = use_components
         self.emoji_dict = emoji_dict
         self.donate_url = donate_url
+        self.synced_shard_guilds = {}  # Guild IDs of each shard as of its last sync with the guilds table
 
         # Set constants
         self.description = 'An easy to use, fully automated system to set up and play CS:GO pickup games'
@@ -52,6 +68,9 @@ class LeagueBot(commands.AutoShardedBot):
                 f'API url "{self.api_base_url}" should start with "https" instead of "http"'
             )
 
+        # Jobs run by only one of the bot's processes
+        self.scheduler.register('prune_matches', 3600, functools.partial(cogs.utils.MatchLifecycle.prune, db_pool))
+
         # Add check to not respond to DM'd commands
         self.add_check(lambda ctx: ctx.guild is not None)
 
@@ -65,10 +84,24 @@ class LeagueBot(commands.AutoShardedBot):
         self.add_cog(cogs.QueueCog(self))
         self.add_cog(cogs.MatchCog(self))
         self.add_cog(cogs.StatsCog(self))
+        self.add_cog(cogs.MetricsCog(self))
 
         if self.donate_url:
             self.add_cog(cogs.DonateCog(self))
 
+        # discord.py doesn't parse interactions, so they are picked out of the raw gateway events
+        if self.use_components:
+            self.add_listener(self.on_interaction_event, 'on_socket_response')
+
+    async def invoke(self, ctx):
+        """ Override parent invoke to count the database pool acquisitions made by each command. """
+        self.db_pool.start_command(ctx)
+
+        try:
+            await super().invoke(ctx)
+        finally:
+            self.db_pool.end_command(ctx)
+
     async def get_context(self, message, *, cls=None):
         """ Override parent method to use LeagueContext """
         return await super().get_context(message, cls=cls or cogs.utils.LeagueContext)
@@ -106,11 +139,32 @@ class LeagueBot(commands.AutoShardedBot):
         )
 
     @commands.Cog.listener()
-    async def on_ready(self):
-        """ Synchronize the guilds the bot is in with the guilds table. """
+    async def on_raw_reaction_add(self, payload):
+        """ Route reactions to the menu or ready check waiting on the message, ignoring the bot's own reactions. """
+        if payload.user_id != self.user.id:
+            await self.reactions.dispatch(payload)
+
+    async def on_interaction_event(self, msg):
+        """ Route message component interactions to the menu they belong to. """
+        if msg.get('t') == 'INTERACTION_CREATE' and msg['d'].get('type') == 3:  # Message component interaction
+            await self.interactions.dispatch(cogs.utils.Interaction(self, msg['d']))
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id):
+        """ Synchronize the guilds of the shard with the guilds table if they changed since the last sync. """
+        guild_ids = frozenset(guild.id for guild in self.guilds if guild.shard_id == shard_id)
+
+        if self.synced_shard_guilds.get(shard_id) == guild_ids:  # Shard reconnected without guild changes
+            return
+
         async with self.db_pool.acquire() as conn:
             db = cogs.utils.DBHelper(conn)
-            await db.sync_guilds(*(guild.id for guild in self.guilds))
+            inserted, deleted = await db.sync_guilds(guild_ids, shard_id, self.shard_count or 1)
+
+        self.synced_shard_guilds[shard_id] = guild_ids
+        self.guild_configs.invalidate(*deleted)
+        self.logger.info(f'Synced {len(guild_ids)} guilds of shard {shard_id} '
+                         f'({len(inserted)} added, {len(deleted)} removed)')
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
@@ -119,6 +173,9 @@ class LeagueBot(commands.AutoShardedBot):
             db = cogs.utils.DBHelper(conn)
             await db.insert_guilds(guild.id)
 
+        if guild.shard_id in self.synced_shard_guilds:
+            self.synced_shard_guilds[guild.shard_id] |= {guild.id}
+
     @commands.Cog.listener()
     async def on_guild_remove(self, guild):
         """ Delete the recently removed guild from the guilds table. """
@@ -126,13 +183,34 @@ class LeagueBot(commands.AutoShardedBot):
             db = cogs.utils.DBHelper(conn)
             await db.delete_guilds(guild.id)
 
+        self.guild_configs.invalidate(guild.id)
+        await self.queues.discard(guild.id)
+
+        if guild.shard_id in self.synced_shard_guilds:
+            self.synced_shard_guilds[guild.shard_id] -= {guild.id}
+
     def run(self):
         """ Override parent run to automatically include Discord token. """
         super().run(self.discord_token)
 
+    async def start(self, *args, **kwargs):
+        """ Override parent start to start the background components before connecting. """
+        await self.guild_configs.start()
+        await self.bans.start()
+        await self.queues.start()
+        await self.queue_stats.start()
+        await self.scheduler.start()
+        await super().start(*args, **kwargs)
+
     async def close(self):
         """ Override parent close to close the API session and DB connection pool. """
         await super().close()
+        await self.queues.close()
+        await self.guild_configs.close()
+        await self.bans.close()
+        await self.leaderboard.close()
+        await self.queue_stats.close()
+        await self.scheduler.close()
         await self.db_pool.close()
 
         if hasattr(Sessions, 'requests'):
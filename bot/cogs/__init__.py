@@ -7,6 +7,7 @@ from .help import HelpCog
 from .queue import QueueCog
 from .stats import StatsCog
 from .match import MatchCog
+from .metrics import MetricsCog
 
 __all__ = [
     AuthCog,
@@ -16,5 +17,6 @@ __all__ = [
     HelpCog,
     QueueCog,
     StatsCog,
-    MatchCog
+    MatchCog,
+    MetricsCog
 ]
@@ -3,7 +3,7 @@
 import asyncio
 from discord.ext import commands
 
-from .utils import Player
+from .utils import ButtonStyle, Player, PlayerCache, button, edit_message, send_message
 
 
 class AuthCog(commands.Cog):
@@ -22,6 +22,7 @@ class AuthCog(commands.Cog):
             title = f'Unable to link **{ctx.author.display_name}**: They are already linked'
         else:
             link = await player.generate_link_url()
+            PlayerCache.invalidate(ctx.author.id)  # Don't serve the cached "not linked" once they finish linking
 
             if link:
                 # Send the author a DM containing this link
@@ -42,18 +43,49 @@ class AuthCog(commands.Cog):
             title='Are you sure you want to unlink your account?',
             description='**Your Steam account link and all stored data (rank, matches, stats) will be deleted**'
         )
-        embed.set_footer(text=f'Click the {check_mark} within the next {timeout} seconds to confirm')
-        msg = await ctx.send(embed=embed)
-        await msg.add_reaction(check_mark)
 
-        try:
-            await self.bot.wait_for('reaction_add', timeout=timeout, check=lambda r, u: u == ctx.author)
-        except asyncio.TimeoutError:  # Sender didn't react
-            embed.description = '*Account preserved*'
+        if self.bot.use_components:  # The bot may not receive reaction events, confirm with a button instead
+            menu_key = self.bot.interactions.new_key()
+            confirm_button = button(f'{menu_key}:confirm', label='Unlink', emoji=check_mark, style=ButtonStyle.DANGER)
+            embed.set_footer(text=f'Click the button within the next {timeout} seconds to confirm')
+            msg = await send_message(self.bot, ctx.channel, embed=embed, components=[confirm_button])
+            confirmed = self.bot.loop.create_future()
+
+            async def process_confirm(interaction):
+                """ Resolve once the sender clicks the button. """
+                if interaction.user_id != ctx.author.id:
+                    await interaction.reply('This isn\'t your account')
+                    return
+
+                await interaction.defer()
+
+                if not confirmed.done():
+                    confirmed.set_result(None)
+
+            with self.bot.interactions.listening(menu_key, process_confirm):
+                confirmation = asyncio.wait_for(confirmed, timeout)
+                embed.description = await self._confirm_unlink(ctx, confirmation)
+
+            embed.set_footer()
+            await edit_message(self.bot, ctx.channel.id, msg.id, embed=embed, components=[])
         else:
-            await Player(ctx.author).unlink()
-            embed.description = '*Account unlinked and deleted*'
+            embed.set_footer(text=f'Click the {check_mark} within the next {timeout} seconds to confirm')
+            msg = await ctx.send(embed=embed)
+            await msg.add_reaction(check_mark)
+            confirmation = self.bot.wait_for('reaction_add', timeout=timeout, check=lambda r, u: u == ctx.author)
+            embed.description = await self._confirm_unlink(ctx, confirmation)
+            embed.set_footer()
+            await msg.edit(embed=embed)
+            await msg.clear_reactions()
+
+    @staticmethod
+    async def _confirm_unlink(ctx, confirmation):
+        """ Unlink the sender once they confirm and return the outcome to show them. """
+        try:
+            await confirmation
+        except asyncio.TimeoutError:  # Sender didn't confirm
+            return '*Account preserved*'
 
-        embed.set_footer()
-        await msg.edit(embed=embed)
-        await msg.clear_reactions()
+        await Player(ctx.author).unlink()
+        PlayerCache.invalidate(ctx.author.id)
+        return '*Account unlinked and deleted*'
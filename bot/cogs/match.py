@@ -2,13 +2,17 @@
 
 import aiohttp
 import asyncio
+import contextlib
 import discord
 from discord.ext import commands
+import functools
 import random
 import sys
 import traceback
 
-from .utils import Map, MatchServer, PlayerStats, TeamMethod, CaptainMethod, MapMethod
+from .utils import (ButtonStyle, Map, MatchLifecycle, MatchServer, MatchState, PlayerCache, PlayerStats,
+                    ReactionButtons, TeamBalancer, TeamMethod, CaptainMethod, MapMethod, button, edit_message,
+                    paginated_selects, send_message)
 
 
 EMOJI_NUMBERS = [u'\u0030\u20E3',
@@ -22,6 +26,8 @@ EMOJI_NUMBERS = [u'\u0030\u20E3',
                  u'\u0038\u20E3',
                  u'\u0039\u20E3',
                  u'\U0001F51F']
+FIELD_MAX_LENGTH = 1024  # Discord's limits on the characters of embed field values and of whole embeds
+EMBED_MAX_LENGTH = 6000
 
 
 class PickError(ValueError):
@@ -32,10 +38,23 @@ class PickError(ValueError):
         self.message = message
 
 
+def _split_field(lines):
+    """ Split lines into as few embed field values as fit within Discord's field value limit. """
+    values = ['']
+
+    for line in lines:
+        if values[-1] and len(values[-1]) + len(line) + 1 > FIELD_MAX_LENGTH:
+            values.append('')
+
+        values[-1] += f'{line}\n'
+
+    return values
+
+
 class TeamDraftMenu(discord.Message):
     """ Message containing the components for a team draft. """
 
-    def __init__(self, ctx, bot, users):
+    def __init__(self, ctx, bot, users, players_stats):
         """ Copy constructor from a message and specific team draft args. """
         # Copy all attributes from message object
         for attr_name in ctx.message.__slots__:
@@ -50,6 +69,7 @@ class TeamDraftMenu(discord.Message):
         self.ctx = ctx
         self.bot = bot
         self.users = users
+        self.players_stats = players_stats
         self.pick_emojis = dict(zip(EMOJI_NUMBERS[1:], users))
         self.pick_order = '12211221'
         self.pick_number = None
@@ -57,6 +77,9 @@ class TeamDraftMenu(discord.Message):
         self.players = None
         self.teams = None
         self.future = None
+        self.record = None
+        self.buttons = ReactionButtons(self, 'team_draft')
+        self.menu_key = None
 
     @property
     def _active_picker(self):
@@ -64,7 +87,7 @@ class TeamDraftMenu(discord.Message):
         if self.pick_number is None:
             return None
 
-        picking_team_number = int(self.pick_order[self.pick_number])
+        picking_team_number = int(self.pick_order[self.pick_number % len(self.pick_order)])  # Repeats for big drafts
         picking_team = self.teams[picking_team_number - 1]  # Subtract 1 to get team's index
 
         if len(picking_team) == 0:
@@ -75,28 +98,48 @@ class TeamDraftMenu(discord.Message):
     def _draft_embed(self, title):
         """ Generate the menu embed based on the current status of the team draft. """
         embed = self.bot.embed_template(title=title)
-        embed.set_footer(text='React to any of the numbers below to pick the corresponding user')
+
+        if self.bot.use_components:
+            embed.set_footer(text='Pick players with the menu below')
+            labels = [f'**{num}.**' for num in range(1, len(self.users) + 1)]
+        else:
+            embed.set_footer(text='React to any of the numbers below to pick the corresponding user')
+            labels = list(self.pick_emojis)
+
+        team_fields = []
 
         for team in self.teams:
             team_name = '__Team__' if len(team) == 0 else f'__Team {team[0].display_name}__'
+            team_players = _split_field([p.display_name for p in team] or ['_Empty_'])
+            team_fields.append([(team_name, team_players[0])] + [('\u200b', value) for value in team_players[1:]])
+
+        # Big drafts leave out the profile links, then the picked players, to fit in the embed
+        for with_links, with_picked in ((True, True), (False, True), (False, False)):
+            lines = []
+
+            for label, user in zip(labels, self.users):
+                player = self.players_stats.get(user.id)
+
+                if any(user in team for team in self.teams):
+                    if with_picked:
+                        lines.append(f':heavy_multiplication_x:  ~~{user.display_name}~~')
+                elif player is None:
+                    lines.append(f'{label}  {user.display_name}')
+                elif with_links:
+                    lines.append(f'{label}  [{user.display_name}]({player.league_profile})  |  {player.score}')
+                else:
+                    lines.append(f'{label}  {user.display_name}  |  {player.score}')
 
-            if len(team) == 0:
-                team_players = '_Empty_'
-            else:
-                team_players = '\n'.join(p.display_name for p in team)
+            players_left = _split_field(lines or ['_Empty_'])
+            players_fields = [('__Players Left__', players_left[0])] + [('\u200b', value) for value in players_left[1:]]
+            fields = team_fields[0] + players_fields + team_fields[1]
 
-            embed.add_field(name=team_name, value=team_players)
+            if len(embed) + sum(len(name) + len(value) for name, value in fields) <= EMBED_MAX_LENGTH:
+                break
 
-        users_left_str = ''
+        for name, value in fields:
+            embed.add_field(name=name, value=value)
 
-        for index, (emoji, user) in enumerate(self.pick_emojis.items()):
-            if not any(user in team for team in self.teams):
-                users_left_str += f'{emoji}  [{user.display_name}]({self.players[index].league_profile})  | \
-                                    {self.players[index].score}\n'
-            else:
-                users_left_str += f':heavy_multiplication_x:  ~~{user.display_name}~~\n'
-
-        embed.insert_field_at(1, name='__Players Left__', value=users_left_str)
         return embed
 
     def _pick_player(self, picker, pickee):
@@ -135,35 +178,52 @@ class TeamDraftMenu(discord.Message):
         picking_team.append(pickee)
         self.pick_number += 1
 
+    def _apply_pick(self, picker, pickee):
+        """ Pick a player, give the last player left to the smaller team and return the menu title. """
+        self._pick_player(picker, pickee)
+
+        if len(self.users_left) == 1:
+            fat_kid_team = self.teams[0] if len(self.teams[0]) <= len(self.teams[1]) else self.teams[1]
+            fat_kid_team.append(self.users_left.pop(0))
+
+        return f'**Team {picker.display_name}** picked {pickee.display_name}'
+
+    async def _record_teams(self):
+        """ Pass the teams to the draft's record callback, if it has one. """
+        if self.record is not None:
+            await self.record(self.teams)
+
+    def _pick_components(self):
+        """ Build the select menus listing the players still in the player pool. """
+        options = [(user.display_name, str(user.id)) for user in self.users_left]
+        return paginated_selects(f'{self.menu_key}:pick', options, 'Pick a player')
+
+    def _pick_emojis_left(self):
+        """ Get the pick emojis of the players still in the player pool. """
+        return [emoji for emoji, user in self.pick_emojis.items() if user in self.users_left]
+
     async def _update_menu(self, title):
-        """ Update the message to reflect the current status of the team draft. """
-        await self.edit(embed=self._draft_embed(title))
+        """ Update the message and its pick buttons to reflect the current status of the team draft. """
+        await asyncio.gather(self.edit(embed=self._draft_embed(title)), self.buttons.sync(self._pick_emojis_left()))
 
-    async def _process_pick(self, reaction, user):
-        """ Handler function for player pick reactions. """
-        # Check that reaction is on this message and user is not the bot
-        if reaction.message.id != self.id or user == self.author:
-            return
+    async def _process_pick(self, payload):
+        """ Handler function for player pick reactions routed to this message. """
+        user = payload.member
 
         # Check that picked player is in the player pool
-        pick = self.pick_emojis.get(str(reaction.emoji), None)
+        pick = self.pick_emojis.get(str(payload.emoji), None)
 
         if pick is None or pick not in self.users_left:
-            await self.remove_reaction(reaction, user)
+            await self.remove_reaction(payload.emoji, user)
             return
 
-        # Attempt to pick the player for the team
+        # Attempt to pick the player for the team, their button is cleared with the menu update
         try:
-            self._pick_player(user, pick)
+            title = self._apply_pick(user, pick)
         except PickError as e:  # Player not picked
             title = e.message
-        else:  # Player picked
-            await self.clear_reaction(reaction.emoji)
-            title = f'**Team {user.display_name}** picked {pick.display_name}'
-
-        if len(self.users_left) == 1:
-            fat_kid_team = self.teams[0] if len(self.teams[0]) <= len(self.teams[1]) else self.teams[1]
-            fat_kid_team.append(self.users_left.pop(0))
+        else:
+            await self._record_teams()
 
         if len(self.users_left) == 0:
             if self.future is not None:
@@ -173,19 +233,42 @@ class TeamDraftMenu(discord.Message):
 
         await self._update_menu(title)
 
-    async def draft(self):
-        """ Start the team draft and return the teams after it's finished. """
-        # Initialize draft
-        config = await self.ctx.guild_config()
-        self.users_left = self.users.copy()  # Copy users to edit players remaining in the player pool
-        self.players = await PlayerStats.from_users(self.users)
-        self.teams = [[], []]
-        self.pick_number = 0
-        captain_method = config.captain_method
+    async def _process_pick_interaction(self, interaction):
+        """ Handler function for player pick selections routed to this menu. """
+        user = self.guild.get_member(interaction.user_id)
+        pick = self.guild.get_member(int(interaction.values[0])) if interaction.values else None
+
+        if user not in self.users:
+            await interaction.reply('You aren\'t in this draft')
+            return
+
+        if pick is None or pick not in self.users_left:
+            await interaction.reply('That player has already been picked')
+            return
+
+        try:
+            title = self._apply_pick(user, pick)
+        except PickError as e:  # Player not picked
+            await interaction.reply(e.message)
+            return
+
+        # Answer within the interaction's 3 seconds before recording the pick
+        if len(self.users_left) == 0:
+            await interaction.update(embed=self._draft_embed(title), components=[])
+            await self._record_teams()
+
+            if self.future is not None and not self.future.done():
+                self.future.set_result(None)
 
-        # Check captain methods
+            return
+
+        await interaction.update(embed=self._draft_embed(title), components=self._pick_components())
+        await self._record_teams()
+
+    def _choose_captains(self, captain_method):
+        """ Put the first player of each team in it according to the captain method. """
         if captain_method == CaptainMethod.RANK:
-            players_stats = [x async for x in PlayerStats.from_users(self.users_left)]
+            players_stats = [self.players_stats[user.id] for user in self.users_left if user.id in self.players_stats]
             players_stats.sort(reverse=True, key=lambda x: x.score)
 
             for team in self.teams:
@@ -205,20 +288,61 @@ class TeamDraftMenu(discord.Message):
         else:
             raise ValueError(f'Captain method "{captain_method}" isn\'t valid')
 
-        # Edit input message and add emoji button reactions
-        await self.edit(embed=self._draft_embed('Team draft has begun!'))
-
-        items = self.pick_emojis.items()
-        for emoji, user in items:
-            if user in self.users_left:
-                await self.add_reaction(emoji)
+    async def draft(self, teams=None, timeout=600, record=None):
+        """Start the team draft and return the teams after it's finished.
+
+        Parameters
+        ----------
+        teams : list, optional
+            Teams picked before the draft was interrupted, captain first, to resume the draft from.
+        timeout : float
+            Seconds the captains have to finish picking.
+        record : coroutine function, optional
+            Called with the teams after the captains are chosen and after every pick.
+        """
+        # Initialize draft
+        self.players = [self.players_stats[user.id] for user in self.users if user.id in self.players_stats]
+        self.record = record
+
+        if teams is None:
+            config = await self.ctx.guild_config()
+            self.users_left = self.users.copy()  # Copy users to edit players remaining in the player pool
+            self.teams = [[], []]
+            self.pick_number = 0
+            self._choose_captains(config.captain_method)
+            await self._record_teams()
+        else:
+            self.teams = [list(team) for team in teams]
+            self.users_left = [user for user in self.users if not any(user in team for team in self.teams)]
+            self.pick_number = sum(len(team) - 1 for team in self.teams if team)
 
         # Add listener handlers and wait until there are no users left to pick
         self.future = self.bot.loop.create_future()
-        self.bot.add_listener(self._process_pick, name='on_reaction_add')
-        await asyncio.wait_for(self.future, 600)
-        self.bot.remove_listener(self._process_pick, name='on_reaction_add')
-        await self.clear_reactions()
+
+        if not self.users_left:  # Draft was interrupted after the last pick
+            pass
+        elif self.bot.use_components:
+            # Render the draft with its pick menus in one edit
+            self.menu_key = self.bot.interactions.new_key()
+            await edit_message(self.bot, self.channel.id, self.id, embed=self._draft_embed('Team draft has begun!'),
+                               components=self._pick_components())
+
+            with self.bot.interactions.listening(self.menu_key, self._process_pick_interaction):
+                await asyncio.wait_for(self.future, timeout)
+        else:
+            # Edit input message and start adding emoji button reactions, picks are taken once the first is added
+            if teams is None:
+                adding = self.buttons.seed(self._pick_emojis_left())
+            else:  # Keep the buttons left on the message by the interrupted draft
+                self.buttons.adopt()
+                adding = self.buttons.sync(self._pick_emojis_left())
+
+            await asyncio.gather(self.edit(embed=self._draft_embed('Team draft has begun!')), adding)
+
+            with self.bot.reactions.listening(self.id, self._process_pick):
+                await asyncio.wait_for(self.future, timeout)
+
+            await self.buttons.clear()
 
         # Return class to original state after team drafting is done
         picked_teams = self.teams
@@ -226,6 +350,7 @@ class TeamDraftMenu(discord.Message):
         self.users_left = None
         self.teams = None
         self.future = None
+        self.record = None
 
         return picked_teams
 
@@ -267,6 +392,9 @@ class MapDraftMenu(discord.Message):
         self.maps_left = None
         self.ban_number = None
         self.future = None
+        self.record = None
+        self.buttons = ReactionButtons(self, 'map_draft')
+        self.menu_key = None
 
     @property
     def _active_picker(self):
@@ -280,7 +408,12 @@ class MapDraftMenu(discord.Message):
     def _draft_embed(self, title):
         """ Generate the menu embed based on the current status of the map draft. """
         embed = self.bot.embed_template(title=title)
-        embed.set_footer(text='React to any of the map icons below to ban the corresponding map')
+
+        if self.bot.use_components:
+            embed.set_footer(text='Press any of the map buttons below to ban the corresponding map')
+        else:
+            embed.set_footer(text='React to any of the map icons below to ban the corresponding map')
+
         maps_str = ''
         x_emoji = ':heavy_multiplication_x:'
 
@@ -301,35 +434,40 @@ class MapDraftMenu(discord.Message):
         return embed
 
     async def _update_menu(self, title):
-        """ Update the message to reflect the current status of the map draft. """
-        await self.edit(embed=self._draft_embed(title))
-        awaitables = [self.clear_reaction(self.bot.emoji_dict[m.dev_name])
-                      for m in self.map_pool if self.bot.emoji_dict[m.dev_name] not in self.maps_left]
-        await asyncio.gather(*awaitables, loop=self.bot.loop)
-
-    async def _process_ban(self, reaction, user):
-        """ Handler function for map ban reactions. """
-        # Check that reaction is on this message and user is not the bot
-        if reaction.message.id != self.id or user == self.author:
-            return
+        """ Update the message and its ban buttons to reflect the current status of the map draft. """
+        await asyncio.gather(self.edit(embed=self._draft_embed(title)), self.buttons.sync(self.maps_left))
+
+    async def _record_bans(self):
+        """ Pass the dev names of the banned maps to the draft's record callback, if it has one. """
+        if self.record is not None:
+            maps_left = self.maps_left.values()
+            await self.record([m.dev_name for m in self.map_pool if m not in maps_left])
+
+    def _ban_components(self):
+        """ Build a button for every map of the pool, disabled once the map is banned. """
+        return [button(f'{self.menu_key}:{m.dev_name}', label=m.name, emoji=self.bot.emoji_dict[m.dev_name],
+                       disabled=self.bot.emoji_dict[m.dev_name] not in self.maps_left)
+                for m in self.map_pool]
+
+    async def _process_ban(self, payload):
+        """ Handler function for map ban reactions routed to this message. """
+        user = payload.member
 
         # Check that user is the active captain and reaction in left maps
-        if user != self._active_picker or str(reaction) not in [m for m in self.maps_left]:
-            await self.remove_reaction(reaction, user)
+        if user != self._active_picker or str(payload.emoji) not in [m for m in self.maps_left]:
+            await self.remove_reaction(payload.emoji, user)
             return
 
         # Ban map if the emoji is valid
         try:
-            map_ban = self.maps_left.pop(str(reaction))
+            map_ban = self.maps_left.pop(str(payload.emoji))
         except KeyError:
             return
 
         self.ban_number += 1
+        await self._record_bans()
 
-        # Clear banned map reaction
-        await self.clear_reaction(map_ban.emoji)
-
-        # Check if the draft is over
+        # Check if the draft is over, the banned map's button is cleared with the menu update otherwise
         if len(self.maps_left) == 1:
             if self.future is not None:
                 self.future.set_result(None)
@@ -338,31 +476,89 @@ class MapDraftMenu(discord.Message):
 
         await self._update_menu(f'**{user.display_name}** banned {map_ban.name}')
 
-    async def draft(self, captain_1, captain_2):
-        """ Start the team draft and return the teams after it's finished. """
+    async def _process_ban_interaction(self, interaction):
+        """ Handler function for map ban buttons routed to this menu. """
+        user = self.guild.get_member(interaction.user_id)
+
+        if user != self._active_picker:
+            await interaction.reply('It is not your turn to ban')
+            return
+
+        map_ban = self.maps_left.pop(self.bot.emoji_dict.get(interaction.action), None)
+
+        if map_ban is None:
+            await interaction.reply('That map has already been banned')
+            return
+
+        self.ban_number += 1
+        embed = self._draft_embed(f'**{user.display_name}** banned {map_ban.name}')
+
+        # Check if the draft is over, answering within the interaction's 3 seconds before recording the ban
+        if len(self.maps_left) == 1:
+            await interaction.update(embed=embed, components=[])
+            await self._record_bans()
+
+            if self.future is not None and not self.future.done():
+                self.future.set_result(None)
+
+            return
+
+        await interaction.update(embed=embed, components=self._ban_components())
+        await self._record_bans()
+
+    async def draft(self, captain_1, captain_2, banned=(), timeout=600, record=None):
+        """Start the map draft and return the picked map after it's finished.
+
+        Parameters
+        ----------
+        captain_1 : discord.Member
+        captain_2 : discord.Member
+        banned : Iterable[str]
+            Dev names of the maps banned before the draft was interrupted, to resume the draft from.
+        timeout : float
+            Seconds the captains have to finish banning.
+        record : coroutine function, optional
+            Called with the dev names of the banned maps after every ban.
+        """
         # Initialize draft
-        config = await self.ctx.guild_config()
+        config = await self.bot.guild_configs.get(self.guild.id)
         self.captains = [captain_1, captain_2]
         mp_dict = config.map_pool.to_dict
         self.map_pool = [m for m in self.all_maps if mp_dict[m.dev_name]]
-        self.maps_left = {self.bot.emoji_dict[m.dev_name]: m for m in self.map_pool}
-        self.ban_number = 0
+        self.maps_left = {self.bot.emoji_dict[m.dev_name]: m for m in self.map_pool if m.dev_name not in banned}
+        self.ban_number = len(self.map_pool) - len(self.maps_left)
+        self.record = record
 
         if len(self.map_pool) % 2 == 0:
             self.captains.reverse()
 
-        # Edit input message and add emoji button reactions
-        await self.edit(embed=self._draft_embed('Map bans have begun!'))
-
-        for m in self.map_pool:
-            await self.add_reaction(self.bot.emoji_dict[m.dev_name])
-
         # Add listener handlers and wait until there are no maps left to ban
         self.future = self.bot.loop.create_future()
-        self.bot.add_listener(self._process_ban, name='on_reaction_add')
-        await asyncio.wait_for(self.future, 600)
-        self.bot.remove_listener(self._process_ban, name='on_reaction_add')
-        await self.clear_reactions()
+
+        if len(self.maps_left) == 1:  # Draft was interrupted after the last ban
+            pass
+        elif self.bot.use_components:
+            # Render the draft with its ban buttons in one edit
+            self.menu_key = self.bot.interactions.new_key()
+            await edit_message(self.bot, self.channel.id, self.id, embed=self._draft_embed('Map bans have begun!'),
+                               components=self._ban_components())
+
+            with self.bot.interactions.listening(self.menu_key, self._process_ban_interaction):
+                await asyncio.wait_for(self.future, timeout)
+        else:
+            # Edit input message and start adding emoji button reactions, bans are taken once the first is added
+            if self.ban_number == 0:
+                adding = self.buttons.seed(self.maps_left)
+            else:  # Keep the buttons left on the message by the interrupted draft
+                self.buttons.adopt()
+                adding = self.buttons.sync(self.maps_left)
+
+            await asyncio.gather(self.edit(embed=self._draft_embed('Map bans have begun!')), adding)
+
+            with self.bot.reactions.listening(self.id, self._process_ban):
+                await asyncio.wait_for(self.future, timeout)
+
+            await self.buttons.clear()
 
         # Return class to original state after map drafting is done
         map_pick = list(self.maps_left.values())[0]  # Get map pick before setting self.maps_left to None
@@ -371,6 +567,7 @@ class MapDraftMenu(discord.Message):
         self.maps_left = None
         self.ban_number = None
         self.future = None
+        self.record = None
 
         return map_pick
 
@@ -398,32 +595,39 @@ class MapVoteMenu(discord.Message):
         self.map_choices = None
         self.map_votes = None
         self.future = None
+        self.buttons = ReactionButtons(self, 'map_vote')
+        self.menu_key = None
 
     def _vote_embed(self):
         embed = self.bot.embed_template(title='Map vote started! (1 min)')
         embed.add_field(name="Map", value='\n\n'.join(
-            f'{self.bot.emoji_dict[m.dev_name]} {m.name}' for m in self.map_pool))
+            f'{self.bot.emoji_dict[m.dev_name]} {m.name}' for m in self.map_choices))
         embed.add_field(name="Votes", value='\n\n'.join(
-            EMOJI_NUMBERS[self.map_votes[self.bot.emoji_dict[m.dev_name]]] for m in self.map_pool))
-        embed.set_footer(text='React to either of the map icons below to vote for the corresponding map')
+            EMOJI_NUMBERS[self.map_votes[self.bot.emoji_dict[m.dev_name]]] for m in self.map_choices))
+
+        if self.bot.use_components:
+            embed.set_footer(text='Press either of the map buttons below to vote for the corresponding map')
+        else:
+            embed.set_footer(text='React to either of the map icons below to vote for the corresponding map')
+
         return embed
 
-    async def _process_vote(self, reaction, user):
+    def _vote_components(self):
+        """ Build a button for every map choice. """
+        return [button(f'{self.menu_key}:{m.dev_name}', label=m.name, emoji=self.bot.emoji_dict[m.dev_name])
+                for m in self.map_choices]
+
+    async def _process_vote(self, payload):
         """"""
-        # Check that reaction is on this message and user is not the bot
-        if reaction.message.id != self.id or user == self.author:
-            return
+        user = payload.member
+        emoji = str(payload.emoji)
 
         # Add map vote if it is valid
-        if user not in self.users or user in self.voted_users or str(reaction) not in [m.emoji for m in self.map_pool]:
-            await self.remove_reaction(reaction, user)
-            return
-
-        try:
-            self.map_votes[str(reaction)] += 1
-        except KeyError:
+        if user not in self.users or user in self.voted_users or emoji not in self.map_votes:
+            await self.remove_reaction(payload.emoji, user)
             return
 
+        self.map_votes[emoji] += 1
         self.voted_users.add(user)
         embed = self._vote_embed()
         await self.edit(embed=embed)
@@ -433,10 +637,42 @@ class MapVoteMenu(discord.Message):
             if self.future is not None:
                 self.future.set_result(None)
 
-    async def vote(self):
-        """"""
+    async def _process_vote_interaction(self, interaction):
+        """ Handler function for map vote buttons routed to this menu. """
+        user = self.guild.get_member(interaction.user_id)
+
+        if user not in self.users:
+            await interaction.reply('You aren\'t in this match')
+            return
+
+        if user in self.voted_users:
+            await interaction.reply('You already voted')
+            return
+
+        emoji = self.bot.emoji_dict.get(interaction.action)
+
+        if emoji not in self.map_votes:
+            await interaction.reply('That map isn\'t in the vote')
+            return
+
+        self.map_votes[emoji] += 1
+        self.voted_users.add(user)
+
+        # Check if the voting is over
+        if len(self.voted_users) == len(self.users):
+            await interaction.update(embed=self._vote_embed(), components=[])
+
+            if self.future is not None and not self.future.done():
+                self.future.set_result(None)
+
+            return
+
+        await interaction.update(embed=self._vote_embed(), components=self._vote_components())
+
+    async def vote(self, timeout=60):
+        """ Start a vote between two random maps of the pool and return the winner after the timeout. """
         self.voted_users = set()
-        config = await self.ctx.guild_config()
+        config = await self.bot.guild_configs.get(self.guild.id)
         mp_dict = config.map_pool.to_dict
         self.map_pool = [m for m in self.all_maps if mp_dict[m.dev_name]]
         random.shuffle(self.map_pool)
@@ -444,22 +680,30 @@ class MapVoteMenu(discord.Message):
         self.map_votes = {
             self.bot.emoji_dict[m.dev_name]: 0 for m in self.map_pool[:2]}
         embed = self._vote_embed()
-        await self.edit(embed=embed)
-
-        for map_option in self.map_choices:
-            await self.add_reaction(self.bot.emoji_dict[map_option.dev_name])
 
         # Add listener handlers and wait until there are no maps left to ban
         self.future = self.bot.loop.create_future()
-        self.bot.add_listener(self._process_vote, name='on_reaction_add')
 
-        try:
-            await asyncio.wait_for(self.future, 60)
-        except asyncio.TimeoutError:
-            pass
+        if self.bot.use_components:
+            # Render the vote with its buttons in one edit
+            self.menu_key = self.bot.interactions.new_key()
+            await edit_message(self.bot, self.channel.id, self.id, embed=embed, components=self._vote_components())
 
-        self.bot.remove_listener(self._process_vote, name='on_reaction_add')
-        await self.clear_reactions()
+            with self.bot.interactions.listening(self.menu_key, self._process_vote_interaction):
+                try:
+                    await asyncio.wait_for(self.future, timeout)
+                except asyncio.TimeoutError:  # Remove the buttons of the unfinished vote
+                    await edit_message(self.bot, self.channel.id, self.id, embed=self._vote_embed(), components=[])
+        else:
+            await asyncio.gather(self.edit(embed=embed), self.buttons.seed(self.map_votes))
+
+            with self.bot.reactions.listening(self.id, self._process_vote):
+                try:
+                    await asyncio.wait_for(self.future, timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            await self.buttons.clear()
 
         # Gather results
         winners_emoji = []
@@ -474,7 +718,7 @@ class MapVoteMenu(discord.Message):
                 winners_emoji.append(emoji)
 
         winner_emoji = winners_emoji[0] if len(winners_emoji) == 1 else random.choice(winners_emoji)
-        winner_map = [m for m in self.map_pool if m.emoji == winner_emoji][0]
+        winner_map = next(m for m in self.map_choices if self.bot.emoji_dict[m.dev_name] == winner_emoji)
 
         # Return class to original state after map drafting is done
         self.map_pool = None
@@ -487,48 +731,65 @@ class MapVoteMenu(discord.Message):
 
 class MatchCog(commands.Cog):
     """ Handles everything needed to create matches. """
+    ready_timeout = 60.0
+    draft_timeout = 600.0
+    vote_timeout = 60.0
 
     def __init__(self, bot):
         """ Set attributes. """
         self.bot = bot
-        self.pending_ready_tasks = {}
+        self.pending_ready_tasks = {}  # Ready check message ID -> future resolved once everyone readied up
         self.all_maps = ALL_MAPS
+        self.balancer = TeamBalancer()
+        self.resumed_shards = set()
+        self.resume_tasks = set()
+
+    @staticmethod
+    def _members(guild, user_ids):
+        """ Get the members of a guild from their IDs in order, leaving out the ones who left it. """
+        return [member for member in map(guild.get_member, user_ids) if member is not None]
+
+    async def draft_teams(self, ctx, users, players_stats, lifecycle=None):
+        """ Create a TeamDraftMenu from an existing message and run the draft, resuming the lifecycle's picks. """
+        menu = TeamDraftMenu(ctx, self.bot, users, players_stats)
+
+        if lifecycle is None:
+            teams = await menu.draft(timeout=self.draft_timeout)
+        else:
+            async def record(picked_teams):
+                await lifecycle.record(team_one=[user.id for user in picked_teams[0]],
+                                       team_two=[user.id for user in picked_teams[1]])
+
+            teams = None
+
+            if lifecycle.team_one or lifecycle.team_two:  # Draft was interrupted
+                teams = [self._members(ctx.guild, lifecycle.team_one), self._members(ctx.guild, lifecycle.team_two)]
+
+            teams = await menu.draft(teams, lifecycle.remaining(self.draft_timeout), record)
 
-    async def draft_teams(self, ctx, users):
-        """ Create a TeamDraftMenu from an existing message and run the draft. """
-        menu = TeamDraftMenu(ctx, self.bot, users)
-        teams = await menu.draft()
         return teams[0], teams[1]
 
-    async def autobalance_teams(self, users):
-        """ Balance teams based on players' RankMe score. """
+    async def autobalance_teams(self, users, players_stats, parties=(), avoid=()):
+        """ Balance teams based on players' weighted ratings, keeping parties together and avoiders apart. """
         # Only balance teams with even amounts of players
         if len(users) % 2 != 0:
             raise ValueError('Users argument must have even length')
 
-        # Get players and sort by RankMe score
-        stats_dict = dict(
-            zip([x async for x in PlayerStats.from_users(users)], users)
-        )
-        players = list(stats_dict.keys())
-        players.sort(key=lambda x: x.score)
+        players = [players_stats.get(user.id) for user in users]
+        await self.bot.leaderboard.update(users[0].guild, *filter(None, players))
 
         # Balance teams
-        team_size = len(players) // 2
-        team_one = [players.pop()]
-        team_two = [players.pop()]
-
-        while players:
-            if len(team_one) >= team_size:
-                team_two.append(players.pop())
-            elif len(team_two) >= team_size:
-                team_one.append(players.pop())
-            elif sum(p.score for p in team_one) < sum(p.score for p in team_two):
-                team_one.append(players.pop())
-            else:
-                team_two.append(players.pop())
-
-        return list(map(stats_dict.get, team_one)), list(map(stats_dict.get, team_two))
+        ratings = [self.balancer.rating(player) if player else 0 for player in players]
+        indexes = {user: index for index, user in enumerate(users)}
+        parties = [[indexes[user] for user in party] for party in parties]
+        avoid = [(indexes[user_1], indexes[user_2]) for user_1, user_2 in avoid]
+        result = self.balancer.balance(ratings, parties, avoid)
+        self.bot.logger.info(f'Balanced {len(users)} players with a rating gap of {result.gap:.2f} '
+                             f'in {result.elapsed * 1000:.1f}ms ({"exact" if result.exact else "heuristic"})')
+
+        # Strongest player of each team first
+        return [[users[index] for index in sorted(team, key=ratings.__getitem__, reverse=True)]
+                for team in (result.team_one, result.team_two)]
 
     @staticmethod
     async def randomize_teams(users):
@@ -538,16 +799,24 @@ class MatchCog(commands.Cog):
         team_size = len(temp_users) // 2
         return temp_users[:team_size], temp_users[team_size:]
 
-    async def draft_maps(self, message, captain_1, captain_2):
-        """"""
+    async def draft_maps(self, message, captain_1, captain_2, lifecycle=None):
+        """ Create a MapDraftMenu from an existing message and run the draft, resuming the lifecycle's bans. """
         menu = MapDraftMenu(message, self.bot)
-        map_pick = await menu.draft(captain_1, captain_2)
-        return map_pick
 
-    async def vote_maps(self, message, users):
-        """"""
+        if lifecycle is None:
+            return await menu.draft(captain_1, captain_2, timeout=self.draft_timeout)
+
+        async def record(banned_maps):
+            await lifecycle.record(banned_maps=banned_maps)
+
+        return await menu.draft(captain_1, captain_2, lifecycle.banned_maps, lifecycle.remaining(self.draft_timeout),
+                                record)
+
+    async def vote_maps(self, message, users, lifecycle=None):
+        """ Create a MapVoteMenu from an existing message and run the vote, votes aren't kept across restarts. """
         menu = MapVoteMenu(message, self.bot, users)
-        voted_map = await menu.vote()
+        timeout = self.vote_timeout if lifecycle is None else lifecycle.remaining(self.vote_timeout)
+        voted_map = await menu.vote(timeout)
         return voted_map
 
     async def random_map(self, ctx):
@@ -557,109 +826,355 @@ class MatchCog(commands.Cog):
         map_pool = [m for m in self.all_maps if mp_dict[m.dev_name]]
         return random.choice(map_pool)
 
-    async def start_match(self, ctx, users):
-        """ Ready all the users up and start a match. """
-        # Notify everyone to ready up
-        user_mentions = ''.join(user.mention for user in users)
-        ready_emoji = '✅'
-        description = f'React with the {ready_emoji} below to ready up (1 min)'
-        burst_embed = self.bot.embed_template(title='Queue has filled up!', description=description)
-        ready_message = await ctx.send(user_mentions, embed=burst_embed)
-        await ready_message.add_reaction(ready_emoji)
-
-        # Wait for everyone to ready up
-        reactors = set()  # Track who has readied up
-
-        def all_ready(reaction, user):
-            """ Check if all players in the queue have readied up. """
-            # Check if this is a reaction we care about
-            if reaction.message.id != ready_message.id or user not in users or reaction.emoji != ready_emoji:
-                return False
-
-            reactors.add(user)
-
-            if reactors.issuperset(users):  # All queued users have reacted
-                return True
-            else:
-                return False
+    def split_lobbies(self, users, players_stats, lobby_size):
+        """ Split the first users of the queue, given in queue order, into lobbies of similarly rated players. """
+        num_lobbies = len(users) // lobby_size
+        users = users[:num_lobbies * lobby_size]  # Earliest to join get the spots, the queue's order survives restarts
+        ratings = {user: self.balancer.rating(players_stats[user.id]) if user.id in players_stats else 0
+                   for user in users}
+        users.sort(key=ratings.get, reverse=True)
+        return [users[index:index + lobby_size] for index in range(0, len(users), lobby_size)]
 
+    @staticmethod
+    async def _players_in_match(users):
+        """ Get the IDs of the users the API currently has in a match, bypassing the stats cache. """
+        PlayerCache.stats.invalidate(*(user.id for user in users))
+        return {player.discord async for player in PlayerStats.from_users(users) if player.in_match}
+
+    def _phase_timeout(self, state, config):
+        """ Seconds the users have to finish a phase with the guild's methods, or None if it doesn't need input. """
+        if state == MatchState.TEAM_DRAFT and config.team_method == TeamMethod.CAPTAINS:
+            return self.draft_timeout
+        elif state == MatchState.MAP_SELECT and config.map_method == MapMethod.CAPTAINS:
+            return self.draft_timeout
+        elif state == MatchState.MAP_SELECT and config.map_method == MapMethod.VOTE:
+            return self.vote_timeout
+
+        return None
+
+    async def start_lobby(self, ctx, message, users, players_stats, config, lifecycle):
+        """Create the teams of a lobby, pick the map and start its match on the message.
+
+        Every phase is recorded in the match's lifecycle as it's reached, so a lobby resumed after a restart skips the
+        phases it already went through. The match is cancelled if a phase fails or times out.
+        """
         try:
-            if ctx.guild in self.pending_ready_tasks:
-                self.pending_ready_tasks[ctx.guild].close()
-
-            self.pending_ready_tasks[ctx.guild] = self.bot.wait_for('reaction_add', timeout=60.0, check=all_ready)
-            await self.pending_ready_tasks[ctx.guild]
-        except asyncio.TimeoutError:  # Not everyone readied up
-            unreadied = set(users) - reactors
-            awaitables = [
-                ready_message.clear_reactions(),
-                ctx.dequeue_users(*unreadied)
-            ]
-            await asyncio.gather(*awaitables, loop=self.bot.loop)
-            description = '\n'.join(':heavy_multiplication_x:  ' + user.mention for user in unreadied)
-            title = 'Not everyone was ready!'
-            burst_embed = self.bot.embed_template(title=title, description=description)
-            burst_embed.set_footer(text='The missing players have been removed from the queue')
-            await ready_message.edit(embed=burst_embed)
-            return False  # Not everyone readied up
-        else:  # Everyone readied up
-            self.pending_ready_tasks.pop(ctx.guild)
-            # Attempt to make teams and start match
-            awaitables = [
-                ready_message.clear_reactions(),
-                ctx.guild_config()
-            ]
-            results = await asyncio.gather(*awaitables, loop=self.bot.loop)
-            team_method = results[1].team_method
-            map_method = results[1].map_method
-
-            ready_ctx = await self.bot.get_context(ready_message)
-
-            # Create teams
+            await self._run_lobby(ctx, message, users, players_stats, config, lifecycle)
+        except asyncio.CancelledError:  # Not cancelled when the bot is closing, so it resumes on the next start
+            raise
+        except Exception:
+            await lifecycle.cancel()
+            raise
+
+    async def _run_lobby(self, ctx, message, users, players_stats, config, lifecycle):
+        team_method = config.team_method
+        map_method = config.map_method
+        lobby_ctx = await self.bot.get_context(message)
+
+        # Create teams
+        if lifecycle.state == MatchState.TEAM_DRAFT:
             if team_method == TeamMethod.AUTOBALANCE:
-                team_one, team_two = await self.autobalance_teams(users)
+                team_one, team_two = await self.autobalance_teams(users, players_stats)
             elif team_method == TeamMethod.CAPTAINS:
-                team_one, team_two = await self.draft_teams(ready_ctx, users)
+                team_one, team_two = await self.draft_teams(lobby_ctx, users, players_stats, lifecycle)
             elif team_method == TeamMethod.RANDOM:
                 team_one, team_two = await self.randomize_teams(users)
             else:
                 raise ValueError(f'Team method "{team_method}" isn\'t valid')
 
-            # Get map pick
+            await lifecycle.advance(MatchState.MAP_SELECT, self._phase_timeout(MatchState.MAP_SELECT, config),
+                                    team_one=[user.id for user in team_one], team_two=[user.id for user in team_two])
+        else:  # Teams were made before a restart
+            team_one = self._members(ctx.guild, lifecycle.team_one)
+            team_two = self._members(ctx.guild, lifecycle.team_two)
+
+        # Get map pick
+        if lifecycle.state == MatchState.MAP_SELECT:
             if map_method == MapMethod.CAPTAINS:
-                map_pick = await self.draft_maps(ready_message, team_one[0], team_two[0])
+                map_pick = await self.draft_maps(message, team_one[0], team_two[0], lifecycle)
             elif map_method == MapMethod.VOTE:
-                map_pick = await self.vote_maps(ready_message, users)
+                map_pick = await self.vote_maps(message, users, lifecycle)
             elif map_method == MapMethod.RANDOM:
                 map_pick = await self.random_map(ctx)
             else:
                 raise ValueError(f'Map method "{map_method}" isn\'t valid')
 
-            burst_embed = self.bot.embed_template(description='Fetching server...')
-            await ready_message.edit(embed=burst_embed)
+            await lifecycle.advance(MatchState.SERVER_REQUESTED, map=map_pick.dev_name)
+        else:  # Map was picked before a restart, the server may have been requested too
+            map_pick = next(m for m in self.all_maps if m.dev_name == lifecycle.map)
+            players_in_match = await self._players_in_match(users)
+
+            if players_in_match:  # Don't start a second server for players the API may already have given one
+                if players_in_match.issuperset(user.id for user in users):
+                    await lifecycle.advance(MatchState.LIVE)
+                    title = 'Match server is ready!'
+                    description = 'The server was started before the bot restarted and its address was lost. ' \
+                                  'Find it on the CS:GO League site.'
+                else:
+                    await lifecycle.cancel()
+                    title = 'There was a problem!'
+                    description = 'Some players are already in a match, so the server wasn\'t requested again.'
 
-            # Check if able to get a match server and edit message embed accordingly
-            try:
-                match = await MatchServer.new_match(team_one, team_two, map_pick.dev_name)  # API start match
-            except aiohttp.ClientResponseError as e:
-                description = 'Sorry! Looks like there aren\'t any servers available at this time. ' \
-                              'Please try again later.'
-                burst_embed = self.bot.embed_template(title='There was a problem!', description=description)
-                traceback.print_exception(type(e), e, e.__traceback__, file=sys.stderr)  # Print exception to stderr
+                await message.edit(embed=self.bot.embed_template(title=title, description=description))
+                return
+
+        burst_embed = self.bot.embed_template(description='Fetching server...')
+        await message.edit(embed=burst_embed)
+
+        # Check if able to get a match server and edit message embed accordingly
+        try:
+            match = await MatchServer.new_match(team_one, team_two, map_pick.dev_name)  # API start match
+        except aiohttp.ClientResponseError as e:
+            description = 'Sorry! Looks like there aren\'t any servers available at this time. ' \
+                          'Please try again later.'
+            burst_embed = self.bot.embed_template(title='There was a problem!', description=description)
+            traceback.print_exception(type(e), e, e.__traceback__, file=sys.stderr)  # Print exception to stderr
+            await lifecycle.cancel()
+        else:
+            PlayerCache.stats.invalidate(*(user.id for user in users))  # Players are now in a match
+            await lifecycle.advance(MatchState.LIVE)
+            description = f'URL: {match.connect_url}\nCommand: `{match.connect_command}`'
+            burst_embed = self.bot.embed_template(title='Match server is ready!', description=description)
+            burst_embed.set_author(name=f'Match #{match.id}', url=match.match_page, icon_url=map_pick.icon_url)
+
+            for team in [team_one, team_two]:
+                team_name = f'__Team {team[0].display_name}__'
+                burst_embed.add_field(name=team_name, value='\n'.join(user.mention for user in team))
+
+            burst_embed.set_thumbnail(url=map_pick.image_url)
+            burst_embed.set_footer(text='Server will close after 5 minutes if anyone doesn\'t join')
+
+        await message.edit(embed=burst_embed)
+
+    async def ready_check(self, ctx, users, lifecycle=None):
+        """Send a ready check to the users, or resume the lifecycle's one on the context's message, and wait on it.
+
+        A new ready check is recorded as a new match. Ready ups are taken as soon as the check is shown, including while
+        the match is being recorded. Returns the ready check message, the match's lifecycle and the users who readied
+        up, in queue order, once all of them did or the check timed out.
+        """
+        user_mentions = ''.join(user.mention for user in users)
+        ready_emoji = '✅'
+        reactors = set()  # Track who has readied up
+        all_ready = self.bot.loop.create_future()  # Result is whether the last ready up already removed the buttons
+
+        if lifecycle is not None:  # Ready ups recorded before a restart
+            reactors.update(self._members(ctx.guild, lifecycle.ready_users))
+
+        with contextlib.ExitStack() as listening:
+            if self.bot.use_components:
+                menu_key = self.bot.interactions.new_key()
+                description = 'Press the button below to ready up (1 min)'
+                burst_embed = self.bot.embed_template(title='Queue has filled up!', description=description)
+                ready_button = button(f'{menu_key}:ready', label='Ready', emoji=ready_emoji, style=ButtonStyle.SUCCESS)
+
+                async def process_ready(interaction):
+                    """ Track the users readying up and resolve once all of them have. """
+                    user = ctx.guild.get_member(interaction.user_id)
+
+                    if user not in users:
+                        await interaction.reply('You aren\'t in this match')
+                        return
+
+                    reactors.add(user)
+
+                    if not reactors.issuperset(users) or all_ready.done():
+                        await interaction.defer()
+
+                        if lifecycle is not None:  # Otherwise recorded once the match is
+                            await lifecycle.record(ready_users=[user.id for user in users if user in reactors])
+
+                        return
+
+                    try:  # All queued users have readied up, the last click removes the button
+                        await interaction.update(embed=burst_embed, components=[])
+                    finally:
+                        all_ready.set_result(True)
+
+                # Listen before the button is shown so no click finds the menu expired
+                listening.enter_context(self.bot.interactions.listening(menu_key, process_ready))
+
+                if lifecycle is None:
+                    ready_message = await send_message(self.bot, ctx.channel, user_mentions, burst_embed,
+                                                       [ready_button])
+                else:  # The previous run's button has expired, replace it
+                    ready_message = ctx.message
+                    await edit_message(self.bot, ctx.channel.id, ready_message.id, components=[ready_button])
+
+                clear_ready = functools.partial(edit_message, self.bot, ctx.channel.id, ready_message.id,
+                                                components=[])
             else:
-                description = f'URL: {match.connect_url}\nCommand: `{match.connect_command}`'
-                burst_embed = self.bot.embed_template(title='Match server is ready!', description=description)
-                burst_embed.set_author(name=f'Match #{match.id}', url=match.match_page, icon_url=map_pick.icon_url)
+                async def process_ready(payload):
+                    """ Track the users readying up and resolve once all of them have. """
+                    if payload.member not in users or str(payload.emoji) != ready_emoji:
+                        return
+
+                    reactors.add(payload.member)
+
+                    if reactors.issuperset(users) and not all_ready.done():  # All queued users have reacted
+                        all_ready.set_result(False)
+
+                if lifecycle is None:
+                    description = f'React with the {ready_emoji} below to ready up (1 min)'
+                    burst_embed = self.bot.embed_template(title='Queue has filled up!', description=description)
+                    ready_message = await ctx.send(user_mentions, embed=burst_embed)
+                    listening.enter_context(self.bot.reactions.listening(ready_message.id, process_ready))
+                    ready_buttons = ReactionButtons(ready_message, 'ready_check')
+                    await ready_buttons.seed([ready_emoji])
+                else:  # Reactions added while the bot was down are still on the message
+                    ready_message = ctx.message
+                    listening.enter_context(self.bot.reactions.listening(ready_message.id, process_ready))
+                    ready_buttons = ReactionButtons(ready_message, 'ready_check')
+                    ready_buttons.adopt()
+
+                    for reaction in ready_message.reactions:
+                        if str(reaction.emoji) == ready_emoji:
+                            ready_ids = {user.id async for user in reaction.users()}
+                            reactors.update(user for user in users if user.id in ready_ids)
+
+                    await ready_buttons.sync([ready_emoji])
+
+                clear_ready = ready_buttons.clear
+
+            if lifecycle is None:
+                lifecycle = await MatchLifecycle.create(self.bot.db_pool, ctx.guild.id, ctx.channel.id,
+                                                        ready_message.id, [user.id for user in users],
+                                                        timeout=self.ready_timeout)
+
+                if reactors and not all_ready.done():  # Ready ups taken while the match was being recorded
+                    await lifecycle.record(ready_users=[user.id for user in users if user in reactors])
+            elif reactors.issuperset(users) and not all_ready.done():  # Everyone readied up before the restart
+                all_ready.set_result(False)
+
+            # Wait for everyone to ready up
+            self.pending_ready_tasks[ready_message.id] = all_ready
+
+            try:
+                buttons_removed = await asyncio.wait_for(all_ready, lifecycle.remaining(self.ready_timeout))
+            except asyncio.TimeoutError:  # Not everyone readied up
+                await clear_ready()
+                return ready_message, lifecycle, [user for user in users if user in reactors]
+            finally:
+                self.pending_ready_tasks.pop(ready_message.id, None)
 
-                for team in [team_one, team_two]:
-                    team_name = f'__Team {team[0].display_name}__'
-                    burst_embed.add_field(name=team_name, value='\n'.join(user.mention for user in team))
+        if not buttons_removed:
+            await clear_ready()
 
-                burst_embed.set_thumbnail(url=map_pick.image_url)
-                burst_embed.set_footer(text='Server will close after 5 minutes if anyone doesn\'t join')
+        return ready_message, lifecycle, users
+
+    async def start_match(self, ctx, users, players_stats=None, lifecycle=None):
+        """Ready all the users up and start their matches with the players' stats from the queue snapshot.
+
+        If the guild has a team size and the queue holds more than one match, the readied users are split into lobbies
+        of similarly rated players and every lobby's match is started at the same time. Users who get a match are
+        removed from the queue. Each match is persisted as it goes, a lifecycle still in its ready check is resumed on
+        the ready check message of the context.
+        """
+        if players_stats is None:
+            players_stats = await self.bot.queue_stats.take(ctx.guild.id, users)
+
+        config = await ctx.guild_config()
+        lobby_size = len(users)
+
+        if config.team_size and config.team_size * 2 < len(users):
+            lobby_size = config.team_size * 2
+
+        ready_message, lifecycle, readied = await self.ready_check(ctx, users, lifecycle)
+
+        if len(readied) < len(users):  # Not everyone readied up
+            unreadied = [user for user in users if user not in readied]
+            await ctx.dequeue_users(*unreadied)
+
+            if lobby_size == len(users) or len(readied) < lobby_size:  # Not enough players ready for a match
+                description = '\n'.join(':heavy_multiplication_x:  ' + user.mention for user in unreadied)
+                title = 'Not everyone was ready!'
+                burst_embed = self.bot.embed_template(title=title, description=description)
+                burst_embed.set_footer(text='The missing players have been removed from the queue')
+                await asyncio.gather(ready_message.edit(embed=burst_embed), lifecycle.cancel())
+                return False  # Not everyone readied up
+
+        # Players with a lobby leave the queue so the rest of it can fill up again while their matches start
+        lobbies = self.split_lobbies(readied, players_stats, lobby_size)
+        await ctx.dequeue_users(*(user for lobby in lobbies for user in lobby))
+        draft_timeout = self._phase_timeout(MatchState.TEAM_DRAFT, config)
+
+        if len(lobbies) == 1:
+            await lifecycle.advance(MatchState.TEAM_DRAFT, draft_timeout, users=[user.id for user in lobbies[0]])
+            await self.start_lobby(ctx, ready_message, lobbies[0], players_stats, config, lifecycle)
+        else:
+            description = f'Splitting {len(readied)} ready players into {len(lobbies)} matches of ' \
+                          f'{config.team_size}v{config.team_size}'
+            burst_embed = self.bot.embed_template(title='Starting matches!', description=description)
+
+            if len(readied) > len(lobbies) * lobby_size:
+                burst_embed.set_footer(text='Ready players without a match stay in the queue')
 
             await ready_message.edit(embed=burst_embed)
-            return True  # Everyone readied up
+            lobby_messages = await asyncio.gather(*(
+                ctx.send(''.join(user.mention for user in lobby),
+                         embed=self.bot.embed_template(title=f'Match {num} of {len(lobbies)}'))
+                for num, lobby in enumerate(lobbies, start=1)
+            ))
+
+            # The ready check's match moves to the first lobby's message and the other lobbies get their own
+            await lifecycle.advance(MatchState.TEAM_DRAFT, draft_timeout, message_id=lobby_messages[0].id,
+                                    users=[user.id for user in lobbies[0]])
+            lifecycles = [lifecycle] + await asyncio.gather(*(
+                MatchLifecycle.create(self.bot.db_pool, ctx.guild.id, ctx.channel.id, message.id,
+                                      [user.id for user in lobby], MatchState.TEAM_DRAFT, draft_timeout)
+                for message, lobby in zip(lobby_messages[1:], lobbies[1:])
+            ))
+            await asyncio.gather(*(
+                self.start_lobby(ctx, message, lobby, players_stats, config, lobby_lifecycle)
+                for message, lobby, lobby_lifecycle in zip(lobby_messages, lobbies, lifecycles)
+            ))
+
+        return True  # Enough players readied up
+
+    async def resume_match(self, lifecycle):
+        """ Pick a match that was in flight when the bot stopped back up on its message from the phase it was in. """
+        channel = self.bot.get_channel(lifecycle.channel_id)
+
+        try:
+            if channel is None:
+                raise LookupError(f'Channel {lifecycle.channel_id} no longer exists')
+
+            message = await channel.fetch_message(lifecycle.message_id)
+        except (LookupError, discord.NotFound):  # Nothing left to resume the match on
+            await lifecycle.cancel()
+            return
+
+        self.bot.logger.info(f'Resuming match {lifecycle.id} of guild {lifecycle.guild_id} from {lifecycle.state}')
+        ctx = await self.bot.get_context(message)
+        users = self._members(ctx.guild, lifecycle.users)
+        players_stats = await self.bot.queue_stats.take(ctx.guild.id, users)
+
+        try:
+            if lifecycle.state == MatchState.READY_CHECK:
+                await self.start_match(ctx, users, players_stats, lifecycle)
+            else:
+                await self.start_lobby(ctx, message, users, players_stats, await ctx.guild_config(), lifecycle)
+        except asyncio.TimeoutError:
+            pass
+
+        queue_cog = self.bot.get_cog('QueueCog')
+
+        if queue_cog is not None:
+            queue_cog.show_queue(ctx)  # Players who got a match left the queue meanwhile
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id):
+        """ Resume the matches of the shard's guilds that were in flight when the bot stopped, once per run. """
+        if shard_id in self.resumed_shards:
+            return
+
+        self.resumed_shards.add(shard_id)
+        guild_ids = [guild.id for guild in self.bot.guilds if guild.shard_id == shard_id]
+
+        for lifecycle in await MatchLifecycle.in_flight(self.bot.db_pool, *guild_ids):
+            task = asyncio.ensure_future(self.resume_match(lifecycle))
+            self.resume_tasks.add(task)
+            task.add_done_callback(self.resume_tasks.discard)
 
     @commands.command(usage='teams [{captains|autobalance|random}]',
                       brief='Set or view the team creation method (need admin perms)')
@@ -751,15 +1266,54 @@ class MatchCog(commands.Cog):
         embed = self.bot.embed_template(title=title)
         await ctx.send(embed=embed)
 
+    @commands.command(usage='teamsize [<players per team>|off]',
+                      brief='Set or view the team size big queues are split by (need admin perms)')
+    @commands.has_permissions(administrator=True)
+    async def teamsize(self, ctx, size=None):
+        """ Set or display the team size by which popped queues are split into several matches. """
+        config = await ctx.guild_config()
+        team_size = config.team_size
+        lower_bound = 1
+        upper_bound = 5  # Team drafts have a pick emoji for up to 10 players
+
+        if size is None:
+            if team_size is None:
+                title = 'Popped queues start a single match'
+            else:
+                title = f'Popped queues are split into matches of {team_size}v{team_size}'
+        elif size.lower() == 'off':
+            title = 'Popped queues will start a single match'
+            await ctx.set_guild_config(team_size=None)
+        else:
+            try:
+                size = int(size)
+            except ValueError:
+                title = f'{size} is not an integer'
+            else:
+                if size == team_size:
+                    title = f'Team size is already set to {team_size}'
+                elif size < lower_bound or size > upper_bound:
+                    title = f'Team size is outside of valid range ({lower_bound}-{upper_bound})'
+                elif size * 2 > config.capacity:
+                    title = f'Teams of {size} don\'t fit in the queue capacity of {config.capacity}'
+                else:
+                    title = f'Popped queues will be split into matches of {size}v{size}'
+                    await ctx.set_guild_config(team_size=size)
+
+        embed = self.bot.embed_template(title=title)
+        await ctx.send(embed=embed)
+
     @teams.error
     @captains.error
     @maps.error
+    @teamsize.error
     async def config_error(self, ctx, error):
         """ Respond to a permissions error with an explanation message. """
         if isinstance(error, commands.MissingPermissions):
             await ctx.trigger_typing()
             missing_perm = error.missing_perms[0].replace('_', ' ')
-            title = f'Cannot set {ctx.command.name} method without {missing_perm} permission!'
+            setting = 'team size' if ctx.command.name == 'teamsize' else f'{ctx.command.name} method'
+            title = f'Cannot set {setting} without {missing_perm} permission!'
             embed = self.bot.embed_template(title=title)
             await ctx.send(embed=embed)
 
@@ -0,0 +1,65 @@
+# metrics.py
+
+from discord.ext import commands
+
+from .utils import STATEMENTS, PlayerCache, ReactionButtons
+
+
+class MetricsCog(commands.Cog):
+    """ Cog to report the bot's internal performance counters to the bot owner. """
+
+    def __init__(self, bot):
+        """ Set attributes. """
+        self.bot = bot
+
+    def collect(self):
+        """ Gather the stats of every instrumented component keyed by component name. """
+        return {
+            'Database Pool': self.bot.db_pool.stats,
+            'Guild Config Cache': self.bot.guild_configs.stats,
+            'Queue Actors': self.bot.queues.stats,
+            'Reaction Router': self.bot.reactions.stats,
+            'Interaction Router': self.bot.interactions.stats,
+            'Reaction Seeding': ReactionButtons.timings.stats,
+            'Queue Bans': self.bot.bans.stats,
+            'Leaderboards': self.bot.leaderboard.stats,
+            'Queue Stats Snapshot': self.bot.queue_stats.stats,
+            'Job Scheduler': self.bot.scheduler.stats,
+            'API Link Cache': PlayerCache.linked.stats,
+            'API Stats Cache': PlayerCache.stats.stats,
+            'Coalesced API Batches': PlayerCache.batches.stats,
+            'Slowest Statements': STATEMENTS.stats
+        }
+
+    @staticmethod
+    def format_stats(stats):
+        """ Format a stats dictionary as aligned lines of text. """
+        if not stats:
+            return '_None_'
+
+        width = len(max(stats.keys(), key=len))
+        lines = []
+
+        for key, value in stats.items():
+            if isinstance(value, float):
+                value = f'{value:.3f}'
+
+            lines.append(f'{key + ":":<{width + 1}} {value}')
+
+        text = '\n'.join(lines)
+
+        if len(text) > 1000:  # Embed field values are limited to 1024 characters
+            text = text[:997] + '...'
+
+        return '```ml\n' + text + '\n```'
+
+    @commands.command(brief='See the bot\'s performance counters (bot owner only)')
+    @commands.is_owner()
+    async def metrics(self, ctx):
+        """ Send an embed containing the stats of every instrumented component. """
+        embed = self.bot.embed_template(title='__Bot Metrics__')
+
+        for name, stats in self.collect().items():
+            embed.add_field(name=name, value=self.format_stats(stats), inline=False)
+
+        await ctx.send(embed=embed)
@@ -1,23 +1,23 @@
 # queue.py
 
 from discord.ext import commands
-import discord
 import asyncio
 from datetime import datetime, timedelta, timezone
 import re
 
-from .utils import Player
+from .utils import JoinOutcome, Player
 
 
 class QueueCog(commands.Cog):
     """ Cog to manage queues of players among multiple servers. """
 
     time_arg_pattern = re.compile(r'\b((?:(?P<days>[0-9]+)d)|(?:(?P<hours>[0-9]+)h)|(?:(?P<minutes>[0-9]+)m))\b')
+    queue_title = 'Players in queue for PUGs'
+    done_emoji = '✅'
 
     def __init__(self, bot):
         """ Set attributes. """
         self.bot = bot
-        self.last_queue_msgs = {}
 
     async def queue_embed(self, ctx, title=None):
         """ Method to create the queue embed for a guild. """
@@ -36,76 +36,70 @@ class QueueCog(commands.Cog):
         embed.set_footer(text='Players will receive a notification when the queue fills up')
         return embed
 
-    async def update_last_msg(self, ctx, embed):
-        """ Send embed message and delete the last one sent. """
-        msg = self.last_queue_msgs.get(ctx.guild)
+    def show_queue(self, ctx, repost=False):
+        """ Schedule the guild's queue display message to be updated with the latest state of the queue. """
+        ctx.show_queue(lambda: self.queue_embed(ctx, self.queue_title), repost)
 
-        if msg is not None:
-            try:
-                await msg.delete()
-            except discord.errors.NotFound:
-                pass
+    async def acknowledge(self, ctx, title=None):
+        """ React to a command that changed the queue or explain why it didn't with a short message. """
+        if title is None:
+            await ctx.message.add_reaction(self.done_emoji)
+        else:
+            await ctx.send(embed=self.bot.embed_template(title=title))
+
+    def banned_title(self, user, unban_time):
+        """ Generate the title explaining that a user can't join the queue because they are banned. """
+        title = f'Unable to add **{user.display_name}**: Banned'
 
-        self.last_queue_msgs[ctx.guild] = await ctx.send(embed=embed)
+        if unban_time is not None:  # If the user is banned for a duration
+            title += f' for {self.timedelta_str(unban_time - datetime.now(timezone.utc))}'
+
+        return title
 
     @commands.command(brief='Join the queue')
     async def join(self, ctx):
         """ Check if the member can be added to the guild queue and add them if so. """
-
         player = Player(ctx.author)
-        if not await player.is_linked():  # Message author isn't linked
+
+        if ctx.is_banned(ctx.author):  # Author is banned from joining the queue
+            title = self.banned_title(ctx.author, ctx.unban_time(ctx.author))
+        elif not await player.is_linked():  # Message author isn't linked
             title = f'Unable to add **{ctx.author.display_name}**: Their account is not linked'
         else:  # Message author is linked
-            awaitables = [
-                player.get_stats(),
-                ctx.queued_users(),
-                ctx.guild_config(),
-                ctx.queue_banlist()
-            ]
-            results = await asyncio.gather(*awaitables, loop=self.bot.loop)
-            player_stats = results[0]
-            queued_users = results[1]
-            capacity = results[2].capacity
-            banned_users = results[3]
-
-            if ctx.author in banned_users:  # Author is banned from joining the queue
-                title = f'Unable to add **{ctx.author.display_name}**: Banned'
-                unban_time = banned_users[ctx.author]
-
-                if unban_time is not None:  # If the user is banned for a duration
-                    title += f' for {self.timedelta_str(unban_time - datetime.now(timezone.utc))}'
-
-            elif ctx.author in queued_users:  # Author already in queue
-                title = f'Unable to add **{ctx.author.display_name}**: Already in the queue'
-            elif len(queued_users) >= capacity:  # Queue full
-                title = f'Unable to add **{ctx.author.display_name}**: Queue is full'
-            elif not player_stats:  # Couldn't get player from API TODO: Remove this and raise exception in ApiHelper
+            player_stats = await player.get_stats()
+
+            if not player_stats:  # Couldn't get player from API TODO: Remove this and raise exception in ApiHelper
                 title = f'Unable to add **{ctx.author.display_name}**: Cannot verify match status'
             elif player_stats.in_match:  # User is already in a match
                 title = f'Unable to add **{ctx.author.display_name}**: Already in a match'
-            else:  # User can be added
-                await ctx.enqueue_users(ctx.author)
-                queued_users += [ctx.author]
-                title = f'**{ctx.author.display_name}** has been added to the queue'
-
-                # Check and burst queue if full
-                if len(queued_users) == capacity:
-                    match_cog = self.bot.get_cog('MatchCog')
-
-                    try:
-                        all_readied = await match_cog.start_match(ctx, queued_users)
-                    except asyncio.TimeoutError:
-                        return
-
-                    if all_readied:
-                        await ctx.empty_queue()
-
-                    return
-
-        embed = await self.queue_embed(ctx, title)
-
-        # Delete last queue message
-        await self.update_last_msg(ctx, embed)
+            else:  # The guild's queue actor checks for duplicates and capacity while adding the user
+                result = await ctx.join_queue(ctx.author, player_stats)
+                queued_users = result.queue
+
+                if result.outcome == JoinOutcome.BANNED:  # Banned while their stats were being fetched
+                    title = self.banned_title(ctx.author, result.unban_time)
+                elif result.outcome == JoinOutcome.ALREADY_QUEUED:  # Author already in queue
+                    title = f'Unable to add **{ctx.author.display_name}**: Already in the queue'
+                elif result.outcome == JoinOutcome.QUEUE_FULL:  # Queue full
+                    title = f'Unable to add **{ctx.author.display_name}**: Queue is full'
+                else:  # User was added
+                    title = None
+                    await self.acknowledge(ctx)
+
+                    # Check and burst queue if full
+                    if len(queued_users) == result.capacity:
+                        match_cog = self.bot.get_cog('MatchCog')
+                        players_stats = await self.bot.queue_stats.take(ctx.guild.id, queued_users)
+
+                        try:
+                            await match_cog.start_match(ctx, queued_users, players_stats)
+                        except asyncio.TimeoutError:
+                            pass
+
+                    self.show_queue(ctx)  # Players who got a match left the queue meanwhile
+
+        if title is not None:
+            await self.acknowledge(ctx, title)
 
     @commands.command(brief='Leave the queue')
     async def leave(self, ctx):
@@ -114,23 +108,16 @@ class QueueCog(commands.Cog):
         name = ctx.author.nick if ctx.author.nick is not None else ctx.author.display_name
 
         if ctx.author in removed:
-            title = f'**{name}** has been removed from the queue'
+            self.show_queue(ctx)
+            await self.acknowledge(ctx)
         else:
-            title = f'**{name}** isn\'t in the queue'
-
-        embed = await self.queue_embed(ctx, title)
-
-        # Update queue display message
-        await self.update_last_msg(ctx, embed)
+            await self.acknowledge(ctx, f'**{name}** isn\'t in the queue')
 
     @commands.command(brief='Display who is currently in the queue')
     async def view(self, ctx):
         """ Display the queue as an embed list of mentioned names. """
-        title = 'Players in queue for PUGs'
-        embed = await self.queue_embed(ctx, title)
-
-        # Update queue display message
-        await self.update_last_msg(ctx, embed)
+        # Move the queue display message to the bottom of the channel
+        self.show_queue(ctx, repost=True)
 
     @commands.command(usage='remove <user mention>',
                       brief='Remove the mentioned user from the queue (need server kick perms)')
@@ -147,24 +134,19 @@ class QueueCog(commands.Cog):
             name = removee.nick if removee.nick is not None else removee.display_name
 
             if removee in removed:
-                title = f'**{name}** has been removed from the queue'
+                self.show_queue(ctx)
+                await self.acknowledge(ctx)
             else:
-                title = f'**{name}** is not in the queue'
-
-            embed = await self.queue_embed(ctx, title)
-
-            # Update queue display message
-            await self.update_last_msg(ctx, embed)
+                await self.acknowledge(ctx, f'**{name}** is not in the queue')
 
     @commands.command(brief='Empty the queue (need server kick perms)')
     @commands.has_permissions(kick_members=True)
     async def empty(self, ctx):
         """ Reset the guild queue list to empty. """
         await ctx.empty_queue()
-        embed = await self.queue_embed(ctx, 'The queue has been emptied')
-
         # Update queue display message
-        await self.update_last_msg(ctx, embed)
+        self.show_queue(ctx)
+        await self.acknowledge(ctx)
 
     @remove.error
     @empty.error
@@ -47,6 +47,7 @@ class StatsCog(commands.Cog):
         stats = await PlayerStats.from_user(user)
 
         if stats:
+            await self.bot.leaderboard.update(ctx.guild, stats)  # Keep their leaderboard row current
             win_percent_str = f'{stats.win_percent * 100:.2f}%'
             hs_percent_str = f'{stats.hs_percent * 100:.2f}%'
             fb_percent_str = f'{stats.first_blood_rate * 100:.2f}%'
@@ -67,39 +68,52 @@ class StatsCog(commands.Cog):
 
         await ctx.send(embed=embed)
 
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        """ Add the new member to the guild's leaderboard. """
+        await self.bot.leaderboard.add_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        """ Remove the member who left from the guild's leaderboard. """
+        await self.bot.leaderboard.remove_members(member.guild, member)
+
     @commands.command(brief='See the top players in the server')
     async def leaders(self, ctx):
-        """ Send an embed containing the leaderboard data parsed from the player objects returned from the API. """
+        """ Send an embed containing the top players and the author's rank from the guild's leaderboard. """
         num = 5  # Easily modfiy the number of players on the leaderboard
-        players_stats = [x async for x in PlayerStats.from_users(ctx.guild.members)]
+        players_stats, author_stats = await self.bot.leaderboard.standings(ctx.guild, ctx.author, num)
 
         if not players_stats:
             embed = self.bot.embed_template(title='Nobody on this server is ranked!')
             await ctx.send(embed=embed)
         else:
-            players_stats.sort(key=lambda u: (u.score, u.matches_played), reverse=True)
-
-            # Select the top players only
-            if len(players_stats) > num:
-                players_stats = players_stats[:num]
+            # Show the author below the top players if they aren't one of them
+            if author_stats is not None and author_stats.rank > num:
+                players_stats.append(author_stats)
 
             # Generate leaderboard text
-            data = [['Player'] + ctx._get_members([player.discord for player in players_stats]),
+            members = [ctx.guild.get_member(player.discord_id) for player in players_stats]
+            data = [['Player'] + [member.display_name if member else str(player.discord_id)
+                                  for member, player in zip(members, players_stats)],
                     ['Score'] + [str(player.score) for player in players_stats],
                     ['Winrate'] + [f'{player.win_percent * 100:.2f}%' for player in players_stats],
                     ['Played'] + [str(player.matches_played) for player in players_stats]]
             data[0] = [data[0][0]] + \
-                [member.display_name if len(member.display_name) < 12 else member.display_name[:9] + '...'
-                    for member in data[0][1:]]  # Shorten long names
+                [name if len(name) < 12 else name[:9] + '...' for name in data[0][1:]]  # Shorten long names
             widths = list(map(lambda x: len(max(x, key=len)), data))
             aligns = ['left', 'right', 'right', 'right']
             z = zip(data, widths, aligns)
             formatted_data = [list(map(lambda x: align_text(x, width, align), col)) for col, width, align in z]
             formatted_data = list(map(list, zip(*formatted_data)))  # Transpose list for .format() string
-            description = '```ml\n    {}  {}  {}  {} \n'.format(*formatted_data[0])
+            rank_width = len(str(players_stats[-1].rank))
+            description = '```ml\n {}  {}  {}  {}  {} \n'.format(' ' * (rank_width + 1), *formatted_data[0])
+
+            for player, player_row in zip(players_stats, formatted_data[1:]):
+                if player is author_stats and player.rank > num:
+                    description += ' ' + '.' * (rank_width + 1) + '\n'
 
-            for rank, player_row in enumerate(formatted_data[1:], start=1):
-                description += ' {}. {}  {}  {}  {} \n'.format(rank, *player_row)
+                description += ' {}. {}  {}  {}  {} \n'.format(str(player.rank).rjust(rank_width), *player_row)
 
             description += '```'
 
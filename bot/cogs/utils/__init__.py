@@ -1,21 +1,69 @@
 # __init__.py
 
-from .config import TeamMethod, CaptainMethod, MapMethod
+from .actor import JoinOutcome, JoinResult, QueueActor, QueueActors
+from .balance import BalanceResult, TeamBalancer
+from .bans import BanIndex
+from .cache import GuildConfigCache, TTLCache
+from .coalesce import SingleFlight
+from .components import (ButtonStyle, Interaction, InteractionRouter, action_rows, button, edit_message,
+                         paginated_selects, select, send_message)
+from .config import TeamMethod, CaptainMethod, MapMethod, GuildConfig
 from .context import LeagueContext
 from .db import DBHelper
+from .leaderboard import Leaderboard, LeaderboardEntry
+from .lifecycle import MatchLifecycle, MatchState
 from .map import Map, MapPool
-from .player import Player, PlayerStats
+from .player import Player, PlayerCache, PlayerStats, PlayerStatsTable
+from .pool import InstrumentedPool
+from .reactions import ReactionButtons
+from .router import ReactionRouter
+from .scheduler import JobScheduler
 from .server import MatchServer
+from .snapshot import QueueStatsSnapshot
+from .statements import STATEMENTS, StatementRegistry
 
 __all__ = [
+    JoinOutcome,
+    JoinResult,
+    QueueActor,
+    QueueActors,
+    BalanceResult,
+    TeamBalancer,
+    BanIndex,
+    GuildConfigCache,
+    TTLCache,
+    SingleFlight,
+    ButtonStyle,
+    Interaction,
+    InteractionRouter,
+    action_rows,
+    button,
+    edit_message,
+    paginated_selects,
+    select,
+    send_message,
     TeamMethod,
     CaptainMethod,
     MapMethod,
+    GuildConfig,
     LeagueContext,
     DBHelper,
+    Leaderboard,
+    LeaderboardEntry,
+    MatchLifecycle,
+    MatchState,
     Map,
     MapPool,
     Player,
+    PlayerCache,
     PlayerStats,
-    MatchServer
+    PlayerStatsTable,
+    InstrumentedPool,
+    ReactionButtons,
+    ReactionRouter,
+    JobScheduler,
+    MatchServer,
+    QueueStatsSnapshot,
+    STATEMENTS,
+    StatementRegistry
 ]
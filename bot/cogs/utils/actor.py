@@ -0,0 +1,445 @@
+# actor.py
+
+import asyncio
+import discord
+import enum
+import logging
+from typing import Dict, List
+
+from .db import DBHelper
+
+
+class JoinOutcome(enum.Enum):
+    """
+    Enum for the possible results of a user trying to join a queue.
+    """
+    JOINED = 'joined'
+    BANNED = 'banned'
+    ALREADY_QUEUED = 'already_queued'
+    QUEUE_FULL = 'queue_full'
+
+
+class JoinResult:
+    """Result of an attempt to join a guild's queue.
+
+    Attributes
+    ----------
+    outcome : JoinOutcome
+        Whether the user was added to the queue or why they weren't.
+    queue : list
+        The guild's queue after the attempt.
+    capacity : int
+        The guild's queue capacity.
+    unban_time : datetime.datetime
+        When the user's ban ends if they are banned for a duration, otherwise None.
+    """
+
+    def __init__(self, outcome, queue, capacity, unban_time=None):
+        self.outcome = outcome
+        self.queue = queue
+        self.capacity = capacity
+        self.unban_time = unban_time
+
+
+class QueueActor:
+    """Owns one guild's queue and applies every change to it one at a time.
+
+    Changes are sent to the actor's bounded mailbox and handled in order by a single task, so concurrent commands can't
+    interleave: a join can't be raced by another join, a ban or an emptied queue. The queue lives in memory and reading
+    it never waits for the mailbox.
+
+    Queue changes are written behind to the queued_users table: a flusher task waits flush_delay seconds after a change
+    and then writes the difference between the queue and what was last written in one transaction. Bans are written
+    through before they take effect because they have to survive a restart.
+
+    The queue display message is rendered the same way: a renderer task waits render_delay seconds after a request,
+    renders only the latest one and edits the message in place, skipping the edit if the embed didn't change. A burst
+    of commands therefore costs at most one message edit. The display message is a persistent dashboard: only its IDs
+    are kept, in memory and in the queue_dashboards table, so it is edited by ID after a restart and only sent again if
+    it was deleted or has to move to another channel.
+
+    Attributes
+    ----------
+    mailbox_size : int
+        Number of pending changes before senders have to wait.
+    flush_delay : float
+        Seconds changes are collected before being written to the database.
+    handled : int
+        Number of changes handled.
+    max_depth : int
+        Most changes that were ever waiting in the mailbox.
+    flushes : int
+        Number of writes to the queued_users table.
+    render_delay : float
+        Seconds render requests are collected before the queue display message is rendered.
+    render_requests : int
+        Number of requests to render the queue display message.
+    renders : int
+        Number of times the queue display message was edited or sent.
+    unchanged_renders : int
+        Number of renders skipped because the embed didn't change.
+    """
+    mailbox_size = 100
+    flush_delay = 0.5
+    render_delay = 1.0
+
+    def __init__(self, guild_id, db_pool, bans, queue=(), dashboard=(None, None)):
+        self.guild_id = guild_id
+        self.db_pool = db_pool
+        self.bans = bans
+        self.queue: List[int] = list(queue)
+        self.channel_id, self.message_id = dashboard  # IDs of the message displaying the queue
+        self.mailbox = asyncio.Queue(maxsize=self.mailbox_size)
+        self.handled = 0
+        self.max_depth = 0
+        self.flushes = 0
+        self.render_requests = 0
+        self.renders = 0
+        self.unchanged_renders = 0
+        self.logger = logging.getLogger('csgoleague.queue')
+        self._persisted = list(self.queue)  # Queue as last written, in the order of its stored positions
+        self._dirty = asyncio.Event()
+        self._rendered = None  # Dictionary of the embed the display message shows
+        self._render_request = None  # Channel, render function and repost flag of the latest request
+        self._render_wanted = asyncio.Event()
+        self._task = None
+        self._flusher = None
+        self._renderer = None
+        self._closed = False
+
+    def start(self):
+        """ Start handling the mailbox and writing changes to the database. """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+            self._flusher = asyncio.ensure_future(self._run_flusher())
+            self._renderer = asyncio.ensure_future(self._run_renderer())
+
+    async def close(self, flush=True):
+        """Stop the actor and write the changes that weren't written yet unless told not to.
+
+        Changes still in the mailbox are dropped and their senders' futures are cancelled, so no caller waits forever.
+        """
+        if self._task is None:
+            return
+
+        self._closed = True
+        tasks = (self._task, self._flusher, self._renderer)
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = self._flusher = self._renderer = None
+
+        while not self.mailbox.empty():  # Changes that won't be handled, their senders get a CancelledError
+            _, _, future = self.mailbox.get_nowait()
+            future.cancel()
+
+        if flush:
+            await self.flush()
+
+    @property
+    def depth(self):
+        """ Number of changes waiting in the mailbox. """
+        return self.mailbox.qsize()
+
+    @property
+    def pending_writes(self):
+        """ Whether the queue has changes that weren't written to the database yet. """
+        return self._persisted != list(self.queue)
+
+    async def _send(self, operation, *args):
+        """ Put a change in the mailbox and wait for the actor to handle it. """
+        if self._closed:  # Nothing would handle the change
+            raise asyncio.CancelledError()
+
+        future = asyncio.get_event_loop().create_future()
+        await self.mailbox.put((operation, args, future))
+
+        if self._closed:  # Closed while waiting for room in the mailbox
+            future.cancel()
+
+        self.max_depth = max(self.max_depth, self.mailbox.qsize())
+        return await future
+
+    async def _run(self):
+        while True:
+            operation, args, future = await self.mailbox.get()
+
+            try:
+                result = await operation(*args)
+            except asyncio.CancelledError:
+                future.cancel()  # The actor is closing
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():  # The sender may have been cancelled
+                    future.set_result(result)
+
+            self.handled += 1
+
+    def _changed(self):
+        self._dirty.set()
+
+    async def _run_flusher(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.flush_delay)  # Collect the changes made meanwhile into one write
+            self._dirty.clear()
+
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f'Failed to save the queue of guild {self.guild_id}', exc_info=e)
+                self._dirty.set()  # Retry after the next delay
+
+    async def flush(self):
+        """Write the difference between the queue and what was last written to the queued_users table.
+
+        The longest start of the queue that is already stored in the same order is kept. The rest of the queue is
+        written again after it, so users who left and joined again since the last write move to the back.
+        """
+        queue = list(self.queue)
+        positions = {user_id: num for num, user_id in enumerate(self._persisted)}
+        kept = 0
+        last_position = -1
+
+        for user_id in queue:
+            position = positions.get(user_id)
+
+            if position is None or position < last_position:
+                break
+
+            last_position = position
+            kept += 1
+
+        kept_ids = set(queue[:kept])
+        added = queue[kept:]
+        removed = [user_id for user_id in self._persisted if user_id not in kept_ids]
+
+        if not added and not removed:
+            return
+
+        async with self.db_pool.acquire() as conn:
+            await DBHelper(conn).save_queued_users(self.guild_id, added, removed)
+
+        self._persisted = queue
+        self.flushes += 1
+
+    def queued(self) -> List[int]:
+        """ Get the IDs of the queued users in the order they joined. """
+        return list(self.queue)
+
+    async def join(self, user_id: int, capacity: int) -> JoinResult:
+        """ Add a user to the queue if they aren't banned, already queued or the queue isn't full. """
+        return await self._send(self._join, user_id, capacity)
+
+    async def _join(self, user_id, capacity):
+        if self.bans.is_banned(self.guild_id, user_id):
+            outcome = JoinOutcome.BANNED
+        elif user_id in self.queue:
+            outcome = JoinOutcome.ALREADY_QUEUED
+        elif len(self.queue) >= capacity:
+            outcome = JoinOutcome.QUEUE_FULL
+        else:
+            outcome = JoinOutcome.JOINED
+            self.queue.append(user_id)
+            self._changed()
+
+        return JoinResult(outcome, self.queued(), capacity, self.bans.unban_time(self.guild_id, user_id))
+
+    async def enqueue(self, *user_ids: int) -> None:
+        """ Add users to the queue regardless of its capacity. """
+        await self._send(self._enqueue, user_ids)
+
+    async def _enqueue(self, user_ids):
+        self.queue.extend(user_id for user_id in dict.fromkeys(user_ids) if user_id not in self.queue)
+        self._changed()
+
+    async def dequeue(self, *user_ids: int) -> List[int]:
+        """ Remove users from the queue and return the ones that were in it. """
+        return await self._send(self._dequeue, set(user_ids))
+
+    async def _dequeue(self, user_ids):
+        removed = [user_id for user_id in self.queue if user_id in user_ids]
+        self.queue = [user_id for user_id in self.queue if user_id not in user_ids]
+        self._changed()
+        return removed
+
+    async def empty(self) -> List[int]:
+        """ Remove everyone from the queue and return who was in it. """
+        return await self._send(self._empty)
+
+    async def _empty(self):
+        removed, self.queue = self.queue, []
+        self._changed()
+        return removed
+
+    async def ban(self, user_ids: List[int], unban_time=None) -> None:
+        """ Ban users from joining the queue until the unban time or indefinitely. """
+        await self._send(self._ban, user_ids, unban_time)
+
+    async def _ban(self, user_ids, unban_time):
+        async with self.db_pool.acquire() as conn:
+            db_helper = DBHelper(conn)
+            await db_helper.insert_users(*user_ids)
+            await db_helper.insert_banned_users(self.guild_id, *user_ids, unban_time=unban_time)
+
+        self.bans.ban(self.guild_id, *user_ids, unban_time=unban_time)
+
+    async def unban(self, user_ids: List[int]) -> List[int]:
+        """ Lift the bans of users and return the ones that were banned. """
+        return await self._send(self._unban, user_ids)
+
+    async def _unban(self, user_ids):
+        async with self.db_pool.acquire() as conn:
+            unbanned_ids = await DBHelper(conn).delete_banned_users(self.guild_id, *user_ids)
+
+        self.bans.unban(self.guild_id, *unbanned_ids)
+        return unbanned_ids
+
+    def show(self, channel, render, repost=False) -> None:
+        """Request the queue display message to be rendered without waiting for it.
+
+        Parameters
+        ----------
+        channel : discord.TextChannel
+            Channel to display the queue in.
+        render : Callable[[], Awaitable[discord.Embed]]
+            Function rendering the queue embed from the queue's state when the request is handled.
+        repost : bool
+            Whether to replace the display message with a new one at the bottom of the channel instead of editing it.
+        """
+        repost = repost or (self._render_request is not None and self._render_request[2])
+        self._render_request = (channel, render, repost)
+        self.render_requests += 1
+        self._render_wanted.set()
+
+    async def _run_renderer(self):
+        while True:
+            await self._render_wanted.wait()
+            await asyncio.sleep(self.render_delay)  # Collect the requests made meanwhile into one render
+            self._render_wanted.clear()
+            channel, render, repost = self._render_request
+            self._render_request = None
+
+            try:
+                await self._render(channel, render, repost)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f'Failed to display the queue of guild {self.guild_id}', exc_info=e)
+
+    async def _render(self, channel, render, repost):
+        embed = await render()
+        rendered = embed.to_dict()
+
+        if self.message_id is not None and self.channel_id == channel.id and not repost:
+            if rendered == self._rendered:
+                self.unchanged_renders += 1
+                return
+
+            try:
+                await channel.get_partial_message(self.message_id).edit(embed=embed)
+            except discord.errors.NotFound:  # Deleted by someone else, send a new one
+                self.message_id = None
+            else:
+                self._rendered = rendered
+                self.renders += 1
+                return
+
+        old_channel = channel.guild.get_channel(self.channel_id) if self.message_id is not None else None
+
+        if old_channel is not None:
+            try:
+                await old_channel.get_partial_message(self.message_id).delete()
+            except discord.errors.NotFound:
+                pass
+
+        message = await channel.send(embed=embed)
+        self.channel_id, self.message_id = channel.id, message.id
+        self._rendered = rendered
+        self.renders += 1
+
+        async with self.db_pool.acquire() as conn:
+            await DBHelper(conn).set_queue_dashboard(self.guild_id, self.channel_id, self.message_id)
+
+
+class QueueActors:
+    """The queue actors of every guild, loaded from the queued_users and queue_dashboards tables on startup.
+
+    A bot process running only some of the shards loads the queues of the guilds on its shards. Commands of a guild
+    are only received by the process running its shard, so each queue has a single actor across the processes.
+    """
+
+    def __init__(self, db_pool, bans, shard_ids=None, shard_count=None):
+        self.db_pool = db_pool
+        self.bans = bans
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self._actors: Dict[int, QueueActor] = {}
+
+    async def start(self):
+        """ Load the queue of every guild on the shards from the database and start its actor. """
+        async with self.db_pool.acquire() as conn:
+            db_helper = DBHelper(conn)
+            queued = await db_helper.get_all_queued_users(self.shard_ids, self.shard_count)
+            dashboards = await db_helper.get_queue_dashboards(self.shard_ids, self.shard_count)
+
+        queues = {}
+
+        for guild_id, user_id in queued:
+            queues.setdefault(guild_id, []).append(user_id)
+
+        dashboards = {guild_id: (channel_id, message_id) for guild_id, channel_id, message_id in dashboards}
+
+        for guild_id in queues.keys() | dashboards.keys():
+            actor = QueueActor(guild_id, self.db_pool, self.bans, queues.get(guild_id, ()),
+                               dashboards.get(guild_id, (None, None)))
+            self._actors[guild_id] = actor
+            actor.start()
+
+    async def close(self):
+        """ Stop every actor and write their pending changes. """
+        actors, self._actors = self._actors, {}
+        await asyncio.gather(*(actor.close() for actor in actors.values()))
+
+    def get(self, guild_id: int) -> QueueActor:
+        """ Get the actor of a guild's queue, starting one with an empty queue if there isn't one. """
+        actor = self._actors.get(guild_id)
+
+        if actor is None:
+            actor = self._actors[guild_id] = QueueActor(guild_id, self.db_pool, self.bans)
+            actor.start()
+
+        return actor
+
+    async def discard(self, guild_id: int):
+        """ Stop the actor of a guild the bot was removed from without writing its queue. """
+        actor = self._actors.pop(guild_id, None)
+
+        if actor is not None:
+            await actor.close(flush=False)  # The guild's rows were deleted with it
+
+    @property
+    def stats(self):
+        """ Counters describing the load on the actors' mailboxes. """
+        actors = self._actors.values()
+        stats = {
+            'actors': len(actors),
+            'handled': sum(actor.handled for actor in actors),
+            'waiting': sum(actor.depth for actor in actors),
+            'max_depth': max((actor.max_depth for actor in actors), default=0),
+            'pending_writes': sum(actor.pending_writes for actor in actors),
+            'flushes': sum(actor.flushes for actor in actors),
+            'render_requests': sum(actor.render_requests for actor in actors),
+            'renders': sum(actor.renders for actor in actors),
+            'unchanged_renders': sum(actor.unchanged_renders for actor in actors)
+        }
+        deepest = sorted(actors, key=lambda actor: actor.max_depth, reverse=True)[:5]
+        stats.update((f'max_depth:{actor.guild_id}', actor.max_depth) for actor in deepest if actor.max_depth > 1)
+        return stats
@@ -0,0 +1,337 @@
+# balance.py
+
+import heapq
+import random
+import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+
+class BalanceResult:
+    """Teams found by a TeamBalancer.
+
+    Attributes
+    ----------
+    team_one : List[int]
+        Indexes of the players of the first team.
+    team_two : List[int]
+        Indexes of the players of the second team.
+    gap : float
+        Absolute difference between the teams' total ratings.
+    violations : int
+        Number of avoid constraints that couldn't be satisfied.
+    exact : bool
+        Whether the teams are proven optimal.
+    elapsed : float
+        Seconds spent balancing.
+    """
+
+    __slots__ = ('team_one', 'team_two', 'gap', 'violations', 'exact', 'elapsed')
+
+    def __init__(self, team_one, team_two, gap, violations, exact, elapsed):
+        """ Set attributes. """
+        self.team_one = team_one
+        self.team_two = team_two
+        self.gap = gap
+        self.violations = violations
+        self.exact = exact
+        self.elapsed = elapsed
+
+
+class _Units:
+    """ Players merged into units that must play on the same team, with the avoid constraints between units. """
+
+    def __init__(self, num_players, parties, avoid):
+        parent = list(range(num_players))
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+
+            return index
+
+        for party in parties:
+            party = list(party)
+
+            for index in party[1:]:
+                parent[find(index)] = find(party[0])
+
+        roots = {}
+        self.members: List[List[int]] = []
+
+        for index in range(num_players):
+            root = find(index)
+
+            if root not in roots:
+                roots[root] = len(self.members)
+                self.members.append([])
+
+            self.members[roots[root]].append(index)
+
+        self.unit_of = [roots[find(index)] for index in range(num_players)]
+        self.sizes = [len(members) for members in self.members]
+        self.pairs = sorted({tuple(sorted((self.unit_of[a], self.unit_of[b]))) for a, b in avoid})
+        self.adjacent: List[List[int]] = [[] for _ in self.members]
+
+        for a, b in self.pairs:
+            self.adjacent[a].append(b)
+
+            if a != b:
+                self.adjacent[b].append(a)
+
+    def __len__(self):
+        return len(self.members)
+
+
+class TeamBalancer:
+    """Splits players into two teams of equal size with the closest possible total ratings.
+
+    Up to exact_limit players every split is enumerated and the best one is returned. Larger lobbies start from a
+    Karmarkar-Karp style differencing split, improve it with pairwise swaps and keep perturbing and improving the best
+    split found until the time budget runs out.
+
+    Players in the same party always end up on the same team. Players who should avoid each other are put on opposite
+    teams when possible: a split with fewer violated avoid constraints is always preferred over a closer one.
+
+    Attributes
+    ----------
+    weights : Dict[str, float]
+        Weight of each PlayerStats attribute in a player's rating.
+    exact_limit : int
+        Largest number of players balanced exactly.
+    time_budget : float
+        Seconds the heuristic may spend improving a split.
+    """
+    weights = {'score': 1.0}
+    exact_limit = 12
+    time_budget = 0.05
+
+    def __init__(self, weights: Dict[str, float] = None, exact_limit: int = None, time_budget: float = None,
+                 seed: int = None):
+        """ Set attributes. """
+        if weights is not None:
+            self.weights = weights
+
+        if exact_limit is not None:
+            self.exact_limit = exact_limit
+
+        if time_budget is not None:
+            self.time_budget = time_budget
+
+        self.random = random.Random(seed)
+
+    def rating(self, player) -> float:
+        """ Calculate a player's weighted rating from their stats. """
+        return sum(weight * getattr(player, field) for field, weight in self.weights.items())
+
+    def balance(self, ratings: Sequence[float], parties: Iterable[Iterable[int]] = (),
+                avoid: Iterable[Tuple[int, int]] = ()) -> BalanceResult:
+        """Split players into two teams.
+
+        Parameters
+        ----------
+        ratings : Sequence[float]
+            Rating of each player.
+        parties : Iterable[Iterable[int]]
+            Groups of player indexes that must play on the same team.
+        avoid : Iterable[Tuple[int, int]]
+            Pairs of player indexes that should play on opposite teams.
+
+        Returns
+        -------
+        BalanceResult
+        """
+        start = time.perf_counter()
+        units = _Units(len(ratings), parties, avoid)
+        team_size = len(ratings) // 2
+
+        if max(units.sizes, default=0) > len(ratings) - team_size:
+            raise ValueError('A party doesn\'t fit on one team')
+
+        unit_ratings = [sum(ratings[index] for index in members) for members in units.members]
+
+        if len(ratings) <= self.exact_limit:
+            sides, exact = self._exact(units, unit_ratings, team_size), True
+        else:
+            sides, exact = self._heuristic(units, unit_ratings, team_size, start), False
+
+        teams = ([], [])
+
+        for unit, side in enumerate(sides):
+            teams[side].extend(units.members[unit])
+
+        team_one, team_two = sorted(teams, key=len)
+        gap = abs(sum(ratings[index] for index in team_one) - sum(ratings[index] for index in team_two))
+        violations = self._violations(units, sides)
+        return BalanceResult(team_one, team_two, gap, violations, exact, time.perf_counter() - start)
+
+    @staticmethod
+    def _violations(units, sides):
+        """ Count the avoid constraints broken by a split. """
+        return sum(sides[a] == sides[b] for a, b in units.pairs)
+
+    def _exact(self, units, unit_ratings, team_size):
+        """ Enumerate every split of the units and return the sides of the best one. """
+        num_units = len(units)
+        total = sum(unit_ratings)
+        sizes = {team_size, sum(units.sizes) - team_size}
+        best_cost = None
+        best_mask = 0
+
+        # The first unit is always on side 0, the other units are on side 1 if their bit is set
+        mask_sums = [0.0] * (1 << max(num_units - 1, 0))
+        mask_sizes = [0] * len(mask_sums)
+
+        for mask in range(len(mask_sums)):
+            if mask:
+                low_bit = mask & -mask
+                unit = low_bit.bit_length()
+                mask_sums[mask] = mask_sums[mask ^ low_bit] + unit_ratings[unit]
+                mask_sizes[mask] = mask_sizes[mask ^ low_bit] + units.sizes[unit]
+
+            if mask_sizes[mask] not in sizes:
+                continue
+
+            sides_mask = mask << 1
+            violations = sum((sides_mask >> a & 1) == (sides_mask >> b & 1) for a, b in units.pairs)
+            cost = (violations, abs(total - 2 * mask_sums[mask]))
+
+            if best_cost is None or cost < best_cost:
+                best_cost = cost
+                best_mask = sides_mask
+
+        if best_cost is None:
+            raise ValueError('The parties can\'t be split into two teams of equal size')
+
+        return [best_mask >> unit & 1 for unit in range(num_units)]
+
+    @staticmethod
+    def _differencing(unit_ratings):
+        """ Split single players into equal halves by pairing neighbours by rating and differencing the pairs. """
+        order = sorted(range(len(unit_ratings)), key=unit_ratings.__getitem__, reverse=True)
+        heap = []  # Entries are (-difference, tiebreak, units on the heavier side, units on the lighter side)
+
+        for num, index in enumerate(range(0, len(order), 2)):
+            pair = order[index:index + 2]
+            difference = unit_ratings[pair[0]] - (unit_ratings[pair[1]] if len(pair) > 1 else 0)
+            heapq.heappush(heap, (-difference, num, pair[:1], pair[1:]))
+
+        tiebreak = len(heap)
+
+        while len(heap) > 1:
+            first_difference, _, first_heavy, first_light = heapq.heappop(heap)
+            second_difference, _, second_heavy, second_light = heapq.heappop(heap)
+            difference = -first_difference + second_difference  # Put the second entry the other way around
+            heapq.heappush(heap, (-difference, tiebreak, first_heavy + second_light, first_light + second_heavy))
+            tiebreak += 1
+
+        sides = [0] * len(unit_ratings)
+
+        for unit in heap[0][3] if heap else []:
+            sides[unit] = 1
+
+        return sides
+
+    def _greedy(self, units, unit_ratings, team_size):
+        """ Put the biggest, then strongest units first on the weaker team that still has room. """
+        order = sorted(range(len(units)), key=lambda unit: (units.sizes[unit], unit_ratings[unit]), reverse=True)
+        capacities = [team_size, sum(units.sizes) - team_size]
+        totals = [0.0, 0.0]
+        sides = [0] * len(units)
+
+        for unit in order:
+            side = 0 if totals[0] <= totals[1] else 1
+
+            if units.sizes[unit] > capacities[side]:
+                side = 1 - side
+
+                if units.sizes[unit] > capacities[side]:
+                    raise ValueError('Couldn\'t fit the parties into two teams of equal size')
+
+            sides[unit] = side
+            capacities[side] -= units.sizes[unit]
+            totals[side] += unit_ratings[unit]
+
+        return sides
+
+    def _improve(self, units, unit_ratings, sides, difference, violations):
+        """ Swap equally sized units between the teams while a swap improves the split. """
+        while True:
+            best = None
+            best_cost = (violations, abs(difference))
+            side_units = ([], [])
+
+            for unit, side in enumerate(sides):
+                side_units[side].append(unit)
+
+            for a in side_units[0]:
+                for b in side_units[1]:
+                    if units.sizes[a] != units.sizes[b]:
+                        continue
+
+                    new_difference = difference - 2 * (unit_ratings[a] - unit_ratings[b])
+                    new_violations = violations + self._swap_violations(units, sides, a, b)
+                    cost = (new_violations, abs(new_difference))
+
+                    if cost < best_cost:
+                        best, best_cost = (a, b, new_difference, new_violations), cost
+
+            if best is None:
+                return difference, violations
+
+            a, b, difference, violations = best
+            sides[a], sides[b] = 1, 0
+
+    @staticmethod
+    def _swap_violations(units, sides, a, b):
+        """ Change in violated avoid constraints if units a and b swapped sides. """
+        change = 0
+        swapped = {a: sides[b], b: sides[a]}
+
+        for unit in (a, b):
+            for other in units.adjacent[unit]:
+                if other in swapped and other < unit:  # The a-b pair is counted once
+                    continue
+
+                before = sides[unit] == sides[other]
+                after = swapped[unit] == swapped.get(other, sides[other])
+                change += after - before
+
+        return change
+
+    def _heuristic(self, units, unit_ratings, team_size, start):
+        """ Find a good split within the time budget. """
+        if all(size == 1 for size in units.sizes):
+            sides = self._differencing(unit_ratings)
+        else:
+            sides = self._greedy(units, unit_ratings, team_size)
+
+        difference = sum(rating if side == 0 else -rating for rating, side in zip(unit_ratings, sides))
+        violations = self._violations(units, sides)
+        difference, violations = self._improve(units, unit_ratings, sides, difference, violations)
+        best = (violations, abs(difference), sides)
+
+        # Integer ratings with an odd total can't be split closer than 1
+        total = sum(unit_ratings)
+        target = total % 2 if all(float(rating).is_integer() for rating in unit_ratings) else 0
+
+        while best[:2] > (0, target) and time.perf_counter() - start < self.time_budget:
+            sides = best[2].copy()
+
+            for _ in range(self.random.randint(2, 4)):  # Perturb the best split with a few random swaps
+                a = self.random.choice([unit for unit, side in enumerate(sides) if side == 0])
+                same_size = [unit for unit, side in enumerate(sides)
+                             if side == 1 and units.sizes[unit] == units.sizes[a]]
+
+                if same_size:
+                    b = self.random.choice(same_size)
+                    sides[a], sides[b] = 1, 0
+
+            difference = sum(rating if side == 0 else -rating for rating, side in zip(unit_ratings, sides))
+            violations = self._violations(units, sides)
+            difference, violations = self._improve(units, unit_ratings, sides, difference, violations)
+
+            if (violations, abs(difference)) < best[:2]:
+                best = (violations, abs(difference), sides)
+
+        return best[2]
@@ -0,0 +1,200 @@
+# bans.py
+
+import asyncio
+from datetime import datetime, timezone
+import heapq
+import logging
+from typing import Dict, Optional
+
+from .db import DBHelper
+
+
+class BanIndex:
+    """In-memory index of every guild's queue bans that lifts timed bans when they expire.
+
+    The index is loaded from the banned_users table on startup and kept in sync by the ban commands, so checking whether
+    a user is banned never touches the database. Pending unban times are kept in a min-heap and a background task
+    sleeps until the earliest one, then deletes every expired ban in batches.
+
+    A bot process running only some of the shards indexes and lifts the bans of the guilds on its shards, so every ban
+    has exactly one process expiring it.
+
+    Attributes
+    ----------
+    shard_ids : List[int]
+        Shards whose guilds' bans are indexed, or None for every guild.
+    shard_count : int
+        Total number of shards of the bot, or None for every guild.
+    batch_size : int
+        Maximum number of expired bans deleted per query.
+    expired : int
+        Number of bans lifted by the scheduler.
+    """
+    batch_size = 500
+
+    def __init__(self, db_pool, shard_ids=None, shard_count=None):
+        self.db_pool = db_pool
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.expired = 0
+        self.logger = logging.getLogger('csgoleague.bans')
+        self._bans: Dict[int, Dict[int, Optional[datetime]]] = {}
+        self._expiries = []  # Heap of (unban time, guild ID, user ID) tuples
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        """ Load the bans from the database and start the expiry scheduler. """
+        if self._task is not None:
+            return
+
+        async with self.db_pool.acquire() as conn:
+            bans = await DBHelper(conn).get_all_banned_users(self.shard_ids, self.shard_count)
+
+        for guild_id, user_id, unban_time in bans:
+            self._add(guild_id, user_id, unban_time)
+
+        heapq.heapify(self._expiries)
+        self._task = asyncio.ensure_future(self._run_scheduler())
+
+    async def close(self):
+        """ Stop the expiry scheduler. """
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+
+    def _add(self, guild_id, user_id, unban_time):
+        """ Add a ban to the index without restoring the heap invariant. """
+        self._bans.setdefault(guild_id, {})[user_id] = unban_time
+
+        if unban_time is not None:
+            self._expiries.append((unban_time, guild_id, user_id))
+
+    def _is_current(self, unban_time, guild_id, user_id):
+        """ Check if a heap entry still describes the user's ban (they may have been unbanned or banned again). """
+        guild_bans = self._bans.get(guild_id, {})
+        return user_id in guild_bans and guild_bans[user_id] == unban_time
+
+    def _discard(self, guild_id, user_ids):
+        """ Remove bans from the index. """
+        guild_bans = self._bans.get(guild_id)
+
+        if guild_bans is None:
+            return
+
+        for user_id in user_ids:
+            guild_bans.pop(user_id, None)
+
+        if not guild_bans:
+            del self._bans[guild_id]
+
+    def ban(self, guild_id: int, *user_ids: int, unban_time: datetime = None):
+        """ Record bans that were written to the database. """
+        for user_id in user_ids:
+            self._bans.setdefault(guild_id, {})[user_id] = unban_time
+
+            if unban_time is not None:
+                heapq.heappush(self._expiries, (unban_time, guild_id, user_id))
+
+        # Wake the scheduler if one of these bans expires before the one it is waiting for
+        if unban_time is not None and self._expiries[0][0] == unban_time:
+            self._wakeup.set()
+
+    def unban(self, guild_id: int, *user_ids: int):
+        """ Record unbans that were written to the database. """
+        self._discard(guild_id, user_ids)  # Heap entries of removed bans are skipped when they come due
+
+    def is_banned(self, guild_id: int, user_id: int) -> bool:
+        """ Check if a user is currently banned from a guild's queue. """
+        unban_time = self._bans.get(guild_id, {}).get(user_id, False)
+
+        if unban_time is False:
+            return False
+
+        return unban_time is None or unban_time > datetime.now(timezone.utc)
+
+    def unban_time(self, guild_id: int, user_id: int) -> Optional[datetime]:
+        """ Get when a user's ban ends, or None if they are banned indefinitely or not at all. """
+        return self._bans.get(guild_id, {}).get(user_id)
+
+    def banned_users(self, guild_id: int) -> Dict[int, Optional[datetime]]:
+        """ Get the unexpired bans of a guild as a dictionary of user ID to unban time. """
+        now = datetime.now(timezone.utc)
+        return {
+            user_id: unban_time for user_id, unban_time in self._bans.get(guild_id, {}).items()
+            if unban_time is None or unban_time > now
+        }
+
+    async def _run_scheduler(self):
+        """ Sleep until the next ban expires and lift all the expired bans, forever. """
+        while True:
+            self._wakeup.clear()
+
+            # Skip entries of bans that were lifted or replaced since they were scheduled
+            while self._expiries and not self._is_current(*self._expiries[0]):
+                heapq.heappop(self._expiries)
+
+            if not self._expiries:
+                await self._wakeup.wait()
+                continue
+
+            delay = (self._expiries[0][0] - datetime.now(timezone.utc)).total_seconds()
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+                continue
+
+            try:
+                await self._expire_bans()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f'Failed to lift expired bans, retrying shortly: {e}')
+                await asyncio.sleep(10)
+
+    async def _expire_bans(self):
+        """ Delete the bans that have expired from the database and the index. """
+        now = datetime.now(timezone.utc)
+
+        async with self.db_pool.acquire() as conn:
+            db_helper = DBHelper(conn)
+
+            while True:
+                deleted = await db_helper.delete_expired_banned_users(now, self.batch_size, self.shard_ids,
+                                                                      self.shard_count)
+
+                for guild_id, user_id in deleted:
+                    self._discard(guild_id, [user_id])
+
+                self.expired += len(deleted)
+
+                if len(deleted) < self.batch_size:
+                    break
+
+        # Drop heap entries that are due, including ones for bans already gone from the database
+        while self._expiries and self._expiries[0][0] <= now:
+            unban_time, guild_id, user_id = heapq.heappop(self._expiries)
+
+            if self._is_current(unban_time, guild_id, user_id):
+                self._discard(guild_id, [user_id])
+
+    @property
+    def stats(self):
+        """ Counters describing the ban index. """
+        return {
+            'banned_users': sum(len(guild_bans) for guild_bans in self._bans.values()),
+            'pending_expiries': len(self._expiries),
+            'expired': self.expired
+        }
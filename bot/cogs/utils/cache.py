@@ -0,0 +1,382 @@
+# cache.py
+
+import asyncio
+from collections import OrderedDict
+import logging
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict
+import uuid
+
+from .coalesce import SingleFlight
+from .config import GuildConfig
+from .db import DBHelper
+
+
+class GuildConfigCache:
+    """In-process cache of guild configs that is kept coherent across bot processes.
+
+    Configs are read from the database on the first request for a guild and kept until the guild's row changes. Writes
+    made through this process update the cache directly and notify the other processes through Postgres LISTEN/NOTIFY
+    so they drop their stale copy.
+
+    The listening connection is checked every health_check_interval seconds and replaced as soon as it breaks, retrying
+    with exponential backoff. Notifications sent while it was down are lost, so the whole cache is dropped once a new
+    connection listens again.
+
+    Attributes
+    ----------
+    channel : str
+        Postgres notification channel used to broadcast config changes.
+    health_check_interval : float
+        Seconds between checks that the listening connection still works.
+    max_backoff : float
+        Maximum seconds to wait between attempts to listen on a new connection.
+    hits : int
+        Number of lookups answered from the cache.
+    misses : int
+        Number of lookups that had to query the database.
+    invalidations : int
+        Number of cache entries dropped because of a change notification or a lost listening connection.
+    reconnects : int
+        Number of times the listening connection broke and was replaced.
+    """
+    channel = 'guild_config'
+    health_check_interval = 30.0
+    max_backoff = 60.0
+
+    def __init__(self, db_pool):
+        self.db_pool = db_pool
+        self.token = uuid.uuid4().hex  # Identifies this process's own notifications
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.reconnects = 0
+        self.logger = logging.getLogger('csgoleague.cache')
+        self._configs: Dict[int, GuildConfig] = {}
+        self._versions: Dict[int, int] = {}
+        self._generation = 0  # Bumped when the whole cache is dropped to discard every read in flight
+        self._flights = SingleFlight()
+        self._listen_conn = None
+        self._conn_lost = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        """ Hold a dedicated connection, listen for config changes made by other processes and watch the connection. """
+        if self._task is not None:
+            return
+
+        await self._listen()
+        self._task = asyncio.ensure_future(self._watch())
+
+    async def close(self):
+        """ Stop listening and give the dedicated connection back to the pool. """
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+        await self._unlisten()
+
+    def _on_termination(self, conn):
+        self._conn_lost.set()
+
+    async def _listen(self):
+        """ Acquire a dedicated connection and listen on it. """
+        self._conn_lost.clear()
+        self._listen_conn = await self.db_pool.acquire()
+
+        try:
+            self._listen_conn.add_termination_listener(self._on_termination)
+            await self._listen_conn.add_listener(self.channel, self._on_notification)
+        except Exception:
+            await self._unlisten()
+            raise
+
+    async def _unlisten(self):
+        """ Stop listening and release the dedicated connection, whether or not it still works. """
+        conn, self._listen_conn = self._listen_conn, None
+
+        if conn is None:
+            return
+
+        try:
+            conn.remove_termination_listener(self._on_termination)
+            await conn.remove_listener(self.channel, self._on_notification)
+        except Exception as e:  # Connection is already broken
+            self.logger.debug(f'Failed to stop listening on the broken connection: {e}')
+        finally:
+            try:
+                await self.db_pool.release(conn)
+            except Exception as e:
+                self.logger.warning(f'Failed to release the listening connection: {e}')
+
+    async def _check_connection(self):
+        """ Wait until the listening connection closes or fails a health check. """
+        while True:
+            try:
+                await asyncio.wait_for(self._conn_lost.wait(), self.health_check_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await asyncio.wait_for(DBHelper(self._listen_conn).ping(), self.health_check_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f'Listening connection failed its health check: {e}')
+                return
+
+    async def _watch(self):
+        """ Replace the listening connection whenever it breaks. """
+        while True:
+            await self._check_connection()
+            await self._unlisten()
+            self.reconnects += 1
+            backoff = 1.0
+
+            while True:
+                try:
+                    await self._listen()
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.logger.error(f'Failed to listen for guild config changes, retrying in {backoff:.0f}s: {e}')
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+
+            # Changes notified while the connection was down were missed
+            self.invalidate_all()
+            self.logger.info('Listening for guild config changes again, dropped the cached configs')
+
+    def _on_notification(self, conn, pid, channel, payload):
+        """ Drop the cached config of the guild named in a change notification from another process. """
+        token, _, guild_id = payload.partition(':')
+
+        if token != self.token:
+            self.invalidate(int(guild_id))
+
+    def invalidate(self, *guild_ids):
+        """ Drop cached configs so the next lookup reads them from the database again. """
+        for guild_id in guild_ids:
+            self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+
+            if self._configs.pop(guild_id, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_all(self):
+        """ Drop every cached config, including the ones still being read. """
+        self._generation += 1
+        self.invalidations += len(self._configs)
+        self._configs.clear()
+
+    def _version(self, guild_id):
+        return self._generation, self._versions.get(guild_id, 0)
+
+    async def get(self, guild_id: int) -> GuildConfig:
+        """ Get a guild's config, only querying the database if it isn't cached. """
+        config = self._configs.get(guild_id)
+
+        if config is not None:
+            self.hits += 1
+            return config
+
+        self.misses += 1
+        version = self._version(guild_id)
+
+        async def fetch():
+            async with self.db_pool.acquire() as conn:
+                guild_data = await DBHelper(conn).get_guild(guild_id)
+
+            config = GuildConfig.from_dict(guild_data)
+
+            # Don't cache the result if the config was changed while it was being read
+            if self._version(guild_id) == version:
+                self._configs[guild_id] = config
+
+            return config
+
+        # Concurrent misses share one read, unless the config changed after the shared read started
+        return await self._flights.do((guild_id, version), fetch)
+
+    async def update(self, guild_id: int, **data) -> GuildConfig:
+        """ Write config changes to the database, cache the new config and notify the other processes. """
+        async with self.db_pool.acquire() as conn:
+            db_helper = DBHelper(conn)
+
+            async with conn.transaction():
+                guild_data = await db_helper.update_guild(guild_id, **data)
+                await db_helper.notify(self.channel, f'{self.token}:{guild_id}')
+
+        config = GuildConfig.from_dict(guild_data)
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1  # Discard any reads still in flight
+        self._configs[guild_id] = config
+        return config
+
+    @property
+    def stats(self):
+        """ Counters describing how effective the cache is. """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._configs),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+            'invalidations': self.invalidations,
+            'collapsed_reads': self._flights.collapsed,
+            'reconnects': self.reconnects
+        }
+
+
+_MISSING = object()
+
+
+def _sizeof(value):
+    """ Approximate the memory used by an object and its attributes (one level deep). """
+    size = sys.getsizeof(value)
+    attrs = list(getattr(value, '__dict__', {}).values())
+    attrs += [getattr(value, slot) for slot in getattr(type(value), '__slots__', ()) if hasattr(value, slot)]
+
+    if hasattr(value, '__dict__'):
+        size += sys.getsizeof(value.__dict__)
+
+    return size + sum(sys.getsizeof(attr) for attr in attrs)
+
+
+class TTLCache:
+    """Bounded cache that evicts the least recently used entry when full and expires entries after a time to live.
+
+    Attributes
+    ----------
+    max_size : int
+        Maximum number of entries held before the least recently used one is evicted.
+    ttl : float
+        Seconds a value stays valid.
+    negative_ttl : float
+        Seconds a None or False value (a cached "nothing found") stays valid.
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.flights = SingleFlight()
+        self._generation = 0  # Bumped by every invalidation to discard fetches that started before it
+        self._entries = OrderedDict()  # Key to (expiry time, value), least recently used first
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """ Get an unexpired value, counting the lookup as a hit or a miss. """
+        value = self.peek(key, _MISSING)
+
+        if value is _MISSING:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        """ Get an unexpired value without counting the lookup. """
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        """ Cache a value, evicting the least recently used entries if the cache is full. """
+        ttl = self.negative_ttl if value is None or value is False else self.ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys):
+        """ Drop cached values so the next lookup fetches them again. """
+        self._generation += 1
+
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """ Drop every cached value. """
+        self._generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def set_if_current(self, generation, key, value):
+        """ Cache a fetched value unless the cache was invalidated since the fetch started. """
+        if generation == self._generation:
+            self.set(key, value)
+
+    @property
+    def generation(self):
+        """ Token to pass to set_if_current() for a value about to be fetched. """
+        return self._generation
+
+    async def get_or_fetch(self, key, fetch: Callable[[], Awaitable[Any]]):
+        """Get a cached value or await fetch() to get it and cache the result.
+
+        Concurrent misses for the same key share a single fetch unless the cache was invalidated in between.
+        """
+        value = self.get(key, _MISSING)
+
+        if value is _MISSING:
+            generation = self._generation
+
+            async def fetch_and_set():
+                fetched = await fetch()
+                self.set_if_current(generation, key, fetched)
+                return fetched
+
+            value = await self.flights.do((key, generation), fetch_and_set)
+
+        return value
+
+    @property
+    def memory(self):
+        """ Approximate number of bytes used by the cache and its entries. """
+        entry_size = sum(sys.getsizeof(key) + _sizeof(value) for key, (_, value) in self._entries.items())
+        return sys.getsizeof(self._entries) + entry_size
+
+    @property
+    def stats(self):
+        """ Counters describing how effective the cache is. """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'collapsed_fetches': self.flights.collapsed,
+            'memory_kb': self.memory / 1024
+        }
@@ -0,0 +1,54 @@
+# coalesce.py
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one.
+
+    The first caller for a key starts the call and every caller with the same key that arrives before it finishes
+    awaits the same future instead of starting its own. Results are not kept after the call finishes.
+
+    Attributes
+    ----------
+    calls : int
+        Number of calls actually made.
+    collapsed : int
+        Number of calls that were served by a call already in flight.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._in_flight = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]):
+        """ Await call() unless a call with the same key is in flight, in which case await that call's result. """
+        future = self._in_flight.get(key)
+
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(call())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        else:
+            self.collapsed += 1
+
+        # Shield the shared call so one caller being cancelled doesn't cancel it for the others
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    @property
+    def stats(self):
+        """ Counters describing how many calls were collapsed. """
+        total = self.calls + self.collapsed
+        return {
+            'in_flight': len(self._in_flight),
+            'calls': self.calls,
+            'collapsed': self.collapsed,
+            'collapse_rate': self.collapsed / total if total else 0
+        }
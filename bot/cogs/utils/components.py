@@ -0,0 +1,259 @@
+# components.py
+
+import contextlib
+import enum
+import re
+import secrets
+from typing import Awaitable, Callable, Dict, List, Sequence, Tuple
+
+import discord
+from discord.http import Route
+
+MAX_ROWS = 5
+MAX_BUTTONS_PER_ROW = 5
+MAX_SELECT_OPTIONS = 25
+
+_CUSTOM_EMOJI = re.compile(r'<(?P<animated>a?):(?P<name>\w+):(?P<id>\d+)>')
+
+
+class ButtonStyle(enum.IntEnum):
+    """ Enum for the colors of message component buttons. """
+    PRIMARY = 1
+    SECONDARY = 2
+    SUCCESS = 3
+    DANGER = 4
+
+
+class _ComponentType(enum.IntEnum):
+    ACTION_ROW = 1
+    BUTTON = 2
+    SELECT = 3
+
+
+class _ResponseType(enum.IntEnum):
+    CHANNEL_MESSAGE = 4
+    DEFERRED_UPDATE_MESSAGE = 6
+    UPDATE_MESSAGE = 7
+
+
+def _emoji_dict(emoji: str) -> dict:
+    """ Convert a unicode emoji or a custom emoji's mention to its component representation. """
+    match = _CUSTOM_EMOJI.fullmatch(emoji)
+
+    if match is None:
+        return {'name': emoji}
+
+    return {'name': match['name'], 'id': match['id'], 'animated': bool(match['animated'])}
+
+
+def button(custom_id: str, label: str = None, emoji: str = None, style: ButtonStyle = ButtonStyle.SECONDARY,
+           disabled: bool = False) -> dict:
+    """ Create a button component. """
+    component = {'type': _ComponentType.BUTTON, 'custom_id': custom_id, 'style': style, 'disabled': disabled}
+
+    if label is not None:
+        component['label'] = label
+
+    if emoji is not None:
+        component['emoji'] = _emoji_dict(emoji)
+
+    return component
+
+
+def select(custom_id: str, options: Sequence[Tuple[str, str]], placeholder: str = None) -> dict:
+    """ Create a select menu component from (label, value) options. """
+    component = {
+        'type': _ComponentType.SELECT,
+        'custom_id': custom_id,
+        'options': [{'label': label[:100], 'value': value} for label, value in options]
+    }
+
+    if placeholder is not None:
+        component['placeholder'] = placeholder[:150]
+
+    return component
+
+
+def paginated_selects(custom_id: str, options: Sequence[Tuple[str, str]], placeholder: str) -> List[dict]:
+    """ Split options too many for one select menu into several with custom IDs ending with their page number. """
+    pages = [options[index:index + MAX_SELECT_OPTIONS] for index in range(0, len(options), MAX_SELECT_OPTIONS)]
+
+    if len(pages) == 1:
+        return [select(f'{custom_id}:0', pages[0], placeholder)]
+
+    return [select(f'{custom_id}:{num}', page, f'{placeholder} ({page[0][0]} - {page[-1][0]})')
+            for num, page in enumerate(pages)]
+
+
+def action_rows(components: Sequence[dict]) -> List[dict]:
+    """ Lay components out into action rows: buttons fill rows of five and select menus take a row each. """
+    rows = []
+
+    row = None
+
+    for component in components:
+        if row is None or component['type'] == _ComponentType.SELECT or row[0]['type'] == _ComponentType.SELECT \
+                or len(row) == MAX_BUTTONS_PER_ROW:
+            row = []
+            rows.append({'type': _ComponentType.ACTION_ROW, 'components': row})
+
+        row.append(component)
+
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f'Components need {len(rows)} action rows but messages have at most {MAX_ROWS}')
+
+    return rows
+
+
+def _message_payload(content, embed, components):
+    payload = {'components': action_rows(components)}
+
+    if content is not None:
+        payload['content'] = content
+
+    if embed is not None:
+        payload['embed'] = embed.to_dict()
+
+    return payload
+
+
+async def send_message(bot, channel: discord.TextChannel, content: str = None, embed: discord.Embed = None,
+                       components: Sequence[dict] = ()) -> discord.Message:
+    """ Send a message with components in one request. """
+    route = Route('POST', '/channels/{channel_id}/messages', channel_id=channel.id)
+    data = await bot.http.request(route, json=_message_payload(content, embed, components))
+    return discord.Message(state=bot._connection, channel=channel, data=data)
+
+
+async def edit_message(bot, channel_id: int, message_id: int, content: str = None, embed: discord.Embed = None,
+                       components: Sequence[dict] = ()) -> None:
+    """ Replace the components and optionally the content and embed of a message in one request. """
+    route = Route('PATCH', '/channels/{channel_id}/messages/{message_id}', channel_id=channel_id,
+                  message_id=message_id)
+    await bot.http.request(route, json=_message_payload(content, embed, components))
+
+
+class Interaction:
+    """A click on a button or a selection in a select menu, received from the gateway.
+
+    Every interaction has to be responded to once within 3 seconds, either by updating the message the component is
+    on, by acknowledging it without changes or by replying to the user.
+
+    Attributes
+    ----------
+    custom_id : str
+        Custom ID of the component, formatted as "<menu key>:<action>".
+    key : str
+        Key of the menu the component belongs to.
+    action : str
+        Part of the custom ID after the menu key.
+    values : List[str]
+        Values selected in a select menu.
+    user_id : int
+        ID of the user who used the component.
+    message_id : int
+        ID of the message the component is on.
+    """
+
+    __slots__ = ('id', 'token', 'custom_id', 'key', 'action', 'values', 'user_id', 'message_id', 'responded', '_bot')
+
+    def __init__(self, bot, data):
+        """ Set attributes from an INTERACTION_CREATE payload. """
+        self._bot = bot
+        self.id = int(data['id'])
+        self.token = data['token']
+        self.custom_id = data['data']['custom_id']
+        self.key, _, self.action = self.custom_id.partition(':')
+        self.values = data['data'].get('values', [])
+        self.user_id = int((data.get('member') or data)['user']['id'])
+        self.message_id = int(data['message']['id'])
+        self.responded = False
+
+    async def _respond(self, response_type, data=None):
+        route = Route('POST', '/interactions/{interaction_id}/{interaction_token}/callback',
+                      interaction_id=self.id, interaction_token=self.token)
+        payload = {'type': response_type}
+
+        if data is not None:
+            payload['data'] = data
+
+        self.responded = True
+        await self._bot.http.request(route, json=payload)
+
+    async def update(self, embed: discord.Embed = None, components: Sequence[dict] = ()):
+        """ Respond by replacing the embed and components of the message the component is on. """
+        await self._respond(_ResponseType.UPDATE_MESSAGE, _message_payload(None, embed, components))
+
+    async def defer(self):
+        """ Respond without changing the message. """
+        await self._respond(_ResponseType.DEFERRED_UPDATE_MESSAGE)
+
+    async def reply(self, content: str):
+        """ Respond with a message only the user can see. """
+        await self._respond(_ResponseType.CHANNEL_MESSAGE, {'content': content, 'flags': 64})
+
+
+InteractionHandler = Callable[[Interaction], Awaitable[None]]
+
+
+class InteractionRouter:
+    """Dispatches component interactions to the menu whose key starts their custom ID.
+
+    Menus get a random key, prefix the custom IDs of their components with it and register a handler under it for as
+    long as they wait for input. Interactions with components of menus that stopped waiting, including the menus of a
+    previous run of the bot, are answered with a message telling the user the menu expired.
+
+    Attributes
+    ----------
+    routed : int
+        Number of interactions passed to a handler.
+    expired : int
+        Number of interactions with components of menus that stopped waiting.
+    """
+
+    def __init__(self):
+        self.routed = 0
+        self.expired = 0
+        self._handlers: Dict[str, InteractionHandler] = {}
+
+    def new_key(self) -> str:
+        """ Generate a menu key that isn't in use. """
+        while True:
+            key = secrets.token_hex(4)
+
+            if key not in self._handlers:
+                return key
+
+    @contextlib.contextmanager
+    def listening(self, key: str, handler: InteractionHandler):
+        """ Context manager sending the interactions of a menu to a handler until the block exits. """
+        if key in self._handlers:
+            raise ValueError(f'Menu {key} already has an interaction handler')
+
+        self._handlers[key] = handler
+
+        try:
+            yield
+        finally:
+            self._handlers.pop(key, None)
+
+    async def dispatch(self, interaction: Interaction):
+        """ Pass an interaction to the handler of its menu or tell the user the menu expired. """
+        handler = self._handlers.get(interaction.key)
+
+        if handler is None:
+            self.expired += 1
+            await interaction.reply('This menu has expired')
+            return
+
+        self.routed += 1
+        await handler(interaction)
+
+    @property
+    def stats(self):
+        """ Counters describing the menus waiting for interactions and the interactions they got. """
+        return {
+            'active_menus': len(self._handlers),
+            'routed': self.routed,
+            'expired': self.expired
+        }
@@ -80,14 +80,19 @@ class GuildConfig:
         team_method but for the MapMethod class.
     map_pool : MapPool
         The guild's map pool.
+    team_size : int
+        Number of players per team when a popped queue is split into several matches, or None to start one match
+        with the whole queue.
     """
 
-    def __init__(self, capacity: int, team_method: int, captain_method: int, map_method: int, map_pool: MapPool):
+    def __init__(self, capacity: int, team_method: int, captain_method: int, map_method: int, map_pool: MapPool,
+                 team_size: int = None):
         self.capacity = capacity
         self.team_method = team_method
         self.captain_method = captain_method
         self.map_method = map_method
         self.map_pool = map_pool
+        self.team_size = team_size
 
     @classmethod
     def from_dict(cls, guild_data: dict):
@@ -107,7 +112,8 @@ class GuildConfig:
                    TeamMethod.enum_str(guild_data['team_method']),
                    CaptainMethod.enum_str(guild_data['captain_method']),
                    MapMethod.enum_str(guild_data['map_method']),
-                   MapPool.from_dict(guild_data))
+                   MapPool.from_dict(guild_data),
+                   guild_data.get('team_size'))
 
     @property
     def to_dict(self):
@@ -122,7 +128,8 @@ class GuildConfig:
             'capacity': self.capacity,
             'team_method': TeamMethod(self.team_method).name.lower,
             'captain_method': CaptainMethod(self.captain_method).name.lower,
-            'map_method': MapMethod(self.map_method).name.lower
+            'map_method': MapMethod(self.map_method).name.lower,
+            'team_size': self.team_size
         }
         guild_data.update(self.map_pool.to_dict)
         return guild_data
@@ -3,71 +3,75 @@
 import datetime
 import discord
 from discord.ext import commands
-from typing import Dict, List
+from typing import Awaitable, Callable, Dict, List
 
+from .actor import JoinOutcome, JoinResult, QueueActor
 from .config import GuildConfig
-from .db import DBHelper
 from .map import MapPool
+from .player import PlayerStats
 
 
 class LeagueContext(commands.Context):
     """
     Custom context for the bot to implement streamlined database access.
     """
+    db_acquires = 0  # Database pool acquisitions made while invoking the command
+
     def _get_members(self, user_ids: List[int]) -> List[discord.Member]:
         return [self.guild.get_member(user_id) for user_id in user_ids]
 
-    async def queued_users(self) -> List[discord.Member]:
-        async with self.bot.db_pool.acquire() as conn:
-            user_ids = await DBHelper(conn).get_queued_users(self.guild.id)
+    @property
+    def queue(self) -> QueueActor:
+        return self.bot.queues.get(self.guild.id)
 
-        return self._get_members(user_ids)
+    async def queued_users(self) -> List[discord.Member]:
+        return self._get_members(self.queue.queued())
 
     async def enqueue_users(self, *users: discord.User) -> None:
-        user_ids = [user.id for user in users]
+        await self.queue.enqueue(*[user.id for user in users])
 
-        async with self.bot.db_pool.acquire() as conn:
-            db_helper = DBHelper(conn)
-            await db_helper.insert_users(*user_ids)
-            await db_helper.insert_queued_users(self.guild.id, *user_ids)
+    async def join_queue(self, user: discord.User, player_stats: PlayerStats = None) -> JoinResult:
+        config = await self.guild_config()
+        result = await self.queue.join(user.id, config.capacity)
 
-    async def dequeue_users(self, *users: discord.User) -> List[discord.Member]:
-        async with self.bot.db_pool.acquire() as conn:
-            dequeued_ids = await DBHelper(conn).delete_queued_users(self.guild.id, *[user.id for user in users])
+        if result.outcome == JoinOutcome.JOINED and player_stats is not None:
+            self.bot.queue_stats.add(self.guild.id, player_stats)
 
+        result.queue = self._get_members(result.queue)
+        return result
+
+    async def dequeue_users(self, *users: discord.User) -> List[discord.Member]:
+        dequeued_ids = await self.queue.dequeue(*[user.id for user in users])
+        self.bot.queue_stats.discard(self.guild.id, *dequeued_ids)
         return self._get_members(dequeued_ids)
 
     async def empty_queue(self) -> List[discord.Member]:
-        async with self.bot.db_pool.acquire() as conn:
-            cleared_ids = await DBHelper(conn).clear_queued_users(self.guild.id)
-
+        cleared_ids = await self.queue.empty()
+        self.bot.queue_stats.discard(self.guild.id, *cleared_ids)
         return self._get_members(cleared_ids)
 
-    async def queue_banlist(self) -> Dict[discord.Member, datetime.datetime]:
-        async with self.bot.db_pool.acquire() as conn:
-            banned_dict = await DBHelper(conn).get_banned_users(self.guild.id)
+    def show_queue(self, render: Callable[[], Awaitable[discord.Embed]], repost: bool = False) -> None:
+        self.queue.show(self.channel, render, repost)
+
+    def is_banned(self, user: discord.User) -> bool:
+        return self.bot.bans.is_banned(self.guild.id, user.id)
 
+    def unban_time(self, user: discord.User) -> datetime.datetime:
+        return self.bot.bans.unban_time(self.guild.id, user.id)
+
+    async def queue_banlist(self) -> Dict[discord.Member, datetime.datetime]:
+        banned_dict = self.bot.bans.banned_users(self.guild.id)
         return {self.guild.get_member(user_id): time for user_id, time in banned_dict.items()}
 
     async def ban_from_queue(self, *users: discord.User, unban_time: datetime.datetime = None) -> None:
-        user_ids = [user.id for user in users]
-
-        async with self.bot.db_pool.acquire() as conn:
-            db_helper = DBHelper(conn)
-            await db_helper.insert_users(*user_ids)
-            await db_helper.insert_banned_users(self.guild.id, *user_ids, unban_time=unban_time)
+        await self.queue.ban([user.id for user in users], unban_time)
 
     async def unban_from_queue(self, *users: discord.User) -> List[discord.Member]:
-        async with self.bot.db_pool.acquire() as conn:
-            unbanned_ids = await DBHelper(conn).delete_banned_users(self.guild.id, *[user.id for user in users])
-
+        unbanned_ids = await self.queue.unban([user.id for user in users])
         return self._get_members(unbanned_ids)
 
     async def guild_config(self) -> GuildConfig:
-        async with self.bot.db_pool.acquire() as conn:
-            guild_data = await DBHelper(conn).get_guild(self.guild.id)
-
-        return GuildConfig.from_dict(guild_data)
+        return await self.bot.guild_configs.get(self.guild.id)
 
     async def set_guild_config(self, *, guild_config: GuildConfig = None, map_pool: MapPool = None, **kwargs) -> None:
         if guild_config is not None:
@@ -77,5 +81,4 @@ class LeagueContext(commands.Context):
         else:
             guild_data = kwargs
 
-        async with self.bot.db_pool.acquire() as conn:
-            await DBHelper(conn).update_guild(self.guild.id, **guild_data)
+        await self.bot.guild_configs.update(self.guild.id, **guild_data)
@@ -1,5 +1,7 @@
 # db.py
 
+from .statements import STATEMENTS
+
 
 class DBHelper:
     """ Class to contain database query wrapper functions. """
@@ -13,47 +15,55 @@ class DBHelper:
         """ Get key list of attributes from list of Record objects. """
         return list(map(lambda r: r[key], records))
 
+    async def _run(self, method, name, statement, *args, **kwargs):
+        """ Run a single statement outside of an explicit transaction, recording it in the statement registry. """
+        return await STATEMENTS.run(self.conn, method, name, statement, *args, **kwargs)
+
     async def _get_row(self, table, row_id):
         """ Generic method to get table row by object id. """
         statement = (
             f'SELECT * FROM {table}\n'
             '    WHERE id = $1'
         )
-
-        async with self.conn.transaction():
-            row = await self.conn.fetchrow(statement, row_id)
-
+        row = await self._run('fetchrow', f'get_{table}', statement, row_id)
         return {col: val for col, val in row.items()}
 
     async def _update_row(self, table, row_id, **data):
-        """ Generic method to update table row by object id. """
-        cols = list(data.keys())
-        col_vals = ',\n    '.join(f'{col} = ${num}' for num, col in enumerate(cols, start=2))
-        ret_vals = ',\n    '.join(cols)
+        """ Generic method to update table row by object id and return the whole updated row. """
+        cols = sorted(data.keys())  # Same statement text for the same set of columns
+        name, statement = STATEMENTS.update_statement(table, cols)
+        updated_vals = await self._run('fetch', name, statement, row_id, *[data[col] for col in cols])
+        return {col: val for rec in updated_vals for col, val in rec.items()}
+
+    async def notify(self, channel, payload):
+        """ Send a notification to the listeners of a channel (delivered when the transaction commits). """
+        await self._run('execute', 'notify', 'SELECT pg_notify($1, $2);', channel, payload)
+
+    async def ping(self):
+        """ Check that the connection still works. """
+        await self._run('fetchval', 'ping', 'SELECT 1;')
+
+    async def try_advisory_locks(self, lock_class, names):
+        """ Take the session advisory locks named by strings that are free and return the names of the ones taken. """
         statement = (
-            f'UPDATE {table}\n'
-            f'    SET {col_vals}\n'
-            '    WHERE id = $1\n'
-            f'    RETURNING {ret_vals};'
+            'SELECT name FROM unnest($2::TEXT[]) AS name\n'
+            '    WHERE pg_try_advisory_lock($1, hashtext(name));'
         )
 
-        async with self.conn.transaction():
-            updated_vals = await self.conn.fetch(statement, row_id, *[data[col] for col in cols])
+        locked = await self._run('fetch', 'try_advisory_locks', statement, lock_class, names)
 
-        return {col: val for rec in updated_vals for col, val in rec.items()}
+        return self._get_record_attrs(locked, 'name')
 
     async def insert_guilds(self, *guild_ids):
         """ Add a list of guilds into the guilds table and return the ones successfully added. """
-        rows = [tuple([guild_id] + [None] * 14) for guild_id in guild_ids]
         statement = (
             'INSERT INTO guilds (id)\n'
-            '    (SELECT id FROM unnest($1::guilds[]))\n'
+            '    (SELECT id FROM unnest($1::BIGINT[]) AS id)\n'
             '    ON CONFLICT (id) DO NOTHING\n'
             '    RETURNING id;'
         )
 
-        async with self.conn.transaction():
-            inserted = await self.conn.fetch(statement, rows)
+        inserted = await self._run('fetch', 'insert_guilds', statement, guild_ids)
 
         return self._get_record_attrs(inserted, 'id')
 
@@ -65,30 +75,39 @@ class DBHelper:
             '    RETURNING id;'
         )
 
-        async with self.conn.transaction():
-            deleted = await self.conn.fetch(statement, guild_ids)
+        deleted = await self._run('fetch', 'delete_guilds', statement, guild_ids)
 
         return self._get_record_attrs(deleted, 'id')
 
-    async def sync_guilds(self, *guild_ids):
-        """ Synchronizes the guilds table with the guilds in the bot. """
-
-        insert_rows = [tuple([guild_id] + [None] * 14) for guild_id in guild_ids]
+    async def sync_guilds(self, guild_ids, shard_id=0, shard_count=1):
+        """ Synchronizes the guilds of a shard in the guilds table with the shard's guilds in the bot. """
+        # Stage the guild IDs with COPY so the diff below is a pair of anti-joins instead of array scans
+        create_statement = (
+            'CREATE TEMPORARY TABLE guild_sync (\n'
+            '    id BIGINT PRIMARY KEY\n'
+            ') ON COMMIT DROP;'
+        )
         insert_statement = (
             'INSERT INTO guilds (id)\n'
-            '    (SELECT id FROM unnest($1::guilds[]))\n'
+            '    (SELECT id FROM guild_sync s\n'
+            '        WHERE NOT EXISTS (SELECT 1 FROM guilds g WHERE g.id = s.id))\n'
             '    ON CONFLICT (id) DO NOTHING\n'
             '    RETURNING id;'
         )
+        # A guild's shard is (guild_id >> 22) % shard_count
         delete_statement = (
-            'DELETE FROM guilds\n'
-            '    WHERE id::BIGINT != ALL($1::BIGINT[])\n'
+            'DELETE FROM guilds g\n'
+            '    WHERE (g.id >> 22) % $2 = $1\n'
+            '    AND NOT EXISTS (SELECT 1 FROM guild_sync s WHERE s.id = g.id)\n'
             '    RETURNING id;'
         )
 
         async with self.conn.transaction():
-            inserted = await self.conn.fetch(insert_statement, insert_rows)
-            deleted = await self.conn.fetch(delete_statement, guild_ids)
+            await self._run('execute', 'sync_guilds_stage', create_statement)
+            await self._run('copy_records_to_table', 'sync_guilds_copy', 'guild_sync',
+                            records=[(guild_id,) for guild_id in guild_ids])
+            inserted = await self._run('fetch', 'sync_guilds_insert', insert_statement)
+            deleted = await self._run('fetch', 'sync_guilds_delete', delete_statement, shard_id, shard_count)
 
         return self._get_record_attrs(inserted, 'id'), self._get_record_attrs(deleted, 'id')
 
@@ -102,8 +121,7 @@ class DBHelper:
             '    RETURNING id;'
         )
 
-        async with self.conn.transaction():
-            inserted = await self.conn.fetch(statement, rows)
+        inserted = await self._run('fetch', 'insert_users', statement, rows)
 
         return self._get_record_attrs(inserted, 'id')
 
@@ -115,77 +133,100 @@ class DBHelper:
             '    RETURNING id;'
         )
 
-        async with self.conn.transaction():
-            deleted = await self.conn.fetch(statement, user_ids)
+        deleted = await self._run('fetch', 'delete_users', statement, user_ids)
 
         return self._get_record_attrs(deleted, 'id')
 
-    async def get_queued_users(self, guild_id):
-        """ Get all the queued users of the guild from the queued_users table. """
+    async def get_all_queued_users(self, shard_ids=None, shard_count=None):
+        """ Get the queues of every guild, or of the guilds on some shards, as (guild ID, user ID) pairs in order. """
         statement = (
-            'SELECT user_id FROM queued_users\n'
-            '    WHERE guild_id = $1;'
+            'SELECT guild_id, user_id FROM queued_users\n'
+            '    WHERE $1::INT[] IS NULL OR (guild_id >> 22) % $2 = ANY($1::INT[])\n'
+            '    ORDER BY position;'
         )
 
-        async with self.conn.transaction():
-            queue = await self.conn.fetch(statement, guild_id)
+        queued = await self._run('fetch', 'get_all_queued_users', statement, shard_ids, shard_count)
 
-        return self._get_record_attrs(queue, 'user_id')
+        return [tuple(queued_user) for queued_user in queued]
 
-    async def insert_queued_users(self, guild_id, *user_ids):
-        """ Insert multiple users of a guild into the queued_users table. """
-        statement = (
+    async def save_queued_users(self, guild_id, added_ids, removed_ids):
+        """Apply the users added to and removed from a guild's queue to the queued_users table at once.
+
+        Removed users are deleted first, so users both removed and added are stored again with a new position. The
+        added users get increasing positions in the order given, which should be the order they joined in.
+        """
+        insert_statement = (
             'INSERT INTO queued_users (guild_id, user_id)\n'
-            '    (SELECT * FROM unnest($1::queued_users[]));'
+            '    (SELECT $1, user_id FROM unnest($2::BIGINT[]) WITH ORDINALITY AS added (user_id, num)\n'
+            '        ORDER BY num)\n'
+            '    ON CONFLICT (guild_id, user_id) DO NOTHING;'
+        )
+        delete_statement = (
+            'DELETE FROM queued_users\n'
+            '    WHERE guild_id = $1 AND user_id = ANY($2::BIGINT[]);'
         )
 
         async with self.conn.transaction():
-            await self.conn.execute(statement, [(guild_id, user_id) for user_id in user_ids])
+            if removed_ids:
+                await self._run('execute', 'save_queued_users_delete', delete_statement, guild_id, removed_ids)
 
-    async def delete_queued_users(self, guild_id, *user_ids):
-        """ Delete multiple users of a guild from the queued_users table. """
+            if added_ids:
+                await self.insert_users(*added_ids)
+                await self._run('execute', 'save_queued_users_insert', insert_statement, guild_id, added_ids)
+
+    async def get_queue_dashboards(self, shard_ids=None, shard_count=None):
+        """ Get the queue display message of every guild, or of the guilds on some shards, as tuples. """
         statement = (
-            'DELETE FROM queued_users\n'
-            '    WHERE guild_id = $1 AND user_id = ANY($2::BIGINT[])\n'
-            '    RETURNING user_id;'
+            'SELECT guild_id, channel_id, message_id FROM queue_dashboards\n'
+            '    WHERE $1::INT[] IS NULL OR (guild_id >> 22) % $2 = ANY($1::INT[]);'
         )
 
-        async with self.conn.transaction():
-            deleted = await self.conn.fetch(statement, guild_id, user_ids)
+        dashboards = await self._run('fetch', 'get_queue_dashboards', statement, shard_ids, shard_count)
 
-        return self._get_record_attrs(deleted, 'user_id')
+        return [tuple(dashboard) for dashboard in dashboards]
 
-    async def clear_queued_users(self, guild_id):
-        """ Delete all users of a guild from the queued_users table. """
+    async def set_queue_dashboard(self, guild_id, channel_id, message_id):
+        """ Insert or replace the queue display message of a guild in the queue_dashboards table. """
         statement = (
-            'DELETE FROM queued_users\n'
-            '    WHERE guild_id = $1\n'
-            '    RETURNING user_id;'
+            'INSERT INTO queue_dashboards (guild_id, channel_id, message_id)\n'
+            '    VALUES ($1, $2, $3)\n'
+            '    ON CONFLICT (guild_id) DO UPDATE\n'
+            '    SET channel_id = EXCLUDED.channel_id, message_id = EXCLUDED.message_id;'
         )
 
-        async with self.conn.transaction():
-            deleted = await self.conn.fetch(statement, guild_id)
+        await self._run('execute', 'set_queue_dashboard', statement, guild_id, channel_id, message_id)
 
-        return self._get_record_attrs(deleted, 'user_id')
+    async def get_all_banned_users(self, shard_ids=None, shard_count=None):
+        """ Get the bans of every guild, or of the guilds on some shards, as (guild ID, user ID, unban time) tuples. """
+        statement = (
+            'SELECT guild_id, user_id, unban_time FROM banned_users\n'
+            '    WHERE $1::INT[] IS NULL OR (guild_id >> 22) % $2 = ANY($1::INT[]);'
+        )
 
-    async def get_banned_users(self, guild_id):
-        """ Get all the banned users of the guild from the banned_users table. """
-        delete_statement = (
+        bans = await self._run('fetch', 'get_all_banned_users', statement, shard_ids, shard_count)
+
+        return [tuple(ban) for ban in bans]
+
+    async def delete_expired_banned_users(self, expiry_time, limit, shard_ids=None, shard_count=None):
+        """Delete up to limit bans that expired by expiry_time and return them as (guild ID, user ID) tuples.
+
+        Only the bans of the guilds on the given shards are deleted if shard IDs are passed.
+        """
+        statement = (
             'DELETE FROM banned_users\n'
-            '    WHERE guild_id = $1 AND CURRENT_TIMESTAMP > unban_time;'
-        )
-        select_statement = (
-            'SELECT * FROM banned_users\n'
-            '    WHERE guild_id = $1;'
+            '    WHERE (guild_id, user_id) IN (\n'
+            '        SELECT guild_id, user_id FROM banned_users\n'
+            '            WHERE unban_time <= $1\n'
+            '            AND ($3::INT[] IS NULL OR (guild_id >> 22) % $4 = ANY($3::INT[]))\n'
+            '            LIMIT $2\n'
+            '    )\n'
+            '    RETURNING guild_id, user_id;'
         )
 
-        async with self.conn.transaction():
-            await self.conn.execute(delete_statement, guild_id)
+        deleted = await self._run('fetch', 'delete_expired_banned_users', statement, expiry_time, limit, shard_ids,
+                                  shard_count)
 
-        async with self.conn.transaction():
-            queue = await self.conn.fetch(select_statement, guild_id)
-
-        return dict(zip(self._get_record_attrs(queue, 'user_id'), self._get_record_attrs(queue, 'unban_time')))
+        return [tuple(ban) for ban in deleted]
 
     async def insert_banned_users(self, guild_id, *user_ids, unban_time=None):
         """ Insert multiple users of a guild into the banned_users table"""
@@ -198,8 +239,7 @@ class DBHelper:
 
         insert_rows = [(guild_id, user_id, unban_time) for user_id in user_ids]
 
-        async with self.conn.transaction():
-            await self.conn.executemany(statement, insert_rows)
+        await self._run('executemany', 'insert_banned_users', statement, insert_rows)
 
     async def delete_banned_users(self, guild_id, *user_ids):
         """ Delete multiple users of a guild from the banned_users table. """
@@ -209,8 +249,7 @@ class DBHelper:
             '    RETURNING user_id;'
         )
 
-        async with self.conn.transaction():
-            deleted = await self.conn.fetch(statement, guild_id, user_ids)
+        deleted = await self._run('fetch', 'delete_banned_users', statement, guild_id, user_ids)
 
         return self._get_record_attrs(deleted, 'user_id')
 
@@ -221,3 +260,158 @@ class DBHelper:
     async def update_guild(self, guild_id, **data):
         """ Update a guild's row in the guilds table. """
         return await self._update_row('guilds', guild_id, **data)
+
+    async def insert_match(self, guild_id, channel_id, message_id, user_ids, state, deadline):
+        """ Insert a match into the matches table and return its row. """
+        statement = (
+            'INSERT INTO matches (guild_id, channel_id, message_id, users, state, deadline)\n'
+            '    VALUES ($1, $2, $3, $4, $5, $6)\n'
+            '    RETURNING *;'
+        )
+
+        inserted = await self._run('fetchrow', 'insert_match', statement, guild_id, channel_id, message_id,
+                                   user_ids, state, deadline)
+
+        return {col: val for col, val in inserted.items()}
+
+    async def update_match(self, match_id, **data):
+        """ Update a match's row in the matches table. """
+        return await self._update_row('matches', match_id, **data)
+
+    async def get_in_flight_matches(self, *guild_ids):
+        """ Get the rows of the matches of the guilds that haven't gone live or been cancelled yet. """
+        statement = (
+            'SELECT * FROM matches\n'
+            '    WHERE guild_id = ANY($1::BIGINT[]) AND state NOT IN (\'live\', \'cancelled\')\n'
+            '    ORDER BY id;'
+        )
+
+        matches = await self._run('fetch', 'get_in_flight_matches', statement, guild_ids)
+
+        return [{col: val for col, val in match.items()} for match in matches]
+
+    async def delete_old_matches(self, finished_before, expired_before):
+        """ Delete matches that finished or whose phase timed out before the given times and return how many. """
+        statement = (
+            'DELETE FROM matches\n'
+            '    WHERE (state IN (\'live\', \'cancelled\') AND updated_at < $1)\n'
+            '    OR (state NOT IN (\'live\', \'cancelled\') AND deadline < $2)\n'
+            '    RETURNING id;'
+        )
+
+        deleted = await self._run('fetch', 'delete_old_matches', statement, finished_before, expired_before)
+
+        return len(deleted)
+
+    async def upsert_leaderboard_rows(self, guild_id, rows):
+        """ Insert or update (discord ID, score, matches played, win percent) rows of a guild's leaderboard. """
+        statement = (
+            'INSERT INTO leaderboard (guild_id, discord_id, score, matches_played, win_percent)\n'
+            '    (SELECT $1, * FROM unnest($2::BIGINT[], $3::INTEGER[], $4::INTEGER[], $5::REAL[]))\n'
+            '    ON CONFLICT (guild_id, discord_id) DO UPDATE\n'
+            '    SET score = EXCLUDED.score,\n'
+            '        matches_played = EXCLUDED.matches_played,\n'
+            '        win_percent = EXCLUDED.win_percent;'
+        )
+
+        columns = [list(col) for col in zip(*rows)] if rows else [[], [], [], []]
+        await self._run('execute', 'upsert_leaderboard_rows', statement, guild_id, *columns)
+
+    async def delete_leaderboard_rows(self, guild_id, *discord_ids):
+        """ Delete multiple users of a guild from the leaderboard table. """
+        statement = (
+            'DELETE FROM leaderboard\n'
+            '    WHERE guild_id = $1 AND discord_id = ANY($2::BIGINT[])\n'
+            '    RETURNING discord_id;'
+        )
+
+        deleted = await self._run('fetch', 'delete_leaderboard_rows', statement, guild_id, discord_ids)
+
+        return self._get_record_attrs(deleted, 'discord_id')
+
+    async def replace_leaderboard(self, guild_id, rows):
+        """ Replace a guild's whole leaderboard with the given rows and record when it was rebuilt. """
+        create_statement = (
+            'CREATE TEMPORARY TABLE leaderboard_sync (\n'
+            '    discord_id BIGINT PRIMARY KEY,\n'
+            '    score INTEGER NOT NULL,\n'
+            '    matches_played INTEGER NOT NULL,\n'
+            '    win_percent REAL NOT NULL\n'
+            ') ON COMMIT DROP;'
+        )
+        delete_statement = (
+            'DELETE FROM leaderboard l\n'
+            '    WHERE l.guild_id = $1\n'
+            '    AND NOT EXISTS (SELECT 1 FROM leaderboard_sync s WHERE s.discord_id = l.discord_id);'
+        )
+        # Only rows whose values changed are rewritten
+        upsert_statement = (
+            'INSERT INTO leaderboard (guild_id, discord_id, score, matches_played, win_percent)\n'
+            '    (SELECT $1, * FROM leaderboard_sync)\n'
+            '    ON CONFLICT (guild_id, discord_id) DO UPDATE\n'
+            '    SET score = EXCLUDED.score,\n'
+            '        matches_played = EXCLUDED.matches_played,\n'
+            '        win_percent = EXCLUDED.win_percent\n'
+            '    WHERE (leaderboard.score, leaderboard.matches_played, leaderboard.win_percent)\n'
+            '        IS DISTINCT FROM (EXCLUDED.score, EXCLUDED.matches_played, EXCLUDED.win_percent);'
+        )
+        refreshed_statement = (
+            'INSERT INTO leaderboard_refreshes (guild_id, refreshed_at)\n'
+            '    VALUES($1, CURRENT_TIMESTAMP)\n'
+            '    ON CONFLICT (guild_id) DO UPDATE\n'
+            '    SET refreshed_at = EXCLUDED.refreshed_at;'
+        )
+
+        async with self.conn.transaction():
+            await self._run('execute', 'replace_leaderboard_stage', create_statement)
+            await self._run('copy_records_to_table', 'replace_leaderboard_copy', 'leaderboard_sync', records=rows)
+            await self._run('execute', 'replace_leaderboard_delete', delete_statement, guild_id)
+            await self._run('execute', 'replace_leaderboard_upsert', upsert_statement, guild_id)
+            await self._run('execute', 'replace_leaderboard_refreshed', refreshed_statement, guild_id)
+
+    async def get_leaderboard(self, guild_id, limit, discord_id=None):
+        """Get the top rows of a guild's leaderboard and when it was last rebuilt.
+
+        If a discord ID is given, that user's row and rank are fetched in the same query.
+
+        Returns
+        -------
+        tuple
+            The top (rank, discord ID, score, matches played, win percent) rows, the user's row or None and the time the
+            leaderboard was last rebuilt or None if it never was.
+        """
+        # Both the top rows and the user's rank are read from the leaderboard_rank_idx index. Tied players share a rank,
+        # one more than the number of players ahead of them, in the top rows and the user's row alike
+        statement = (
+            'WITH top AS (\n'
+            '    SELECT discord_id, score, matches_played, win_percent FROM leaderboard\n'
+            '        WHERE guild_id = $1\n'
+            '        ORDER BY score DESC, matches_played DESC\n'
+            '        LIMIT $2\n'
+            '), member AS (\n'
+            '    SELECT discord_id, score, matches_played, win_percent FROM leaderboard\n'
+            '        WHERE guild_id = $1 AND discord_id = $3\n'
+            ')\n'
+            'SELECT \'top\' AS kind, rank() OVER (ORDER BY score DESC, matches_played DESC) AS rank,\n'
+            '       top.*, NULL::TIMESTAMPTZ AS refreshed_at FROM top\n'
+            'UNION ALL\n'
+            'SELECT \'member\', (SELECT COUNT(*) + 1 FROM leaderboard o\n'
+            '                        WHERE o.guild_id = $1 AND (o.score > m.score\n'
+            '                        OR (o.score = m.score AND o.matches_played > m.matches_played))),\n'
+            '       m.*, NULL FROM member m\n'
+            'UNION ALL\n'
+            'SELECT \'refreshed\', NULL, NULL, NULL, NULL, NULL, refreshed_at FROM leaderboard_refreshes\n'
+            '    WHERE guild_id = $1;'
+        )
+
+        records = await self._run('fetch', 'get_leaderboard', statement, guild_id, limit, discord_id)
+        rows = {'top': [], 'member': [], 'refreshed': []}
+
+        for record in records:
+            rows[record['kind']].append(record)
+
+        top = sorted((tuple(record.values())[1:-1] for record in rows['top']), key=lambda row: row[0])
+        member = tuple(rows['member'][0].values())[1:-1] if rows['member'] else None
+        refreshed_at = rows['refreshed'][0]['refreshed_at'] if rows['refreshed'] else None
+
+        return top, member, refreshed_at
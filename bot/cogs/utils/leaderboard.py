@@ -0,0 +1,156 @@
+# leaderboard.py
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import logging
+from typing import List, Optional, Tuple
+
+import discord
+
+from .coalesce import SingleFlight
+from .db import DBHelper
+from .player import PlayerStats, PlayerStatsTable
+
+
+class LeaderboardEntry:
+    """ A player's row of a guild's leaderboard. """
+
+    __slots__ = ('rank', 'discord_id', 'score', 'matches_played', 'win_percent')
+
+    def __init__(self, rank, discord_id, score, matches_played, win_percent):
+        """ Set attributes. """
+        self.rank = rank
+        self.discord_id = discord_id
+        self.score = score
+        self.matches_played = matches_played
+        self.win_percent = win_percent
+
+
+class Leaderboard:
+    """Per-guild leaderboards materialized in the leaderboard table.
+
+    A guild's leaderboard is built from the API the first time it is requested and then kept up to date incrementally:
+    members are added when they join, removed when they leave and a player's row is rewritten whenever their stats are
+    fetched anyway. Leaderboards older than max_age are rebuilt in the background while the current one keeps being
+    served, so reading the top players or a member's rank is a single indexed query.
+
+    Attributes
+    ----------
+    max_age : datetime.timedelta
+        Age after which a guild's leaderboard is rebuilt from the API.
+    rebuilds : int
+        Number of leaderboards rebuilt from the API.
+    updates : int
+        Number of rows updated incrementally.
+    """
+    max_age = timedelta(hours=6)
+
+    def __init__(self, db_pool):
+        self.db_pool = db_pool
+        self.rebuilds = 0
+        self.updates = 0
+        self.logger = logging.getLogger('csgoleague.leaderboard')
+        self._rebuilds = SingleFlight()  # One rebuild per guild at a time
+        self._tasks = set()
+
+    @staticmethod
+    def _row(player: PlayerStats):
+        """ Get the leaderboard row of a player. """
+        return player.discord, player.score, player.matches_played, player.win_percent
+
+    async def _rebuild(self, guild: discord.Guild):
+        """ Fetch the stats of every member of a guild and replace its leaderboard with them. """
+        table = await PlayerStatsTable.from_users(guild.members)
+        rows = list(zip(table['discord'], table['score'], table.matches_played, table.win_percent))
+
+        async with self.db_pool.acquire() as conn:
+            await DBHelper(conn).replace_leaderboard(guild.id, rows)
+
+        self.rebuilds += 1
+        self.logger.info(f'Rebuilt the leaderboard of guild {guild.id} ({len(rows)} ranked members)')
+
+    async def rebuild(self, guild: discord.Guild):
+        """ Rebuild a guild's leaderboard from the API, joining a rebuild of the guild that is already running. """
+        await self._rebuilds.do(guild.id, lambda: self._rebuild(guild))
+
+    def _rebuild_later(self, guild: discord.Guild):
+        """ Rebuild a guild's leaderboard in the background. """
+        task = asyncio.ensure_future(self.rebuild(guild))
+        self._tasks.add(task)
+        task.add_done_callback(self._rebuild_done)
+
+    def _rebuild_done(self, task):
+        self._tasks.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error('Failed to rebuild a leaderboard', exc_info=task.exception())
+
+    async def standings(self, guild: discord.Guild, member: discord.Member = None,
+                        num: int = 5) -> Tuple[List[LeaderboardEntry], Optional[LeaderboardEntry]]:
+        """Get the top players of a guild and optionally a member's position.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+        member : discord.Member, optional
+        num : int
+            Number of top players to get.
+
+        Returns
+        -------
+        tuple
+            The top players' entries and the member's entry or None if they aren't ranked.
+        """
+        member_id = member.id if member else None
+
+        async with self.db_pool.acquire() as conn:
+            top, member_row, refreshed_at = await DBHelper(conn).get_leaderboard(guild.id, num, member_id)
+
+        if refreshed_at is None:  # Never built, there is nothing to serve yet
+            await self.rebuild(guild)
+
+            async with self.db_pool.acquire() as conn:
+                top, member_row, refreshed_at = await DBHelper(conn).get_leaderboard(guild.id, num, member_id)
+        elif datetime.now(timezone.utc) - refreshed_at > self.max_age:
+            self._rebuild_later(guild)
+
+        member_entry = LeaderboardEntry(*member_row) if member_row else None
+        return [LeaderboardEntry(*row) for row in top], member_entry
+
+    async def update(self, guild: discord.Guild, *players: PlayerStats):
+        """ Write freshly fetched stats of players to a guild's leaderboard. """
+        if not players:
+            return
+
+        async with self.db_pool.acquire() as conn:
+            await DBHelper(conn).upsert_leaderboard_rows(guild.id, [self._row(player) for player in players])
+
+        self.updates += len(players)
+
+    async def add_member(self, member: discord.Member):
+        """ Add a member who joined a guild to its leaderboard if they have stats. """
+        players = [player async for player in PlayerStats.from_users([member])]
+        await self.update(member.guild, *players)
+
+    async def remove_members(self, guild: discord.Guild, *members: discord.Member):
+        """ Remove members who left a guild from its leaderboard. """
+        async with self.db_pool.acquire() as conn:
+            deleted = await DBHelper(conn).delete_leaderboard_rows(guild.id, *(member.id for member in members))
+
+        self.updates += len(deleted)
+
+    async def close(self):
+        """ Cancel the rebuilds running in the background. """
+        for task in list(self._tasks):
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @property
+    def stats(self):
+        """ Counters describing how the leaderboards were kept up to date. """
+        return {
+            'rebuilds': self.rebuilds,
+            'background_rebuilds': len(self._tasks),
+            'row_updates': self.updates
+        }
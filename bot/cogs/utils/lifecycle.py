@@ -0,0 +1,145 @@
+# lifecycle.py
+
+from datetime import datetime, timedelta, timezone
+import enum
+from typing import List
+
+from .db import DBHelper
+
+
+class MatchState(enum.Enum):
+    """ Enum for the phases a match goes through, in order. """
+    READY_CHECK = 'ready_check'
+    TEAM_DRAFT = 'team_draft'
+    MAP_SELECT = 'map_select'
+    SERVER_REQUESTED = 'server_requested'
+    LIVE = 'live'
+    CANCELLED = 'cancelled'
+
+    def __str__(self):
+        """ Get the value of the enum. """
+        return self.value
+
+
+_ORDER = list(MatchState)
+_FINAL_STATES = (MatchState.LIVE, MatchState.CANCELLED)
+
+
+class MatchLifecycle:
+    """A match on its way from the ready check to a live server, persisted in the matches table.
+
+    Every phase change and every pick, ban or ready up is written through as it happens, so a restarted bot can find
+    the matches that were in flight, fetch their messages by ID and resume each one from the phase it was in. Phases
+    only move forward and phases that don't need input, like autobalanced teams, are skipped over.
+
+    Attributes
+    ----------
+    id : int
+    guild_id : int
+    channel_id : int
+    message_id : int
+        Message the match's menus are displayed on.
+    state : MatchState
+    users : List[int]
+        IDs of the match's players.
+    ready_users : List[int]
+        IDs of the players who readied up.
+    team_one : List[int]
+        IDs of the first team's players, captain first.
+    team_two : List[int]
+        IDs of the second team's players, captain first.
+    banned_maps : List[str]
+        Dev names of the maps banned so far.
+    map : str
+        Dev name of the picked map.
+    deadline : datetime.datetime
+        When the current phase times out.
+    retention : datetime.timedelta
+        How long finished matches are kept, and how long after their deadline abandoned ones are.
+    """
+    retention = timedelta(days=7)
+
+    def __init__(self, db_pool, row):
+        """ Set attributes from a matches row. """
+        self.db_pool = db_pool
+        self.id = row['id']
+        self._set(row)
+
+    def _set(self, row):
+        self.guild_id = row['guild_id']
+        self.channel_id = row['channel_id']
+        self.message_id = row['message_id']
+        self.state = MatchState(row['state'])
+        self.users: List[int] = list(row['users'])
+        self.ready_users: List[int] = list(row['ready_users'])
+        self.team_one: List[int] = list(row['team_one'])
+        self.team_two: List[int] = list(row['team_two'])
+        self.banned_maps: List[str] = list(row['banned_maps'])
+        self.map = row['map']
+        self.deadline = row['deadline']
+
+    @staticmethod
+    def _deadline(timeout):
+        return None if timeout is None else datetime.now(timezone.utc) + timedelta(seconds=timeout)
+
+    @classmethod
+    async def create(cls, db_pool, guild_id: int, channel_id: int, message_id: int, user_ids: List[int],
+                     state: MatchState = MatchState.READY_CHECK, timeout: float = None) -> 'MatchLifecycle':
+        """ Record a new match starting in a phase that times out after the given number of seconds. """
+        async with db_pool.acquire() as conn:
+            row = await DBHelper(conn).insert_match(guild_id, channel_id, message_id, list(user_ids), str(state),
+                                                    cls._deadline(timeout))
+
+        return cls(db_pool, row)
+
+    @classmethod
+    async def in_flight(cls, db_pool, *guild_ids: int) -> List['MatchLifecycle']:
+        """ Get the matches of the guilds that are still on their way to a server. """
+        async with db_pool.acquire() as conn:
+            rows = await DBHelper(conn).get_in_flight_matches(*guild_ids)
+
+        return [cls(db_pool, row) for row in rows]
+
+    @classmethod
+    async def prune(cls, db_pool) -> int:
+        """ Delete the matches that finished or were abandoned longer than the retention ago and return how many. """
+        cutoff = datetime.now(timezone.utc) - cls.retention
+
+        async with db_pool.acquire() as conn:
+            return await DBHelper(conn).delete_old_matches(cutoff, cutoff)
+
+    @property
+    def finished(self):
+        """ Whether the match went live or was cancelled. """
+        return self.state in _FINAL_STATES
+
+    def remaining(self, default: float) -> float:
+        """ Seconds left before the current phase times out, or the default if it has no deadline. """
+        if self.deadline is None:
+            return default
+
+        return max((self.deadline - datetime.now(timezone.utc)).total_seconds(), 0)
+
+    async def _update(self, **data):
+        data['updated_at'] = datetime.now(timezone.utc)
+
+        async with self.db_pool.acquire() as conn:
+            row = await DBHelper(conn).update_match(self.id, **data)
+
+        self._set(row)
+
+    async def advance(self, state: MatchState, timeout: float = None, **data):
+        """ Move the match forward to a phase, optionally with a timeout, and update other columns with it. """
+        if self.finished or (state != MatchState.CANCELLED and _ORDER.index(state) <= _ORDER.index(self.state)):
+            raise ValueError(f'Match {self.id} can\'t go from {self.state} to {state}')
+
+        await self._update(state=str(state), deadline=self._deadline(timeout), **data)
+
+    async def record(self, **data):
+        """ Record progress made within the current phase like picks, bans or ready ups. """
+        await self._update(**data)
+
+    async def cancel(self):
+        """ Cancel the match unless it already finished. """
+        if not self.finished:
+            await self.advance(MatchState.CANCELLED)
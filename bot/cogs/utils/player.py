@@ -1,10 +1,18 @@
 # player.py
 
+from array import array
+import asyncio
 import discord
-from typing import AsyncGenerator, List
+import gzip
+import json
+from typing import AsyncGenerator, Dict, Iterable, List
 
+from .cache import TTLCache
+from .coalesce import SingleFlight
 from ...resources import Config, Sessions
 
+_MISSING = object()
+
 
 def catch_ZeroDivisionError(func):
     """ Decorator to catch ZeroDivisionError and return 0. """
@@ -18,100 +26,73 @@ def catch_ZeroDivisionError(func):
     return caught_func
 
 
+# API keys of the integer stats, in the order they are stored in PlayerStats._values and PlayerStatsTable columns
+STAT_FIELDS = (
+    'steam', 'discord', 'id', 'score', 'kills', 'deaths', 'assists', 'suicides', 'tk', 'shots', 'hits', 'headshots',
+    'connected', 'rounds_tr', 'rounds_ct', 'lastconnect', 'knife', 'glock', 'hkp2000', 'usp_silencer', 'p250',
+    'deagle', 'elite', 'fiveseven', 'tec9', 'cz75a', 'revolver', 'nova', 'xm1014', 'mag7', 'sawedoff', 'bizon',
+    'mac10', 'mp9', 'mp7', 'ump45', 'p90', 'galilar', 'ak47', 'scar20', 'famas', 'm4a1', 'm4a1_silencer', 'aug',
+    'ssg08', 'sg556', 'awp', 'g3sg1', 'm249', 'negev', 'hegrenade', 'flashbang', 'smokegrenade', 'inferno', 'decoy',
+    'taser', 'mp5sd', 'breachcharge', 'head', 'chest', 'stomach', 'left_arm', 'right_arm', 'left_leg', 'right_leg',
+    'c4_planted', 'c4_exploded', 'c4_defused', 'ct_win', 'tr_win', 'hostages_rescued', 'vip_killed', 'vip_escaped',
+    'vip_played', 'mvp', 'damage', 'match_win', 'match_draw', 'match_lose', 'first_blood', 'no_scope', 'no_scope_dis'
+)
+
+
+class _StatField:
+    """ Descriptor reading one integer stat of a PlayerStats from its values array. """
+
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        return instance._values[self.index]
+
+
+class PlayerCache:
+    """ Caches of the web API's player lookups keyed by Discord user ID. """
+    linked = TTLCache(max_size=50000, ttl=3600, negative_ttl=60)  # Negative TTL covers links completed on the web
+    stats = TTLCache(max_size=20000, ttl=120, negative_ttl=60)
+    batches = SingleFlight()  # Identical concurrent batch lookups
+
+    @classmethod
+    def invalidate(cls, *user_ids):
+        """ Drop everything cached about users whose link or stats changed. """
+        cls.linked.invalidate(*user_ids)
+        cls.stats.invalidate(*user_ids)
+
+
 class PlayerStats:
-    """ Represents a player with the contents returned by the API. """
+    """Represents a player with the contents returned by the API.
 
-    def __init__(self, player_data):
-        """ Set attributes. """
+    The integer stats listed in STAT_FIELDS are packed into one array and read through attributes of the same names,
+    so a cached player costs about 8 bytes per stat instead of a dictionary entry and an int object each.
+    """
+    chunk_size = 500  # Players requested from the API at once
+    max_concurrent_chunks = 4
+    gzip_min_size = None  # Request bodies of at least this many bytes are compressed, disabled if None
 
-        for key, value in player_data.items():
-            if key != 'discord_name' and key != 'inMatch':
-                player_data[key] = 0 if value is None else int(value)
+    __slots__ = ('discord_name', 'in_match', '_values')
 
-        self.steam = player_data['steam']
-        self.discord = player_data['discord']
+    def __init__(self, player_data):
+        """ Set attributes. """
         self.discord_name = player_data['discord_name']
-        self.id = player_data['id']
-        self.score = player_data['score']
-        self.kills = player_data['kills']
-        self.deaths = player_data['deaths']
-        self.assists = player_data['assists']
-        self.suicides = player_data['suicides']
-        self.tk = player_data['tk']
-        self.shots = player_data['shots']
-        self.hits = player_data['hits']
-        self.headshots = player_data['headshots']
-        self.connected = player_data['connected']
-        self.rounds_tr = player_data['rounds_tr']
-        self.rounds_ct = player_data['rounds_ct']
-        self.lastconnect = player_data['lastconnect']
-        self.knife = player_data['knife']
-        self.glock = player_data['glock']
-        self.hkp2000 = player_data['hkp2000']
-        self.usp_silencer = player_data['usp_silencer']
-        self.p250 = player_data['p250']
-        self.deagle = player_data['deagle']
-        self.elite = player_data['elite']
-        self.fiveseven = player_data['fiveseven']
-        self.tec9 = player_data['tec9']
-        self.cz75a = player_data['cz75a']
-        self.revolver = player_data['revolver']
-        self.nova = player_data['nova']
-        self.xm1014 = player_data['xm1014']
-        self.mag7 = player_data['mag7']
-        self.sawedoff = player_data['sawedoff']
-        self.bizon = player_data['bizon']
-        self.mac10 = player_data['mac10']
-        self.mp9 = player_data['mp9']
-        self.mp7 = player_data['mp7']
-        self.ump45 = player_data['ump45']
-        self.p90 = player_data['p90']
-        self.galilar = player_data['galilar']
-        self.ak47 = player_data['ak47']
-        self.scar20 = player_data['scar20']
-        self.famas = player_data['famas']
-        self.m4a1 = player_data['m4a1']
-        self.m4a1_silencer = player_data['m4a1_silencer']
-        self.aug = player_data['aug']
-        self.ssg08 = player_data['ssg08']
-        self.sg556 = player_data['sg556']
-        self.awp = player_data['awp']
-        self.g3sg1 = player_data['g3sg1']
-        self.m249 = player_data['m249']
-        self.negev = player_data['negev']
-        self.hegrenade = player_data['hegrenade']
-        self.flashbang = player_data['flashbang']
-        self.smokegrenade = player_data['smokegrenade']
-        self.inferno = player_data['inferno']
-        self.decoy = player_data['decoy']
-        self.taser = player_data['taser']
-        self.mp5sd = player_data['mp5sd']
-        self.breachcharge = player_data['breachcharge']
-        self.head = player_data['head']
-        self.chest = player_data['chest']
-        self.stomach = player_data['stomach']
-        self.left_arm = player_data['left_arm']
-        self.right_arm = player_data['right_arm']
-        self.left_leg = player_data['left_leg']
-        self.right_leg = player_data['right_leg']
-        self.c4_planted = player_data['c4_planted']
-        self.c4_exploded = player_data['c4_exploded']
-        self.c4_defused = player_data['c4_defused']
-        self.ct_win = player_data['ct_win']
-        self.tr_win = player_data['tr_win']
-        self.hostages_rescued = player_data['hostages_rescued']
-        self.vip_killed = player_data['vip_killed']
-        self.vip_escaped = player_data['vip_escaped']
-        self.vip_played = player_data['vip_played']
-        self.mvp = player_data['mvp']
-        self.damage = player_data['damage']
-        self.match_win = player_data['match_win']
-        self.match_draw = player_data['match_draw']
-        self.match_lose = player_data['match_lose']
-        self.first_blood = player_data['first_blood']
-        self.no_scope = player_data['no_scope']
-        self.no_scope_dis = player_data['no_scope_dis']
         self.in_match = player_data['inMatch']
+        self._values = array('q', (int(player_data.get(field) or 0) for field in STAT_FIELDS))
+
+    @classmethod
+    def _from_values(cls, values, discord_name, in_match):
+        """ Create a player from already decoded stats. """
+        player = cls.__new__(cls)
+        player.discord_name = discord_name
+        player.in_match = in_match
+        player._values = values
+        return player
 
     @property
     def league_profile(self):
@@ -173,13 +154,44 @@ class PlayerStats:
 
         url = f'{Config.api_url}/player/discord/{user.id}'
 
-        async with Sessions.requests.get(url=url) as resp:
-            return cls(await resp.json())
+        async def fetch():
+            async with Sessions.requests.get(url=url) as resp:
+                return cls(await resp.json())
+
+        return await PlayerCache.stats.get_or_fetch(user.id, fetch)
+
+    @classmethod
+    async def _fetch_chunk(cls, discord_ids: List[int], generation: int) -> Dict[int, 'PlayerStats']:
+        """ Get the data of a chunk of players from the API and cache it, compressing large request bodies. """
+        url = f'{Config.api_url}/players/discord'
+        body = json.dumps({'discordIds': discord_ids})
+
+        if cls.gzip_min_size is not None and len(body) >= cls.gzip_min_size:
+            headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+            request = Sessions.requests.post(url=url, data=gzip.compress(body.encode()), headers=headers)
+        else:
+            request = Sessions.requests.post(url=url, data=body, headers={'Content-Type': 'application/json'})
+
+        async with request as resp:
+            fetched = {}
+
+            for player_data in await resp.json():
+                player = cls(player_data)
+                fetched[player.discord] = player
+
+        for discord_id in discord_ids:  # None caches users without stats
+            PlayerCache.stats.set_if_current(generation, discord_id, fetched.get(discord_id))
+
+        return fetched
 
     @classmethod
     async def from_users(cls, users: List[discord.User]) -> AsyncGenerator['PlayerStats', None]:
         """Get multiple players' data from their Discord user objects.
 
+        Uncached players are requested from the API in chunks of chunk_size, with at most max_concurrent_chunks
+        requests in flight. Players are yielded in the order of the users as soon as the chunks holding them arrive.
+        Players without stats are left out.
+
         Parameters
         ----------
         users : List[discord.User]
@@ -189,18 +201,115 @@ class PlayerStats:
         PlayerStats
         """
 
-        url = f'{Config.api_url}/players/discord'
         discord_ids = [user.id for user in users]
+        players = {}
+        fetch_ids = []
+        fetching = set()
+
+        for discord_id in discord_ids:
+            player = PlayerCache.stats.get(discord_id, _MISSING)
 
-        async with Sessions.requests.post(url=url, json={"discordIds": discord_ids}) as resp:
-            players = await resp.json()
+            if player is not _MISSING:
+                players[discord_id] = player
+            elif discord_id not in fetching:
+                fetching.add(discord_id)
+                fetch_ids.append(discord_id)
 
-            players.sort(
-                key=lambda x: discord_ids.index(int(x['discord']))
-            )  # Preserve order of discord_ids arg
+        generation = PlayerCache.stats.generation
+        chunks = [fetch_ids[index:index + cls.chunk_size] for index in range(0, len(fetch_ids), cls.chunk_size)]
+        chunk_indexes = {discord_id: index for index, chunk in enumerate(chunks) for discord_id in chunk}
+        semaphore = asyncio.Semaphore(cls.max_concurrent_chunks)
 
-            for player in players:
-                yield cls(player)
+        async def fetch_chunk(chunk):
+            async with semaphore:
+                key = (generation, tuple(chunk))
+                return await PlayerCache.batches.do(key, lambda: cls._fetch_chunk(chunk, generation))
+
+        tasks = [asyncio.ensure_future(fetch_chunk(chunk)) for chunk in chunks]
+
+        try:
+            for discord_id in discord_ids:  # Preserve order of users arg
+                index = chunk_indexes.get(discord_id)
+                player = players.get(discord_id) if index is None else (await tasks[index]).get(discord_id)
+
+                if player is not None:
+                    yield player
+        finally:
+            for task in tasks:  # The caller stopped early or a chunk failed
+                task.cancel()
+
+
+for _index, _field in enumerate(STAT_FIELDS):  # Set after the class body so "discord" doesn't shadow the module
+    setattr(PlayerStats, _field, _StatField(_index))
+
+
+class PlayerStatsTable:
+    """Stats of many players stored column by column, one typed array per stat.
+
+    A table takes a fraction of the memory of the same players as PlayerStats objects and lets aggregate math over a
+    guild's worth of players run over contiguous arrays instead of attribute lookups.
+
+    Attributes
+    ----------
+    columns : Dict[str, array.array]
+        Values of each stat in STAT_FIELDS keyed by field name.
+    discord_names : List[str]
+    in_match : array.array
+    """
+
+    __slots__ = ('columns', 'discord_names', 'in_match')
+
+    def __init__(self, players: Iterable[PlayerStats] = ()):
+        """ Set attributes. """
+        self.columns = {field: array('q') for field in STAT_FIELDS}
+        self.discord_names = []
+        self.in_match = array('b')
+
+        for player in players:
+            self.append(player)
+
+    @classmethod
+    async def from_users(cls, users: List[discord.User]) -> 'PlayerStatsTable':
+        """ Get multiple players' data from their Discord user objects as a table. """
+        table = cls()
+
+        async for player in PlayerStats.from_users(users):
+            table.append(player)
+
+        return table
+
+    def __len__(self):
+        return len(self.discord_names)
+
+    def __getitem__(self, field: str) -> array:
+        return self.columns[field]
+
+    def append(self, player: PlayerStats):
+        """ Add a player as the last row of the table. """
+        for column, value in zip(self.columns.values(), player._values):
+            column.append(value)
+
+        self.discord_names.append(player.discord_name)
+        self.in_match.append(bool(player.in_match))
+
+    def row(self, index: int) -> PlayerStats:
+        """ Get a row of the table as a PlayerStats. """
+        values = array('q', (column[index] for column in self.columns.values()))
+        return PlayerStats._from_values(values, self.discord_names[index], bool(self.in_match[index]))
+
+    def __iter__(self):
+        return (self.row(index) for index in range(len(self)))
+
+    @property
+    def matches_played(self) -> array:
+        """ Calculate and return every player's matches played. """
+        return array('q', map(sum, zip(self['match_win'], self['match_draw'], self['match_lose'])))
+
+    @property
+    def win_percent(self) -> array:
+        """ Calculate and return every player's win percentage. """
+        return array('d', (win / (win + lose) if win + lose else 0
+                           for win, lose in zip(self['match_win'], self['match_lose'])))
 
 
 class Player:
@@ -250,10 +359,13 @@ class Player:
 
         url = f'{Config.api_url}/discord/check/{self.member.id}'
 
-        async with Sessions.requests.get(url=url) as resp:
-            resp_json = await resp.json()
+        async def fetch():
+            async with Sessions.requests.get(url=url) as resp:
+                resp_json = await resp.json()
+
+                return resp_json.get('linked', False)
 
-            return resp_json.get('linked', False)
+        return await PlayerCache.linked.get_or_fetch(self.member.id, fetch)
 
     async def get_stats(self) -> PlayerStats:
         """Get player data from the API.
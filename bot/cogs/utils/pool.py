@@ -0,0 +1,143 @@
+# pool.py
+
+import asyncio
+from collections import Counter
+import logging
+import time
+
+# asyncio.current_task() only exists from Python 3.7 on
+_current_task = getattr(asyncio, 'current_task', None) or asyncio.Task.current_task
+
+
+class _PoolAcquireContext:
+    """ Awaitable and async context manager returned by InstrumentedPool.acquire(). """
+
+    __slots__ = ('pool', 'timeout', 'conn')
+
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.conn = None
+
+    async def _acquire(self):
+        return await self.pool._acquire(self.timeout)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def __aenter__(self):
+        self.conn = await self._acquire()
+        return self.conn
+
+    async def __aexit__(self, *exc_info):
+        conn, self.conn = self.conn, None
+        await self.pool.release(conn)
+
+
+class InstrumentedPool:
+    """Wrapper around an asyncpg pool that records how connections are waited for and held.
+
+    The wrapper is a drop-in replacement for the pool: acquire() works both awaited and as an async context manager,
+    and every other attribute is forwarded to the wrapped pool.
+
+    Attributes
+    ----------
+    pool : asyncpg.pool.Pool
+        The wrapped pool.
+    acquire_timeout : float
+        Seconds to wait for a connection before raising asyncio.TimeoutError, or None to wait forever.
+    """
+
+    def __init__(self, pool, acquire_timeout=None):
+        self.pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.logger = logging.getLogger('csgoleague.db')
+        self.acquires = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_hold = 0.0
+        self.max_hold = 0.0
+        self.multi_acquire_commands = Counter()
+        self._acquired_at = {}
+        self._commands = {}  # Task invoking a command -> the command's context
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+    def acquire(self, *, timeout=None):
+        """ Acquire a connection from the pool, recording how long it took to get one. """
+        return _PoolAcquireContext(self, self.acquire_timeout if timeout is None else timeout)
+
+    async def _acquire(self, timeout):
+        start = time.perf_counter()
+        self.waiting += 1
+
+        try:
+            conn = await self.pool.acquire(timeout=timeout)
+        finally:
+            self.waiting -= 1
+
+        acquired_at = time.perf_counter()
+        wait = acquired_at - start
+        self.acquires += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self._acquired_at[id(conn)] = acquired_at
+        ctx = self._commands.get(_current_task())
+
+        if ctx is not None:
+            ctx.db_acquires += 1
+
+        return conn
+
+    async def release(self, conn, *, timeout=None):
+        """ Release a connection back to the pool, recording how long it was held. """
+        acquired_at = self._acquired_at.pop(id(conn), None)
+
+        if acquired_at is not None:
+            hold = time.perf_counter() - acquired_at
+            self.total_hold += hold
+            self.max_hold = max(self.max_hold, hold)
+
+        await self.pool.release(conn, timeout=timeout)
+
+    async def close(self):
+        await self.pool.close()
+
+    def start_command(self, ctx):
+        """Start counting the acquisitions made while invoking a command on the context's db_acquires.
+
+        Only the acquisitions made by the task invoking the command are counted, not those of tasks it spawns.
+        """
+        ctx.db_acquires = 0
+        self._commands[_current_task()] = ctx
+
+    def end_command(self, ctx):
+        """ Stop counting a command's acquisitions and flag the command if it acquired more than once. """
+        self._commands.pop(_current_task(), None)
+
+        if ctx.db_acquires > 1:
+            self.multi_acquire_commands[str(ctx.command)] += 1
+            self.logger.debug(f'Command "{ctx.command}" acquired the pool {ctx.db_acquires} times')
+
+    @property
+    def stats(self):
+        """ Counters describing the pool's load. """
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        stats = {
+            'size': size,
+            'in_use': size - idle,
+            'idle': idle,
+            'waiting': self.waiting,
+            'acquires': self.acquires,
+            'mean_wait_ms': self.total_wait / self.acquires * 1000 if self.acquires else 0.0,
+            'max_wait_ms': self.max_wait * 1000,
+            'mean_hold_ms': self.total_hold / self.acquires * 1000 if self.acquires else 0.0,
+            'max_hold_ms': self.max_hold * 1000
+        }
+        stats.update(
+            (f'multi_acquire:{command}', count) for command, count in self.multi_acquire_commands.most_common(5)
+        )
+        return stats
@@ -0,0 +1,125 @@
+# reactions.py
+
+import asyncio
+import time
+from typing import Dict, Iterable, List
+
+import discord
+
+
+class _SeedTimings:
+    """ Time it took to seed the buttons of each kind of menu. """
+
+    def __init__(self):
+        self._timings: Dict[str, List[float]] = {}  # Menu name -> [seeds, total first button time, total time, max]
+
+    def record(self, name, first, total):
+        """ Add the timings of a finished seeding. """
+        timings = self._timings.setdefault(name, [0, 0.0, 0.0, 0.0])
+        timings[0] += 1
+        timings[1] += first
+        timings[2] += total
+        timings[3] = max(timings[3], total)
+
+    @property
+    def stats(self):
+        """ Seeding counts and average and max durations in milliseconds keyed by menu name. """
+        stats = {}
+
+        for name, (seeds, first, total, max_total) in sorted(self._timings.items()):
+            stats[f'{name}:seeds'] = seeds
+            stats[f'{name}:first_ms'] = first / seeds * 1000
+            stats[f'{name}:total_ms'] = total / seeds * 1000
+            stats[f'{name}:max_ms'] = max_total * 1000
+
+        return stats
+
+
+class ReactionButtons:
+    """The bot's reaction buttons on a message, changed with the fewest API calls possible.
+
+    Menus tell the model which buttons should be on the message and it only adds the missing ones and clears the ones
+    that shouldn't be there anymore. Clears don't depend on each other and are sent concurrently alongside the adds.
+
+    Adds are pipelined: all of them are queued at once in the order they should appear, and discord.py's per-route
+    lock sends them in that order as fast as the route's rate limit allows. Seeding a new menu returns as soon as the
+    first button is on the message, so the menu can take input while the rest are added.
+
+    Attributes
+    ----------
+    message : discord.Message
+        Message the buttons are on.
+    name : str
+        Kind of menu the timings are recorded under.
+    emojis : List[str]
+        Emojis of the buttons on the message or being added to it, in order.
+    timings : _SeedTimings
+        Seeding durations of every menu.
+    """
+    timings = _SeedTimings()
+
+    def __init__(self, message: discord.Message, name: str = 'menu'):
+        self.message = message
+        self.name = name
+        self.emojis: List[str] = []
+        self._seeding = None
+
+    def _queue_adds(self, emojis):
+        """ Queue the adds in order, each task reaches the route's lock in the order it was created. """
+        return [asyncio.ensure_future(self.message.add_reaction(emoji)) for emoji in emojis]
+
+    async def _finish_seeding(self, adds, start, first_added):
+        try:
+            await asyncio.gather(*adds)
+        finally:
+            self.timings.record(self.name, first_added - start, time.perf_counter() - start)
+
+    async def _wait_seeding(self):
+        """ Wait for the buttons still being seeded so later changes apply on top of them. """
+        seeding = self._seeding
+
+        if seeding is None:
+            return
+
+        try:
+            await seeding
+        finally:
+            if self._seeding is seeding:
+                self._seeding = None
+
+    def adopt(self):
+        """ Take over the bot's reactions already on the message, like the buttons of a menu from a previous run. """
+        self.emojis = [str(reaction.emoji) for reaction in self.message.reactions if reaction.me]
+
+    async def seed(self, emojis: Iterable[str]):
+        """ Start adding buttons to a message without any and return once the first one is on it. """
+        await self._wait_seeding()
+        emojis = list(dict.fromkeys(str(emoji) for emoji in emojis))
+        self.emojis = emojis
+        start = time.perf_counter()
+        adds = self._queue_adds(emojis)
+
+        if not adds:
+            return
+
+        try:
+            await asyncio.shield(adds[0])
+        finally:
+            self._seeding = asyncio.ensure_future(self._finish_seeding(adds, start, time.perf_counter()))
+
+    async def sync(self, emojis: Iterable[str]):
+        """ Add and clear buttons so exactly the given emojis are on the message. """
+        await self._wait_seeding()
+        emojis = list(dict.fromkeys(str(emoji) for emoji in emojis))
+        cleared = [emoji for emoji in self.emojis if emoji not in emojis]
+        added = [emoji for emoji in emojis if emoji not in self.emojis]
+        self.emojis = [emoji for emoji in self.emojis if emoji in emojis] + added
+        await asyncio.gather(*self._queue_adds(added), *(self.message.clear_reaction(emoji) for emoji in cleared))
+
+    async def clear(self):
+        """ Remove every reaction from the message. """
+        try:
+            await self._wait_seeding()
+        finally:
+            self.emojis = []
+            await self.message.clear_reactions()
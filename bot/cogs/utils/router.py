@@ -0,0 +1,70 @@
+# router.py
+
+import contextlib
+from typing import Awaitable, Callable, Dict
+
+import discord
+
+ReactionHandler = Callable[[discord.RawReactionActionEvent], Awaitable[None]]
+
+
+class ReactionRouter:
+    """Dispatches reactions to the handler of the interactive message they were added to.
+
+    Menus and ready checks register a handler under their message's ID for as long as they wait for reactions. Every
+    reaction the bot receives is then a single dictionary lookup: reactions on other messages are dropped before any
+    handler runs.
+
+    Attributes
+    ----------
+    routed : int
+        Number of reactions passed to a handler.
+    dropped : int
+        Number of reactions on messages without a handler.
+    """
+
+    def __init__(self):
+        self.routed = 0
+        self.dropped = 0
+        self._handlers: Dict[int, ReactionHandler] = {}
+
+    def register(self, message_id: int, handler: ReactionHandler):
+        """ Send the reactions added to a message to a handler. """
+        if message_id in self._handlers:
+            raise ValueError(f'Message {message_id} already has a reaction handler')
+
+        self._handlers[message_id] = handler
+
+    def unregister(self, message_id: int):
+        """ Stop sending the reactions added to a message to its handler. """
+        self._handlers.pop(message_id, None)
+
+    @contextlib.contextmanager
+    def listening(self, message_id: int, handler: ReactionHandler):
+        """ Context manager registering a handler for a message until the block exits. """
+        self.register(message_id, handler)
+
+        try:
+            yield
+        finally:
+            self.unregister(message_id)
+
+    async def dispatch(self, payload: discord.RawReactionActionEvent):
+        """ Pass a reaction to the handler of its message if it has one. """
+        handler = self._handlers.get(payload.message_id)
+
+        if handler is None:
+            self.dropped += 1
+            return
+
+        self.routed += 1
+        await handler(payload)
+
+    @property
+    def stats(self):
+        """ Counters describing the interactive messages and the reactions they got. """
+        return {
+            'active_messages': len(self._handlers),
+            'routed': self.routed,
+            'dropped': self.dropped
+        }
@@ -0,0 +1,166 @@
+# scheduler.py
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict
+
+from .db import DBHelper
+
+
+class _Job:
+    """ A periodic job and the counters of the runs made by this process. """
+
+    __slots__ = ('name', 'interval', 'func', 'leader', 'runs', 'failures', 'last_duration', 'max_duration', 'task')
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.leader = False
+        self.runs = 0
+        self.failures = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.task = None
+
+
+class JobScheduler:
+    """Runs periodic jobs that must only run once across every bot process.
+
+    Each job has a named Postgres advisory lock and only the process holding it runs the job. The locks are taken on a
+    dedicated connection, so they are released by Postgres as soon as the holder's connection closes, including when
+    the holder dies. Every process retries the locks it doesn't hold every poll_interval seconds, so another process
+    takes over a job within that time.
+
+    Attributes
+    ----------
+    lock_class : int
+        First key of the advisory locks, separating them from other users of advisory locks on the database.
+    poll_interval : float
+        Seconds between attempts to take the locks of the jobs this process doesn't run.
+    leases_acquired : int
+        Number of times this process took over a job.
+    leases_lost : int
+        Number of times this process lost its jobs because its lock connection broke.
+    """
+    lock_class = 0x4c42  # "LB"
+    poll_interval = 5.0
+
+    def __init__(self, db_pool):
+        self.db_pool = db_pool
+        self.leases_acquired = 0
+        self.leases_lost = 0
+        self.logger = logging.getLogger('csgoleague.scheduler')
+        self._jobs: Dict[str, _Job] = {}
+        self._lock_conn = None
+        self._task = None
+
+    def register(self, name: str, interval: float, func: Callable[[], Awaitable[None]]):
+        """ Add a job to run every interval seconds on the process holding its lock. """
+        if name in self._jobs:
+            raise ValueError(f'Job "{name}" is already registered')
+
+        self._jobs[name] = _Job(name, interval, func)
+
+    async def start(self):
+        """ Start competing for the jobs' locks in the background. """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run_elections())
+
+    async def close(self):
+        """ Stop the jobs and give up their locks. """
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+        await self._drop_leases()
+
+    async def _drop_leases(self):
+        """ Stop the jobs this process runs and release the lock connection, which unlocks its advisory locks. """
+        for job in self._jobs.values():
+            job.leader = False
+
+            if job.task is not None:
+                job.task.cancel()
+                job.task = None
+
+        conn, self._lock_conn = self._lock_conn, None
+
+        if conn is not None:
+            try:
+                await self.db_pool.release(conn)
+            except Exception as e:  # Connection is already broken
+                self.logger.warning(f'Failed to release the job lock connection: {e}')
+
+    async def _elect(self):
+        """ Try to take the locks of the jobs this process doesn't run and start the jobs it got. """
+        if self._lock_conn is None:
+            self._lock_conn = await self.db_pool.acquire()
+
+        names = [name for name, job in self._jobs.items() if not job.leader]
+        locked = await DBHelper(self._lock_conn).try_advisory_locks(self.lock_class, names)
+
+        for name in locked:
+            job = self._jobs[name]
+            job.leader = True
+            job.task = asyncio.ensure_future(self._run_job(job))
+            self.leases_acquired += 1
+            self.logger.info(f'Took over job "{name}"')
+
+    async def _run_elections(self):
+        while True:
+            try:
+                await self._elect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # The locks held on a broken connection are gone, start over on a new one
+                if any(job.leader for job in self._jobs.values()):
+                    self.leases_lost += 1
+
+                self.logger.error(f'Lost the job locks, retrying shortly: {e}')
+                await self._drop_leases()
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run_job(self, job):
+        while True:
+            start = time.perf_counter()
+
+            try:
+                await job.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.failures += 1
+                self.logger.error(f'Job "{job.name}" failed', exc_info=e)
+            else:
+                job.runs += 1
+
+            job.last_duration = time.perf_counter() - start
+            job.max_duration = max(job.max_duration, job.last_duration)
+            await asyncio.sleep(job.interval)
+
+    @property
+    def stats(self):
+        """ Which jobs this process runs and how long their runs take in milliseconds. """
+        stats = {
+            'leases_acquired': self.leases_acquired,
+            'leases_lost': self.leases_lost
+        }
+
+        for name, job in sorted(self._jobs.items()):
+            stats[f'{name}:leader'] = int(job.leader)
+            stats[f'{name}:runs'] = job.runs
+            stats[f'{name}:failures'] = job.failures
+            stats[f'{name}:last_ms'] = job.last_duration * 1000
+            stats[f'{name}:max_ms'] = job.max_duration * 1000
+
+        return stats
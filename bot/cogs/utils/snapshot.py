@@ -0,0 +1,130 @@
+# snapshot.py
+
+import asyncio
+import logging
+from typing import Dict, List
+
+import discord
+
+from .player import PlayerStats
+
+
+class QueueStatsSnapshot:
+    """Stats of every guild's queued players, kept from the moment they join and refreshed while they wait.
+
+    The join command already fetches a player's stats to check they aren't in a match, so they are stored here instead
+    of being thrown away. A background task refetches the stats of everyone still waiting every refresh_interval
+    seconds, which lets the match pipeline build teams from the snapshot when the queue pops without calling the API.
+
+    Attributes
+    ----------
+    refresh_interval : float
+        Seconds between refreshes of the queued players' stats.
+    hits : int
+        Number of players taken from the snapshot for a match.
+    misses : int
+        Number of players that weren't in the snapshot and had to be fetched for a match.
+    refreshes : int
+        Number of background refreshes run.
+    """
+    refresh_interval = 120.0  # Matches the stats cache TTL so every refresh gets new data
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.logger = logging.getLogger('csgoleague.snapshot')
+        self._stats: Dict[int, Dict[int, PlayerStats]] = {}
+        self._task = None
+
+    async def start(self):
+        """ Start refreshing the queued players' stats in the background. """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run_refresher())
+
+    async def close(self):
+        """ Stop the background refresh. """
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+
+    def add(self, guild_id: int, player: PlayerStats):
+        """ Keep the stats of a player who joined a guild's queue. """
+        self._stats.setdefault(guild_id, {})[player.discord] = player
+
+    def discard(self, guild_id: int, *user_ids: int):
+        """ Forget the stats of players who left a guild's queue. """
+        guild_stats = self._stats.get(guild_id)
+
+        if guild_stats is None:
+            return
+
+        for user_id in user_ids:
+            guild_stats.pop(user_id, None)
+
+        if not guild_stats:
+            del self._stats[guild_id]
+
+    async def take(self, guild_id: int, users: List[discord.User]) -> Dict[int, PlayerStats]:
+        """Get the stats of the players of a match keyed by user ID, fetching only the ones missing from the snapshot.
+
+        Users without stats are left out.
+        """
+        guild_stats = self._stats.get(guild_id, {})
+        players = {user.id: guild_stats[user.id] for user in users if user.id in guild_stats}
+        missing = [user for user in users if user.id not in players]
+        self.hits += len(players)
+        self.misses += len(missing)
+
+        if missing:
+            async for player in PlayerStats.from_users(missing):
+                players[player.discord] = player
+
+        return players
+
+    async def refresh(self):
+        """ Refetch the stats of every queued player. """
+        queued_ids = {user_id for guild_stats in self._stats.values() for user_id in guild_stats}
+
+        if not queued_ids:
+            return
+
+        fetched = {player.discord: player
+                   async for player in PlayerStats.from_users([discord.Object(user_id) for user_id in queued_ids])}
+
+        for guild_stats in self._stats.values():
+            for user_id in guild_stats.keys() & fetched.keys():  # Players who left while fetching are skipped
+                guild_stats[user_id] = fetched[user_id]
+
+        self.refreshes += 1
+
+    async def _run_refresher(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error('Failed to refresh the queued players\' stats', exc_info=e)
+
+    @property
+    def stats(self):
+        """ Counters describing how many API calls the snapshot saved. """
+        taken = self.hits + self.misses
+        return {
+            'queued_players': sum(len(guild_stats) for guild_stats in self._stats.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / taken if taken else 0,
+            'refreshes': self.refreshes
+        }
@@ -0,0 +1,96 @@
+# statements.py
+
+import time
+from typing import Dict
+
+
+class StatementStats:
+    """ Call count and timing of a single named statement. """
+
+    __slots__ = ('calls', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class StatementRegistry:
+    """Registry of the named SQL statements run by DBHelper.
+
+    asyncpg prepares a statement the first time its exact text runs on a connection and keeps it in that connection's
+    statement cache, so every query run through the registry has a single constant text per name. That way each pooled
+    connection prepares a statement once and reuses it for the connection's lifetime. Statements whose text is generated
+    (like the SET clause of an UPDATE) are built once per variant and cached here.
+
+    The registry also records how many times each statement ran and how long it took, so the queries that dominate the
+    database load can be found.
+    """
+
+    def __init__(self):
+        self._statements: Dict[str, str] = {}
+        self._stats: Dict[str, StatementStats] = {}
+
+    def register(self, name: str, statement: str) -> str:
+        """ Register a statement under a name, raising ValueError if the name already has a different text. """
+        registered = self._statements.setdefault(name, statement)
+
+        if registered != statement:
+            raise ValueError(f'Statement "{name}" is already registered with a different text')
+
+        return registered
+
+    def get(self, name: str) -> str:
+        """ Get the text of a registered statement, or None if there isn't one with the name. """
+        return self._statements.get(name)
+
+    def update_statement(self, table: str, cols):
+        """ Get the name and text of the UPDATE statement setting the given columns of a table row by id. """
+        name = f'update_{table}({",".join(cols)})'
+        statement = self.get(name)
+
+        if statement is None:
+            col_vals = ',\n    '.join(f'{col} = ${num}' for num, col in enumerate(cols, start=2))
+            statement = self.register(name, (
+                f'UPDATE {table}\n'
+                f'    SET {col_vals}\n'
+                '    WHERE id = $1\n'
+                '    RETURNING *;'
+            ))
+
+        return name, statement
+
+    async def run(self, conn, method: str, name: str, statement: str, *args, **kwargs):
+        """ Run a statement with one of the connection's query methods and record its timing. """
+        statement = self.register(name, statement)
+        start = time.perf_counter()
+
+        try:
+            return await getattr(conn, method)(statement, *args, **kwargs)
+        finally:
+            self._stats.setdefault(name, StatementStats()).record(time.perf_counter() - start)
+
+    def top(self, num=10):
+        """ Get the names and stats of the statements that took the most total time. """
+        stats = sorted(self._stats.items(), key=lambda item: item[1].total_time, reverse=True)
+        return stats[:num]
+
+    @property
+    def stats(self):
+        """ Calls, total and mean time of the statements that took the most total time. """
+        return {
+            name: f'{stat.calls} calls, {stat.total_time * 1000:.0f}ms total, {stat.mean_time * 1000:.1f}ms mean'
+            for name, stat in self.top()
+        }
+
+
+STATEMENTS = StatementRegistry()
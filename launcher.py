@@ -1,6 +1,7 @@
 # launcher.py
 
 from bot.bot import LeagueBot
+from bot.cogs.utils import InstrumentedPool, PlayerCache, PlayerStats, TeamBalancer
 
 import argparse
 import asyncio
@@ -9,6 +10,7 @@ import discord
 from dotenv import load_dotenv
 import json
 import logging
+import multiprocessing
 import os
 
 ABS_ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -26,11 +28,53 @@ def _get_loop():
     return loop
 
 
-def run_bot():
-    """ Parse the config file and run the bot. """
-    # Get database pool for bot
+def _get_env_number(name, default, cast=float):
+    """ Get an optional numeric setting from the environment. """
+    value = os.environ.get(name)
+    return default if value is None or value == '' else cast(value)
+
+
+def _get_env_flag(name, default):
+    """ Get an optional on/off setting from the environment. """
+    value = os.environ.get(name)
+    return default if value is None or value == '' else value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def _get_env_weights(name, default):
+    """ Get optional stat weights formatted like "score=1,kd_ratio=100" from the environment. """
+    value = os.environ.get(name)
+
+    if value is None or value == '':
+        return default
+
+    weights = (item.split('=') for item in value.split(','))
+    return {field.strip(): float(weight) for field, weight in weights}
+
+
+def _create_db_pool(loop):
+    """ Create the database connection pool with the settings in the environment. """
     db_connect_url = 'postgresql://{POSTGRESQL_USER}:{POSTGRESQL_PASSWORD}@{POSTGRESQL_HOST}/{POSTGRESQL_DB}'
-    db_pool = _get_loop().run_until_complete(asyncpg.create_pool(db_connect_url.format(**os.environ)))
+    server_settings = {'application_name': os.environ.get('POSTGRESQL_APPLICATION_NAME', 'csgo-league-bot')}
+    statement_timeout = _get_env_number('POSTGRESQL_STATEMENT_TIMEOUT', None, int)
+
+    if statement_timeout is not None:
+        server_settings['statement_timeout'] = str(statement_timeout)  # Milliseconds
+
+    pool = loop.run_until_complete(asyncpg.create_pool(
+        db_connect_url.format(**os.environ),
+        min_size=_get_env_number('POSTGRESQL_POOL_MIN_SIZE', 10, int),
+        max_size=_get_env_number('POSTGRESQL_POOL_MAX_SIZE', 10, int),
+        command_timeout=_get_env_number('POSTGRESQL_COMMAND_TIMEOUT', None),
+        max_inactive_connection_lifetime=_get_env_number('POSTGRESQL_POOL_MAX_INACTIVE_LIFETIME', 300.0),
+        server_settings=server_settings
+    ))
+    return InstrumentedPool(pool, acquire_timeout=_get_env_number('POSTGRESQL_POOL_ACQUIRE_TIMEOUT', None))
+
+
+def run_bot(shard_ids=None, shard_count=None):
+    """ Parse the config file and run the bot, optionally only some of its shards. """
+    # Get database pool for bot
+    db_pool = _create_db_pool(_get_loop())
 
     # Check API URL
     api_url = os.environ['CSGO_LEAGUE_API_URL']
@@ -38,15 +82,73 @@ def run_bot():
     if api_url.endswith('/'):
         api_url = api_url[:-1]
 
+    # Size API caches
+    PlayerCache.linked.max_size = _get_env_number('CSGO_LEAGUE_API_LINK_CACHE_SIZE', PlayerCache.linked.max_size, int)
+    PlayerCache.stats.max_size = _get_env_number('CSGO_LEAGUE_API_STATS_CACHE_SIZE', PlayerCache.stats.max_size, int)
+    PlayerCache.stats.ttl = _get_env_number('CSGO_LEAGUE_API_STATS_TTL', PlayerCache.stats.ttl)
+
+    # Split API batch lookups
+    PlayerStats.chunk_size = _get_env_number('CSGO_LEAGUE_API_CHUNK_SIZE', PlayerStats.chunk_size, int)
+    PlayerStats.max_concurrent_chunks = _get_env_number('CSGO_LEAGUE_API_MAX_CONCURRENT_CHUNKS',
+                                                        PlayerStats.max_concurrent_chunks, int)
+    PlayerStats.gzip_min_size = _get_env_number('CSGO_LEAGUE_API_GZIP_MIN_SIZE', PlayerStats.gzip_min_size, int)
+
+    # Tune team autobalance
+    TeamBalancer.weights = _get_env_weights('CSGO_LEAGUE_BALANCE_WEIGHTS', TeamBalancer.weights)
+    TeamBalancer.time_budget = _get_env_number('CSGO_LEAGUE_BALANCE_TIME_BUDGET', TeamBalancer.time_budget)
+
     # Get emojis
     with open(EMOJI_FILE) as f:
         emoji_dict = json.load(f)
 
     # Run bot
-    bot = LeagueBot(os.environ['DISCORD_BOT_TOKEN'], api_url, os.environ['CSGO_LEAGUE_API_KEY'], db_pool, emoji_dict)
+    bot = LeagueBot(os.environ['DISCORD_BOT_TOKEN'], api_url, os.environ['CSGO_LEAGUE_API_KEY'], db_pool, emoji_dict,
+                    use_components=_get_env_flag('CSGO_LEAGUE_COMPONENTS', False), shard_ids=shard_ids,
+                    shard_count=shard_count or _get_env_number('CSGO_LEAGUE_SHARD_COUNT', None, int))
     bot.run()
 
 
+def _get_shard_count():
+    """ Get the number of shards Discord recommends for the bot. """
+    loop = _get_loop()
+    http = discord.http.HTTPClient(loop=loop)
+
+    async def fetch():
+        try:
+            await http.static_login(os.environ['DISCORD_BOT_TOKEN'], bot=True)
+            shard_count, _ = await http.get_bot_gateway()
+            return shard_count
+        finally:
+            await http.close()
+
+    try:
+        return loop.run_until_complete(fetch())
+    finally:
+        loop.close()
+
+
+def run_cluster(processes):
+    """ Split the bot's shards into contiguous ranges and run each range in its own process. """
+    shard_count = _get_env_number('CSGO_LEAGUE_SHARD_COUNT', None, int) or _get_shard_count()
+    processes = min(processes, shard_count)
+    workers = []
+
+    for index in range(processes):
+        shard_ids = list(range(shard_count * index // processes, shard_count * (index + 1) // processes))
+        worker = multiprocessing.Process(target=run_bot, name=f'cluster-{index}',
+                                         kwargs={'shard_ids': shard_ids, 'shard_count': shard_count})
+        worker.start()
+        BOT_LOGGER.info(f'Started process {worker.pid} running shards {shard_ids[0]}-{shard_ids[-1]} of {shard_count}')
+        workers.append(worker)
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:  # Workers get the interrupt too, wait for them to close
+        for worker in workers:
+            worker.join()
+
+
 def create_emojis(guild_id):
     """"""
     client = discord.Client(loop=_get_loop())
@@ -116,4 +218,9 @@ if __name__ == '__main__':
         guild_id = args.emojis
         create_emojis(guild_id)
 
-    run_bot()
+    processes = _get_env_number('CSGO_LEAGUE_PROCESSES', 1, int)
+
+    if processes > 1:
+        run_cluster(processes)
+    else:
+        run_bot()
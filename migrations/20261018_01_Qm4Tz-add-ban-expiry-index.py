@@ -0,0 +1,18 @@
+"""
+Add a partial index on ban expiry times
+"""
+
+from yoyo import step
+
+__depends__ = {'20210619_01_3lEoT-add-map-de-ancient'}
+
+steps = [
+    step(
+        (
+            'CREATE INDEX banned_users_unban_time_idx\n'
+            '    ON banned_users (unban_time)\n'
+            '    WHERE unban_time IS NOT NULL;'
+        ),
+        'DROP INDEX banned_users_unban_time_idx;'
+    )
+]
@@ -0,0 +1,39 @@
+"""
+Add leaderboard tables
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_01_Qm4Tz-add-ban-expiry-index'}
+
+steps = [
+    step(
+        (
+            'CREATE TABLE leaderboard(\n'
+            '    guild_id BIGINT REFERENCES guilds (id) ON DELETE CASCADE,\n'
+            '    discord_id BIGINT,\n'
+            '    score INTEGER NOT NULL,\n'
+            '    matches_played INTEGER NOT NULL,\n'
+            '    win_percent REAL NOT NULL,\n'
+            '    CONSTRAINT leaderboard_pkey PRIMARY KEY (guild_id, discord_id)\n'
+            ');'
+        ),
+        'DROP TABLE leaderboard;'
+    ),
+    step(
+        (
+            'CREATE INDEX leaderboard_rank_idx\n'
+            '    ON leaderboard (guild_id, score DESC, matches_played DESC);'
+        ),
+        'DROP INDEX leaderboard_rank_idx;'
+    ),
+    step(
+        (
+            'CREATE TABLE leaderboard_refreshes(\n'
+            '    guild_id BIGINT PRIMARY KEY REFERENCES guilds (id) ON DELETE CASCADE,\n'
+            '    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL\n'
+            ');'
+        ),
+        'DROP TABLE leaderboard_refreshes;'
+    )
+]
@@ -0,0 +1,20 @@
+"""
+Add team size column for splitting queues into several matches
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_02_Lb7rW-add-leaderboard'}
+
+steps = [
+    step(
+        (
+            'ALTER TABLE guilds\n'
+            'ADD COLUMN team_size SMALLINT DEFAULT NULL;'
+        ),
+        (
+            'ALTER TABLE guilds\n'
+            'DROP COLUMN team_size;'
+        )
+    )
+]
@@ -0,0 +1,20 @@
+"""
+Add queue dashboards table
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_03_Tz5Kp-add-team-size'}
+
+steps = [
+    step(
+        (
+            'CREATE TABLE queue_dashboards(\n'
+            '    guild_id BIGINT PRIMARY KEY REFERENCES guilds (id) ON DELETE CASCADE,\n'
+            '    channel_id BIGINT NOT NULL,\n'
+            '    message_id BIGINT NOT NULL\n'
+            ');'
+        ),
+        'DROP TABLE queue_dashboards;'
+    )
+]
@@ -0,0 +1,46 @@
+"""
+Add matches table tracking the lifecycle of in-flight matches
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_04_Qd3Hn-add-queue-dashboards'}
+
+steps = [
+    step(
+        (
+            'CREATE TYPE match_state AS ENUM(\n'
+            '    \'ready_check\', \'team_draft\', \'map_select\', \'server_requested\', \'live\', \'cancelled\'\n'
+            ');'
+        ),
+        'DROP TYPE match_state;'
+    ),
+    step(
+        (
+            'CREATE TABLE matches(\n'
+            '    id BIGSERIAL PRIMARY KEY,\n'
+            '    guild_id BIGINT REFERENCES guilds (id) ON DELETE CASCADE,\n'
+            '    channel_id BIGINT NOT NULL,\n'
+            '    message_id BIGINT NOT NULL,\n'
+            '    state match_state NOT NULL DEFAULT \'ready_check\',\n'
+            '    users BIGINT[] NOT NULL,\n'
+            '    ready_users BIGINT[] NOT NULL DEFAULT \'{}\',\n'
+            '    team_one BIGINT[] NOT NULL DEFAULT \'{}\',\n'
+            '    team_two BIGINT[] NOT NULL DEFAULT \'{}\',\n'
+            '    banned_maps TEXT[] NOT NULL DEFAULT \'{}\',\n'
+            '    map TEXT DEFAULT NULL,\n'
+            '    deadline TIMESTAMP WITH TIME ZONE DEFAULT NULL,\n'
+            '    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()\n'
+            ');'
+        ),
+        'DROP TABLE matches;'
+    ),
+    step(
+        (
+            'CREATE INDEX matches_in_flight_idx\n'
+            '    ON matches (guild_id)\n'
+            '    WHERE state NOT IN (\'live\', \'cancelled\');'
+        ),
+        'DROP INDEX matches_in_flight_idx;'
+    )
+]
@@ -0,0 +1,14 @@
+"""
+Add queue positions recording the order users joined in
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_05_Mx8Rc-add-matches'}
+
+steps = [
+    step(
+        'ALTER TABLE queued_users ADD COLUMN position BIGSERIAL;',
+        'ALTER TABLE queued_users DROP COLUMN position;'
+    )
+]
@@ -0,0 +1,137 @@
+# test_map_vote.py
+
+import asyncio
+import types
+
+import discord
+
+from bot.cogs.match import MapVoteMenu
+from bot.cogs.utils import InteractionRouter, ReactionRouter
+from bot.cogs.utils.components import Interaction
+from bot.cogs.utils.map import Maps, MapPool
+
+EMOJI_DICT = {m.dev_name: f'<:{m.dev_name}:{num}>' for num, m in enumerate(sorted(Maps.all, key=lambda m: m.dev_name))}
+
+
+class FakeHTTP:
+    def __init__(self):
+        self.requests = []
+
+    async def request(self, route, **kwargs):
+        self.requests.append((route.method, route.path))
+
+
+class FakeGuildConfigs:
+    async def get(self, guild_id):
+        return types.SimpleNamespace(map_pool=MapPool(Maps.all))
+
+
+class FakeBot:
+    def __init__(self, loop, use_components):
+        self.loop = loop
+        self.use_components = use_components
+        self.emoji_dict = EMOJI_DICT
+        self.interactions = InteractionRouter()
+        self.reactions = ReactionRouter()
+        self.guild_configs = FakeGuildConfigs()
+        self.http = FakeHTTP()
+
+    def embed_template(self, **kwargs):
+        return discord.Embed(**kwargs)
+
+
+class FakeMessage:
+    __slots__ = ('id', 'guild', 'channel')
+
+    def __init__(self, users):
+        members = {user.id: user for user in users}
+        self.id = 1000
+        self.guild = types.SimpleNamespace(id=1, get_member=members.get)
+        self.channel = types.SimpleNamespace(id=10)
+
+
+class FakeButtons:
+    async def seed(self, emojis):
+        pass
+
+    async def clear(self):
+        pass
+
+
+class FakeMember:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.display_name = f'user-{user_id}'
+
+
+def make_users(num):
+    return [FakeMember(user_id) for user_id in range(1, num + 1)]
+
+
+async def wait_for_choices(menu):
+    while menu.map_choices is None:
+        await asyncio.sleep(0)
+
+    await asyncio.sleep(0)  # Let the menu start listening
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+
+    try:
+        return loop.run_until_complete(coro(loop))
+    finally:
+        loop.close()
+
+
+def test_button_vote_returns_most_voted_map():
+    async def vote(loop):
+        users = make_users(3)
+        bot = FakeBot(loop, use_components=True)
+        menu = MapVoteMenu(FakeMessage(users), bot, users)
+        task = asyncio.ensure_future(menu.vote(timeout=5))
+        await wait_for_choices(menu)
+        first, second = menu.map_choices
+
+        for user, voted in zip(users, [second, first, second]):
+            await bot.interactions.dispatch(Interaction(bot, {
+                'id': str(user.id),
+                'token': 'token',
+                'data': {'custom_id': f'{menu.menu_key}:{voted.dev_name}'},
+                'member': {'user': {'id': str(user.id)}},
+                'message': {'id': str(menu.id)}
+            }))
+
+        return await asyncio.wait_for(task, 1), second
+
+    winner, expected = run(vote)
+    assert winner is expected
+
+
+def test_reaction_vote_returns_most_voted_map():
+    async def vote(loop):
+        users = make_users(3)
+        bot = FakeBot(loop, use_components=False)
+        menu = MapVoteMenu(FakeMessage(users), bot, users)
+        menu.buttons = FakeButtons()
+
+        async def edit(**kwargs):
+            pass
+
+        async def remove_reaction(emoji, member):
+            pass
+
+        menu.edit = edit
+        menu.remove_reaction = remove_reaction
+        task = asyncio.ensure_future(menu.vote(timeout=5))
+        await wait_for_choices(menu)
+        first, second = menu.map_choices
+
+        for user, voted in zip(users, [first, first, second]):
+            payload = types.SimpleNamespace(member=user, emoji=EMOJI_DICT[voted.dev_name], message_id=menu.id)
+            await menu._process_vote(payload)
+
+        return await asyncio.wait_for(task, 1), first
+
+    winner, expected = run(vote)
+    assert winner is expected
@@ -0,0 +1,44 @@
+# test_queue_actor.py
+
+import asyncio
+
+import pytest
+
+from bot.cogs.utils import QueueActors
+
+
+class FakeBans:
+    def is_banned(self, guild_id, user_id):
+        return False
+
+
+def test_discard_cancels_pending_changes():
+    loop = asyncio.new_event_loop()
+
+    async def run():
+        actors = QueueActors(None, FakeBans())
+        actor = actors.get(1)
+        started = asyncio.Event()
+
+        async def slow_change():
+            started.set()
+            await asyncio.sleep(10)
+
+        in_flight = asyncio.ensure_future(actor._send(slow_change))
+        await started.wait()
+        queued = asyncio.ensure_future(actor.join(1, 10))
+        await asyncio.sleep(0)
+        await actors.discard(1)
+        results = await asyncio.wait_for(asyncio.gather(in_flight, queued, return_exceptions=True), 1)
+
+        with pytest.raises(asyncio.CancelledError):
+            await actor.join(2, 10)
+
+        return results
+
+    try:
+        results = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
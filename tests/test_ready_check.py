@@ -0,0 +1,162 @@
+# test_ready_check.py
+
+import asyncio
+import types
+
+import discord
+
+from bot.cogs import match
+from bot.cogs.utils import InteractionRouter, ReactionRouter
+from bot.cogs.utils.components import Interaction
+
+
+class FakeHTTP:
+    async def request(self, route, **kwargs):
+        pass
+
+
+class FakeBot:
+    def __init__(self, loop):
+        self.loop = loop
+        self.use_components = True
+        self.interactions = InteractionRouter()
+        self.reactions = ReactionRouter()
+        self.http = FakeHTTP()
+        self.db_pool = None
+
+    def embed_template(self, **kwargs):
+        return discord.Embed(**kwargs)
+
+
+class FakeGuild:
+    def __init__(self, members):
+        self.id = 1
+        self.get_member = {member.id: member for member in members}.get
+
+
+class FakeMember:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.mention = f'<@{user_id}>'
+
+
+class SlowLifecycle:
+    """ Lifecycle whose creation takes as long as the test wants, recording the ready ups. """
+
+    def __init__(self):
+        self.created = asyncio.Event()
+        self.ready_users = []
+
+    async def create(self, *args, **kwargs):
+        await self.created.wait()
+        return self
+
+    def remaining(self, default):
+        return default
+
+    async def record(self, ready_users):
+        self.ready_users = ready_users
+
+
+def test_ready_ups_before_the_match_is_recorded_count(monkeypatch):
+    loop = asyncio.new_event_loop()
+    users = [FakeMember(user_id) for user_id in range(1, 11)]
+    ctx = types.SimpleNamespace(guild=FakeGuild(users), channel=types.SimpleNamespace(id=2))
+    bot = FakeBot(loop)
+    cog = match.MatchCog(bot)
+    lifecycle = SlowLifecycle()
+    sent = []
+
+    async def send_message(bot, channel, content, embed, components):
+        sent.append(components[0]['custom_id'])
+        return types.SimpleNamespace(id=3)
+
+    async def edit_message(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(match, 'send_message', send_message)
+    monkeypatch.setattr(match, 'edit_message', edit_message)
+    monkeypatch.setattr(match, 'MatchLifecycle', lifecycle)
+
+    async def ready_up(user):
+        await bot.interactions.dispatch(Interaction(bot, {
+            'id': str(user.id),
+            'token': 'token',
+            'data': {'custom_id': sent[0]},
+            'member': {'user': {'id': str(user.id)}},
+            'message': {'id': '3'}
+        }))
+
+    async def run():
+        task = asyncio.ensure_future(cog.ready_check(ctx, users))
+
+        while not sent:
+            await asyncio.sleep(0)
+
+        await ready_up(users[0])  # While the match is still being recorded
+        lifecycle.created.set()
+        await asyncio.sleep(0)
+
+        for user in users[1:]:
+            await ready_up(user)
+
+        return await asyncio.wait_for(task, 1)
+
+    try:
+        _, _, readied = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert readied == users
+    assert bot.interactions.expired == 0
+    assert 1 in lifecycle.ready_users
+
+
+def test_concurrent_ready_checks_in_a_guild_both_finish(monkeypatch):
+    loop = asyncio.new_event_loop()
+    lobbies = [[FakeMember(user_id) for user_id in range(start, start + 2)] for start in (1, 3)]
+    ctx = types.SimpleNamespace(guild=FakeGuild(lobbies[0] + lobbies[1]), channel=types.SimpleNamespace(id=2))
+    bot = FakeBot(loop)
+    cog = match.MatchCog(bot)
+    lifecycle = SlowLifecycle()
+    lifecycle.created.set()
+    sent = []
+
+    async def send_message(bot, channel, content, embed, components):
+        sent.append(components[0]['custom_id'])
+        return types.SimpleNamespace(id=len(sent))
+
+    async def edit_message(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(match, 'send_message', send_message)
+    monkeypatch.setattr(match, 'edit_message', edit_message)
+    monkeypatch.setattr(match, 'MatchLifecycle', lifecycle)
+
+    async def run():
+        tasks = [asyncio.ensure_future(cog.ready_check(ctx, users)) for users in lobbies]
+
+        while len(sent) < 2:
+            await asyncio.sleep(0)
+
+        await asyncio.sleep(0)  # Let both checks start waiting
+
+        for custom_id, users in zip(sent, lobbies):
+            for user in users:
+                await bot.interactions.dispatch(Interaction(bot, {
+                    'id': str(user.id),
+                    'token': 'token',
+                    'data': {'custom_id': custom_id},
+                    'member': {'user': {'id': str(user.id)}},
+                    'message': {'id': '0'}
+                }))
+
+        return await asyncio.wait_for(asyncio.gather(*tasks), 1)
+
+    try:
+        results = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert [readied for _, _, readied in results] == lobbies
+    assert cog.pending_ready_tasks == {}
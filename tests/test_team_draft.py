@@ -0,0 +1,55 @@
+# test_team_draft.py
+
+import types
+
+import discord
+import pytest
+
+from bot.cogs.match import EMBED_MAX_LENGTH, FIELD_MAX_LENGTH, TeamDraftMenu
+
+
+class FakeMessage:
+    __slots__ = ()
+
+
+class FakeMember:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.display_name = f'{user_id:0>32}'  # Longest display name Discord allows
+
+
+def make_menu(num_users, use_components, num_picked=0):
+    users = [FakeMember(user_id) for user_id in range(1, num_users + 1)]
+    players_stats = {
+        user.id: types.SimpleNamespace(league_profile=f'https://league.example.com/profile/7656119{user.id:0>10}',
+                                       score=1000 + user.id)
+        for user in users
+    }
+    bot = types.SimpleNamespace(use_components=use_components, embed_template=lambda **kwargs: discord.Embed(**kwargs))
+    menu = TeamDraftMenu(types.SimpleNamespace(message=FakeMessage()), bot, users, players_stats)
+    picked = 2 + num_picked
+    menu.teams = [users[:picked:2], users[1:picked:2]]
+    menu.users_left = users[picked:]
+    return menu, users
+
+
+@pytest.mark.parametrize('num_users,num_picked', [(10, 0), (12, 0), (30, 10), (60, 0), (100, 0), (100, 50), (100, 98)])
+def test_draft_embed_fits_discord_limits(num_users, num_picked):
+    menu, users = make_menu(num_users, use_components=True, num_picked=num_picked)
+    embed = menu._draft_embed('Team draft has begun!')
+    fields = embed.to_dict()['fields']
+
+    assert all(0 < len(field['value']) <= FIELD_MAX_LENGTH for field in fields)
+    assert len(embed) <= EMBED_MAX_LENGTH
+    assert len(fields) <= 25
+
+    listed = ''.join(field['value'] for field in fields)
+    assert all(user.display_name in listed for user in users)
+
+
+def test_small_draft_keeps_profile_links():
+    menu, _ = make_menu(10, use_components=False)
+    embed = menu._draft_embed('Team draft has begun!')
+    players_left = [field for field in embed.to_dict()['fields'] if field['name'] == '__Players Left__'][0]
+
+    assert 'https://league.example.com/profile/' in players_left['value']